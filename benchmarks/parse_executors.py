@@ -0,0 +1,37 @@
+"""Compare the executors of parse_multiple_logs on the large sample logs.
+
+Run from the root of the repo with `python -m benchmarks.parse_executors`.
+"""
+import timeit
+from pathlib import Path
+
+from clogstats.stats.executors import EXECUTORS
+from clogstats.stats.gather_stats import ParseOptions, parse_multiple_logs
+
+LOG_DIR = Path(__file__).parent.parent / "tests" / "sample_logs"
+REPEATS = 5
+
+
+def benchmark_executor(executor: str, engine: str) -> float:
+    """Get the best time of REPEATS parses of every _big sample log."""
+    paths = sorted(LOG_DIR.glob("irc.*_big.weechatlog"))
+    parse_options = ParseOptions(engine=engine, executor=executor)
+    return min(
+        timeit.repeat(
+            lambda: parse_multiple_logs(paths, parse_options=parse_options),
+            number=1,
+            repeat=REPEATS,
+        ),
+    )
+
+
+def main() -> None:
+    """Print a table of timings for each engine and executor."""
+    for engine in ("pandas", "bytes"):
+        for executor in EXECUTORS:
+            timing = benchmark_executor(executor, engine)
+            print(f"{engine:>6} {executor:>7}: {timing * 1000:7.1f} ms")  # noqa: WPS421
+
+
+if __name__ == "__main__":
+    main()
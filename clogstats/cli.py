@@ -1,17 +1,57 @@
 """The command-line interface for clogstats_forecasting."""
 import argparse
+import sys
 from datetime import datetime, timedelta
-from typing import Iterator, List, Optional, Tuple
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
 
+from clogstats.stats.blacklists import load_blacklists
+from clogstats.stats.cache import ParseCache
+from clogstats.stats.executors import EXECUTORS
 from clogstats.stats.gather_stats import (
+    BOT_BLACKLISTS,
     ChannelsWanted,
-    DateRange,
     IRCChannel,
     NickBlacklist,
+    ParseOptions,
     analyze_all_logs,
+    log_directory,
+)
+from clogstats.stats.parse import ENGINES, DateRange
+from clogstats.stats.partials import (
+    gather_partial,
+    load_partial,
+    merge_partials,
+    save_partial,
+)
+from clogstats.stats.sketches import Approximation
+from clogstats.stats.time_series import divide_date_range
+from clogstats.stats.watch import LogWatcher, wait_for_changes
+
+if TYPE_CHECKING:
+    # forecasting needs darts, which the stats commands don't
+    from clogstats.forecasting.batch import ForecastOutcome  # noqa: F401
+
+# ISO 8601 forms accepted by iso_datetime, most precise first
+ISO_DATETIME_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S",  # noqa: WPS323
+    "%Y-%m-%d %H:%M:%S",  # noqa: WPS323
+    "%Y-%m-%dT%H:%M",  # noqa: WPS323
+    "%Y-%m-%d %H:%M",  # noqa: WPS323
+    "%Y-%m-%d",  # noqa: WPS323
 )
 
 
+def iso_datetime(timestamp: str) -> datetime:
+    """Parse an ISO 8601 date and time, like datetime.fromisoformat in 3.7+."""
+    for time_format in ISO_DATETIME_FORMATS:
+        try:
+            return datetime.strptime(timestamp, time_format)
+        except ValueError:
+            continue
+    raise ValueError(f"not an ISO 8601 date and time: {timestamp!r}")
+
+
 def parse_args() -> argparse.Namespace:  # noqa: WPS213 # lots of flags = lots of exprs
     """Parse CLI options."""
     parser = argparse.ArgumentParser(
@@ -89,9 +129,20 @@ def parse_args() -> argparse.Namespace:  # noqa: WPS213 # lots of flags = lots o
     )
     parser.add_argument(
         "--disable-bot-filters",
-        help="disable filtering of some known bots",
+        help="disable filtering of some known bots; blacklist files still apply",
         action="store_true",
     )
+    parser.add_argument(
+        "--blacklist-dir",
+        help=(
+            "directory of NETWORK.txt files listing nicks, globs, or re:regexes "
+            "to ignore; defaults to $XDG_CONFIG_HOME/clogstats/blacklists"
+        ),
+        action="store",
+        type=Path,
+        default=None,
+        required=False,
+    )
     parser.add_argument(
         "--log-dir",
         help="directory from which to read logs; defaults to $WEECHAT_HOME",
@@ -100,6 +151,116 @@ def parse_args() -> argparse.Namespace:  # noqa: WPS213 # lots of flags = lots o
         default=None,
         required=False,
     )
+    parser.add_argument(
+        "--engine",
+        help="how to parse logs: with pandas.read_csv() or straight from the bytes",
+        choices=ENGINES,
+        action="store",
+        type=str,
+        default="pandas",
+        required=False,
+    )
+    parser.add_argument(
+        "--executor",
+        help="read logs in the current thread, in threads, or in processes",
+        choices=EXECUTORS,
+        action="store",
+        type=str,
+        default="process",
+        required=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        help="number of threads/processes to read logs with; defaults to #CPUs",
+        action="store",
+        type=int,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--approximate",
+        help=(
+            "estimate nick counts and topwords in bounded memory, with relative "
+            "error ERROR (default 0.01). Implies --no-cache"
+        ),
+        metavar="ERROR",
+        action="store",
+        nargs="?",
+        type=float,
+        const=Approximation().error,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="don't read or write the cache of parsed logs",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        help="re-parse every log from scratch and replace its cache entry",
+        action="store_true",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="follow the logs and keep printing stats for the last DURATION hours",
+    )
+    watch_parser.add_argument(
+        "--poll-interval",
+        help="seconds between checks for new lines, if inotify isn't available",
+        action="store",
+        type=float,
+        default=10,
+        required=False,
+    )
+    export_parser = subparsers.add_parser(
+        "export-partial",
+        help="save mergeable stats of this host's logs for `clogstats merge`",
+    )
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        help="file to save the partial stats to; compressed if it ends in .gz/.bz2/.xz",
+        action="store",
+        type=Path,
+        required=True,
+    )
+    export_parser.add_argument(
+        "--end-time",
+        help=(
+            "analyze the DURATION hours before END_TIME (ISO 8601) instead of now; "
+            "give every host the same END_TIME so their stats line up"
+        ),
+        action="store",
+        type=iso_datetime,
+        default=None,
+        required=False,
+    )
+    export_parser.add_argument(
+        "--intervals",
+        help="split the date range like aggregate_timeseries_data, for time series",
+        action="store",
+        type=int,
+        default=1,
+        required=False,
+    )
+    merge_parser = subparsers.add_parser(
+        "merge", help="combine the stats saved by `clogstats export-partial`",
+    )
+    merge_parser.add_argument(
+        "partials", help="files saved by export-partial", nargs="+", type=Path,
+    )
+    merge_parser.add_argument(
+        "-o",
+        "--output",
+        help="save the merged partial stats here instead of printing them",
+        action="store",
+        type=Path,
+        default=None,
+        required=False,
+    )
     return parser.parse_args()
 
 
@@ -107,35 +268,35 @@ def parse_args() -> argparse.Namespace:  # noqa: WPS213 # lots of flags = lots o
 Row = Tuple[str, str, str, str, str]
 
 
-def calculate_date_range(duration: timedelta) -> DateRange:
-    """Compute the date range of analysis from the given timedelta."""
-    end_time = datetime.now()
-    return DateRange(start_time=end_time - duration, end_time=end_time)
-
+def calculate_date_range(duration: timedelta, end_time: datetime = None) -> DateRange:
+    """Compute the date range of analysis from the given timedelta.
 
-def collect_stats(parsed_args: argparse.Namespace) -> List[IRCChannel]:
-    """Run clogstats_forecasting from the CLI and dump the results."""
-    # get user-supplied parameters
-    date_range = calculate_date_range(timedelta(hours=parsed_args.duration))
-    print(f"Analyzing logs from {date_range.start_time} till {date_range.end_time}")
+    end_time defaults to now.
+    """
+    if end_time is None:
+        end_time = datetime.now()
+    return DateRange(start_time=end_time - duration, end_time=end_time)
 
-    nick_blacklists: Optional[NickBlacklist] = None
-    if parsed_args.disable_bot_filters:
-        nick_blacklists = {}
 
-    # collect the stats.
+def channels_wanted_from_args(parsed_args: argparse.Namespace) -> ChannelsWanted:
+    """Get the channels to include/exclude from the CLI args."""
     # convert channels to include/exclude to sets for better lookup.
-    collected_stats = analyze_all_logs(
-        date_range=date_range,
-        channels_wanted=ChannelsWanted(
-            include_channels=set(parsed_args.include_channels),
-            exclude_channels=set(parsed_args.exclude_channels),
-        ),
-        nick_blacklists=nick_blacklists,
-        sortkey=parsed_args.sort_by,
-        log_dir=parsed_args.log_dir,
+    return ChannelsWanted(
+        include_channels=set(parsed_args.include_channels),
+        exclude_channels=set(parsed_args.exclude_channels),
     )
 
+
+def nick_blacklists_from_args(parsed_args: argparse.Namespace) -> NickBlacklist:
+    """Get the nick blacklists from the CLI args and the user's blacklist files."""
+    base_blacklists = {} if parsed_args.disable_bot_filters else BOT_BLACKLISTS
+    return load_blacklists(base_blacklists, parsed_args.blacklist_dir)
+
+
+def filter_channels(
+    parsed_args: argparse.Namespace, collected_stats: List[IRCChannel],
+) -> List[IRCChannel]:
+    """Print the total message count and drop channels below the CLI's minimums."""
     # display total message count
     print(f"total messages: {sum(channel.msgs for channel in collected_stats)}")
 
@@ -149,6 +310,97 @@ def collect_stats(parsed_args: argparse.Namespace) -> List[IRCChannel]:
     ]
 
 
+def parse_options_from_args(parsed_args: argparse.Namespace) -> ParseOptions:
+    """Get the options for reading and parsing logs from the CLI args."""
+    # without a cache, stream through just the part of each log we need
+    parse_options = ParseOptions(
+        streaming=True,
+        engine=parsed_args.engine,
+        executor=parsed_args.executor,
+        workers=parsed_args.workers,
+    )
+    if parsed_args.approximate is not None:
+        parse_options.approximation = Approximation(error=parsed_args.approximate)
+    elif not parsed_args.no_cache:
+        parse_options.cache = ParseCache(rebuild=parsed_args.rebuild_cache)
+    return parse_options
+
+
+def collect_stats(parsed_args: argparse.Namespace) -> List[IRCChannel]:
+    """Run clogstats_forecasting from the CLI and dump the results."""
+    # get user-supplied parameters
+    date_range = calculate_date_range(timedelta(hours=parsed_args.duration))
+    print(f"Analyzing logs from {date_range.start_time} till {date_range.end_time}")
+
+    # collect the stats.
+    collected_stats = analyze_all_logs(
+        date_range=date_range,
+        channels_wanted=channels_wanted_from_args(parsed_args),
+        nick_blacklists=nick_blacklists_from_args(parsed_args),
+        sortkey=parsed_args.sort_by,
+        log_dir=parsed_args.log_dir,
+        parse_options=parse_options_from_args(parsed_args),
+    )
+    return filter_channels(parsed_args, collected_stats)
+
+
+def export_partial(parsed_args: argparse.Namespace) -> None:
+    """Save mergeable stats of the logs on this host, according to the CLI args."""
+    date_range = calculate_date_range(
+        timedelta(hours=parsed_args.duration), parsed_args.end_time,
+    )
+    date_ranges = [date_range]
+    if parsed_args.intervals > 1:
+        date_ranges = divide_date_range(date_range, parsed_args.intervals)
+    partial_stats = gather_partial(
+        date_ranges=date_ranges,
+        channels_wanted=channels_wanted_from_args(parsed_args),
+        nick_blacklists=nick_blacklists_from_args(parsed_args),
+        log_dir=parsed_args.log_dir,
+        parse_options=parse_options_from_args(parsed_args),
+    )
+    save_partial(partial_stats, parsed_args.output)
+
+
+def merge_stats(parsed_args: argparse.Namespace) -> Optional[List[IRCChannel]]:
+    """Merge the partial stats given in the CLI args.
+
+    Returns the merged stats to print, or None if they were saved instead.
+    """
+    partial_stats = merge_partials(map(load_partial, parsed_args.partials))
+    if parsed_args.output is not None:
+        save_partial(partial_stats, parsed_args.output)
+        return None
+    date_ranges = partial_stats.date_ranges()
+    print(
+        f"Merged stats from {date_ranges[0].start_time} "
+        f"till {date_ranges[-1].end_time}",
+    )
+    return filter_channels(parsed_args, partial_stats.combined(parsed_args.sort_by))
+
+
+def watch_stats(parsed_args: argparse.Namespace) -> Iterator[List[IRCChannel]]:
+    """Yield up-to-date stats for the last DURATION hours whenever logs change."""
+    watcher = LogWatcher(
+        window=timedelta(hours=parsed_args.duration),
+        channels_wanted=channels_wanted_from_args(parsed_args),
+        nick_blacklists=nick_blacklists_from_args(parsed_args),
+        log_dir=parsed_args.log_dir,
+        engine=parsed_args.engine,
+    )
+    watcher.poll()
+    changes = wait_for_changes(
+        log_directory(parsed_args.log_dir), parsed_args.poll_interval,
+    )
+    while True:  # noqa: WPS457
+        print(f"Stats for the last {parsed_args.duration} hours as of {datetime.now()}")
+        yield filter_channels(
+            parsed_args, watcher.snapshot(sortkey=parsed_args.sort_by),
+        )
+        next(changes)
+        watcher.poll()
+
+
 def result_table(
     max_entries: Optional[int], collected_stats: List[IRCChannel], max_topwords: int,
 ) -> List[Row]:
@@ -194,16 +446,41 @@ def pretty_print_table(table: List[Row]) -> None:
         print(" ".join(row_cells))
 
 
-def main() -> None:
-    """Calculate and pretty-print a table of IRC stats acc. to CLI args."""
-    parsed_args = parse_args()
+def print_progress(done: int, total: int, outcome: "ForecastOutcome") -> None:
+    """Report each finished job of forecast_channels on stderr; a ProgressCallback."""
+    status = "ok" if outcome.error is None else f"failed: {outcome.error}"
+    print(
+        f"[{done}/{total}] {outcome.channel} {outcome.model_name}"
+        + f" ({outcome.seconds:.1f}s) {status}",
+        file=sys.stderr,
+    )
+
+
+def print_stats(parsed_args: argparse.Namespace, stats: List[IRCChannel]) -> None:
+    """Pretty-print a table of the given stats acc. to CLI args."""
     full_table: List[Row] = result_table(
         max_entries=parsed_args.num,
-        collected_stats=collect_stats(parsed_args),
+        collected_stats=stats,
         max_topwords=parsed_args.max_topwords,
     )
     pretty_print_table(full_table)
 
 
+def main() -> None:
+    """Calculate and pretty-print a table of IRC stats acc. to CLI args."""
+    parsed_args = parse_args()
+    if parsed_args.command == "watch":
+        for stats in watch_stats(parsed_args):
+            print_stats(parsed_args, stats)
+    elif parsed_args.command == "export-partial":
+        export_partial(parsed_args)
+    elif parsed_args.command == "merge":
+        merged_stats = merge_stats(parsed_args)
+        if merged_stats is not None:
+            print_stats(parsed_args, merged_stats)
+    else:
+        print_stats(parsed_args, collect_stats(parsed_args))
+
+
 if __name__ == "__main__":
     main()
@@ -1,7 +1,7 @@
 """Run ARIMA and ARIMA-related forecasts pre-fitted over activity stats."""
 
-from dataclasses import asdict, dataclass
-from typing import Any, Mapping, Optional
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Mapping, Optional, Tuple
 
 import pandas as pd
 from darts.models.arima import ARIMA, AutoARIMA
@@ -62,7 +62,8 @@ def auto_arima_analyzed_log(  # noqa: WPS211  # Found too many arguments
     if start_arima_params is None:
         start_arima_params = ArimaParams(d=None)
     if max_arima_params is None:
-        max_arima_params = start_arima_params
+        # a copy, so that the start params don't get doubled too
+        max_arima_params = replace(start_arima_params)
         for param_name, start_value in asdict(max_arima_params).items():
             try:
                 setattr(max_arima_params, param_name, max(start_value * 2, 1))
@@ -83,5 +84,34 @@ def auto_arima_analyzed_log(  # noqa: WPS211  # Found too many arguments
     return model
 
 
+def chosen_orders(model: AutoARIMA) -> Tuple[ArimaParams, Tuple[int, int, int]]:
+    """Get the ARIMA and seasonal (P, D, Q) orders a fitted AutoARIMA settled on."""
+    # darts wraps a pmdarima.AutoARIMA, which keeps the best model it found
+    best_model = model.model.model_
+    p, d, q = best_model.order  # noqa: VNE001,WPS111,C0103
+    seasonal_p, seasonal_d, seasonal_q, _ = best_model.seasonal_order
+    return ArimaParams(p, d, q), (seasonal_p, seasonal_d, seasonal_q)
+
+
+def fixed_orders_kwargs(
+    arima_params: ArimaParams, seasonal_order: Tuple[int, int, int],
+) -> Dict[str, Any]:
+    """Get arguments that limit auto_arima_analyzed_log to a single set of orders.
+
+    seasonal_order is the seasonal (P, D, Q); see chosen_orders.
+    """
+    seasonal_p, seasonal_d, seasonal_q = seasonal_order
+    return {
+        "start_arima_params": arima_params,
+        "max_arima_params": arima_params,
+        "start_P": seasonal_p,
+        "max_P": seasonal_p,
+        "D": seasonal_d,
+        "max_D": seasonal_d,
+        "start_Q": seasonal_q,
+        "max_Q": seasonal_q,
+    }
+
+
 # get to know ARIMA and auto.arima a bit more, look up AIC, BIC. Switch to stats
 # try for different channels
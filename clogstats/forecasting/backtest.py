@@ -0,0 +1,265 @@
+"""Score forecasting models from many forecast origins, not just one.
+
+make_and_compare_predictions scores each model on a single split of a
+series, which says as much about that one day as about the model.
+backtest instead forecasts from many origins, every plan.stride from
+plan.min_train after the series starts, each reaching plan.horizon
+ahead, and scores every forecast with a Metric.
+
+Refitting every model at every origin is what makes this slow, so with
+plan.refit_every = k, models are only fitted at every k-th origin. At the
+origins in between, a model is reused:
+
+- models with a state update (see STATE_UPDATES) take in the points
+  observed since the last origin, then forecast from the new origin;
+- other models forecast further ahead from where they were fitted, and
+  only the plan.horizon right after the new origin gets scored.
+
+Each model's run of k origins is a separate job, and jobs run across a
+pool of workers.
+"""
+
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from darts.metrics import metrics
+from darts.models.forecasting_model import UnivariateForecastingModel  # for typing
+from darts.timeseries import TimeSeries
+
+from clogstats.forecasting.arima import auto_arima_analyzed_log
+from clogstats.forecasting.order_search import searched_arima_analyzed_log
+from clogstats.forecasting.ts_utils import Metric, ModelParams, ModelsToMake, Reduction
+from clogstats.stats.executors import imap_shared
+
+_ONE_DAY: pd.Timedelta = pd.Timedelta("1D")
+
+
+class BacktestPlan(NamedTuple):
+    """Where to forecast from, how far ahead, and how often to refit."""
+
+    # how far ahead each forecast reaches
+    horizon: pd.Timedelta = _ONE_DAY
+    # the time between consecutive origins
+    stride: pd.Timedelta = _ONE_DAY
+    # how much of the series the first origin gets to train on
+    min_train: pd.Timedelta = pd.Timedelta("7D")
+    # fit models at every refit_every-th origin, and reuse them in between
+    refit_every: int = 1
+
+
+class OriginScore(NamedTuple):
+    """How well a model forecast from one origin."""
+
+    model_name: str
+    # the time of the last point the forecast could see
+    origin: pd.Timestamp
+    # NaN if the forecast failed
+    score: float
+    # whether the model was fitted at this origin, rather than reused
+    refitted: bool
+    seconds: float
+    # the exception that stopped the forecast, formatted
+    error: Optional[str] = None
+
+
+class BacktestBlock(NamedTuple):
+    """A model's consecutive origins, sharing one fit."""
+
+    model_name: str
+    model_params: ModelParams
+    # positions of each origin in the series
+    origins: Tuple[int, ...]
+
+
+class BacktestData(NamedTuple):
+    """What every BacktestBlock needs; handed to each worker once."""
+
+    series: TimeSeries
+    metric: Metric
+    # in steps of the series' frequency
+    horizon: int
+
+
+def update_pmdarima(
+    model: UnivariateForecastingModel, new_values: np.ndarray, n_pred: int,
+) -> np.ndarray:
+    """Add new observations to a darts AutoARIMA, and forecast after them.
+
+    pmdarima refines the fitted parameters with a few optimizer iterations
+    started from the current ones, instead of searching orders again.
+    """
+    # darts wraps a pmdarima.AutoARIMA, which keeps the best model it found
+    best_model = model.model.model_
+    best_model.update(new_values)
+    return np.asarray(best_model.predict(n_periods=n_pred))
+
+
+# ways to bring a fitted model up to a later origin without refitting it
+StateUpdate = Callable[[Any, np.ndarray, int], np.ndarray]
+STATE_UPDATES: Mapping[Callable[..., UnivariateForecastingModel], StateUpdate] = (
+    MappingProxyType(
+        {
+            auto_arima_analyzed_log: update_pmdarima,
+            searched_arima_analyzed_log: update_pmdarima,
+        },
+    )
+)
+
+
+def forecast_origins(
+    time_index: pd.DatetimeIndex, horizon: int, plan: BacktestPlan,
+) -> List[int]:
+    """Get the position of each origin, leaving room for a full horizon after it."""
+    last_origin = len(time_index) - 1 - horizon
+    if last_origin < 0:
+        return []
+    origin_times = pd.date_range(
+        time_index[0] + plan.min_train, time_index[last_origin], freq=plan.stride,
+    )
+    # the last point at or before each origin time
+    positions = time_index.searchsorted(origin_times, side="right") - 1
+    return sorted(set(positions[positions >= 0].tolist()))
+
+
+def _frame_to_series(frame: pd.DataFrame, freq: Optional[str]) -> TimeSeries:
+    return TimeSeries.from_dataframe(
+        frame, time_col=None, value_cols=list(frame.columns), freq=freq,
+    )
+
+
+def backtest_block(data: BacktestData, block: BacktestBlock) -> List[OriginScore]:
+    """Forecast from each of a block's origins, fitting only at the first one.
+
+    Catches errors, so a failed forecast only loses its own score; the
+    next origin fits the model again.
+    """
+    frame = data.series.pd_dataframe()
+    freq = frame.index.freqstr or pd.infer_freq(frame.index)
+    prediction_kwargs = block.model_params.prediction_kwargs
+    component = prediction_kwargs.get("component_index") or 0
+    update = STATE_UPDATES.get(block.model_params.prediction_function)
+    scores: List[OriginScore] = []
+    model: Optional[UnivariateForecastingModel] = None
+    # the origin the model's state is at
+    fitted_at = 0
+    for origin in block.origins:
+        start = time.perf_counter()
+        refitted = model is None
+        actual_frame = frame.iloc[origin + 1 : origin + 1 + data.horizon, [component]]
+        try:
+            if model is None:
+                model = block.model_params.prediction_function(
+                    gathered_stats=_frame_to_series(frame.iloc[: origin + 1], freq),
+                    **prediction_kwargs,
+                )
+                forecast = model.predict(data.horizon)
+                fitted_at = origin
+            elif update is not None:
+                new_values = frame.iloc[fitted_at + 1 : origin + 1, component]
+                forecast_frame = pd.DataFrame(
+                    update(model, new_values.to_numpy(dtype=float), data.horizon),
+                    index=actual_frame.index,
+                    columns=actual_frame.columns,
+                )
+                forecast = _frame_to_series(forecast_frame, freq)
+                fitted_at = origin
+            else:
+                # only the part after origin intersects with actual
+                forecast = model.predict(origin - fitted_at + data.horizon)
+            score = float(data.metric(_frame_to_series(actual_frame, freq), forecast))
+        # a failed forecast mustn't take the rest of the backtest down with it
+        except Exception as error:  # noqa: B902, W0703
+            model = None
+            scores.append(
+                OriginScore(
+                    model_name=block.model_name,
+                    origin=frame.index[origin],
+                    score=np.nan,
+                    refitted=refitted,
+                    seconds=time.perf_counter() - start,
+                    error=f"{type(error).__name__}: {error}",
+                ),
+            )
+            continue
+        scores.append(
+            OriginScore(
+                model_name=block.model_name,
+                origin=frame.index[origin],
+                score=score,
+                refitted=refitted,
+                seconds=time.perf_counter() - start,
+            ),
+        )
+    return scores
+
+
+@dataclass
+class Backtest:
+    """The scores of each model from each origin."""
+
+    # indexed by origin, with model_name, score, refitted, seconds and error
+    scores: pd.DataFrame
+
+    def aggregate(self, reduction: Reduction = np.mean) -> Dict[str, float]:
+        """Reduce each model's scores across origins, best first.
+
+        Failed forecasts are left out. Like compare_predictions, lower
+        scores are better.
+        """
+        successful = self.scores[self.scores["error"].isna()]
+        aggregated = {
+            model_name: float(reduction(model_scores.to_numpy()))
+            for model_name, model_scores in successful.groupby("model_name")["score"]
+        }
+        return dict(sorted(aggregated.items(), key=lambda pair: pair[1]))
+
+
+def backtest(  # noqa: WPS211  # Found too many arguments
+    gathered_stats: TimeSeries,
+    predictions_to_make: ModelsToMake,
+    plan: BacktestPlan = None,
+    metric: Metric = metrics.coefficient_of_variation,
+    executor: str = "process",
+    workers: int = None,
+) -> Backtest:
+    """Score each model's forecasts from every origin of plan.
+
+    executor and workers are like those of imap_ordered. Models whose
+    own fitting uses a process pool, like searched_arima_analyzed_log by
+    default, must be told to fit serially when executor is "process".
+    """
+    if plan is None:
+        plan = BacktestPlan()
+    horizon = int(plan.horizon / gathered_stats.freq())
+    origins = forecast_origins(
+        gathered_stats.pd_dataframe().index, horizon, plan,
+    )
+    blocks = [
+        BacktestBlock(model_name, model_params, tuple(origins[first:last]))
+        for model_name, model_params in predictions_to_make.items()
+        for first, last in zip(
+            range(0, len(origins), plan.refit_every),
+            range(plan.refit_every, len(origins) + plan.refit_every, plan.refit_every),
+        )
+    ]
+    block_scores = imap_shared(
+        backtest_block,
+        BacktestData(gathered_stats, metric, horizon),
+        blocks,
+        executor,
+        workers,
+        chunksize=1,
+    )
+    scores = pd.DataFrame(
+        [score for block in block_scores for score in block],
+        columns=OriginScore._fields,
+    )
+    return Backtest(
+        scores.sort_values(["origin", "model_name"], kind="stable").set_index(
+            "origin",
+        ),
+    )
@@ -0,0 +1,269 @@
+"""Forecast many channels with many models at once, across a process pool.
+
+make_and_compare_predictions fits each model one after another for a
+single channel. forecast_channels instead splits the work into one job
+per (channel, model) and runs the jobs across a process pool, so a
+nightly forecast of every channel keeps every core busy. Each job:
+
+- gets its own time limit, enforced with SIGALRM inside the process
+  running it, so a stuck fit gives up without taking its worker along.
+  SIGALRM only reaches the main thread, so jobs run serially from
+  another thread get no time limit;
+- catches its own errors, so one bad fit only loses that model's
+  forecast for that channel;
+- is reported to an optional progress callback as soon as it finishes.
+
+Jobs on the longest series are started first, since they take longest
+to fit and would otherwise be left running alone at the end.
+"""
+
+import signal
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from multiprocessing import Pool
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+)
+
+import pandas as pd
+from darts.metrics import metrics
+from darts.timeseries import TimeSeries
+
+from clogstats.forecasting.model_cache import ModelCache, fit_cached
+from clogstats.forecasting.ts_utils import (
+    Metric,
+    ModelParams,
+    ModelsToMake,
+    PredictionEvaluations,
+    compare_predictions,
+    make_forecasts,
+    make_forecasts_ensure_positive,
+    split_for_evaluation,
+)
+
+# serial runs every job in the calling process, which is easiest to debug.
+# Threads can't be interrupted by SIGALRM, so there's no thread executor.
+BATCH_EXECUTORS = ("serial", "process")
+
+_ONE_DAY: pd.Timedelta = pd.Timedelta("1D")
+
+
+class ForecastTimeout(Exception):
+    """A forecasting job ran past its time limit."""
+
+
+class ForecastJob(NamedTuple):
+    """One model to fit on one channel's training data, and how far to forecast."""
+
+    channel: str
+    model_name: str
+    model_params: ModelParams
+    train: TimeSeries
+    n_pred: int
+    transform: bool = False
+    # seconds; None means no limit
+    timeout: Optional[float] = None
+    # reuse and update fits cached on disk; ignored with transform
+    model_cache: Optional[ModelCache] = None
+
+
+class ForecastOutcome(NamedTuple):
+    """The forecast of a ForecastJob, or why there isn't one."""
+
+    channel: str
+    model_name: str
+    forecast: Optional[TimeSeries]
+    # the exception that stopped the job, formatted
+    error: Optional[str]
+    seconds: float
+
+
+class BatchForecasts(NamedTuple):
+    """Forecasts and their accuracies for each channel, and the jobs that failed."""
+
+    # like make_and_compare_predictions, minus any failed models
+    channels: Dict[str, PredictionEvaluations]
+    failures: List[ForecastOutcome]
+
+
+ProgressCallback = Callable[[int, int, ForecastOutcome], None]
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """Raise ForecastTimeout if the body runs for longer than seconds.
+
+    Relies on SIGALRM, which only works in the main thread of a process.
+    Elsewhere, the body runs without a limit, with a RuntimeWarning.
+    """
+    if not seconds:
+        yield
+        return
+    if threading.current_thread() is not threading.main_thread():
+        warnings.warn(
+            f"can't enforce a {seconds}s time limit outside the main thread",
+            RuntimeWarning,
+        )
+        yield
+        return
+
+    def _raise_timeout(*_: Any) -> None:
+        raise ForecastTimeout(f"took longer than {seconds}s")
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _run_forecast(job: ForecastJob) -> TimeSeries:
+    if job.transform:
+        return make_forecasts_ensure_positive(
+            job.train, job.n_pred, {job.model_name: job.model_params},
+        )[job.model_name]
+    if job.model_cache is not None:
+        model = fit_cached(job.channel, job.model_params, job.train, job.model_cache)
+        return model.predict(job.n_pred)
+    return make_forecasts(
+        job.train, job.n_pred, {job.model_name: job.model_params},
+    )[job.model_name]
+
+
+def run_forecast_job(job: ForecastJob) -> ForecastOutcome:
+    """Fit one model and forecast with it, catching any error."""
+    start = time.perf_counter()
+    try:
+        with time_limit(job.timeout):
+            forecast = _run_forecast(job)
+    # a failed fit mustn't take the rest of the batch down with it
+    except Exception as error:  # noqa: B902, W0703
+        return ForecastOutcome(
+            channel=job.channel,
+            model_name=job.model_name,
+            forecast=None,
+            error=f"{type(error).__name__}: {error}",
+            seconds=time.perf_counter() - start,
+        )
+    return ForecastOutcome(
+        channel=job.channel,
+        model_name=job.model_name,
+        forecast=forecast,
+        error=None,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def run_forecast_jobs(
+    jobs: List[ForecastJob],
+    executor: str = "process",
+    workers: int = None,
+    progress: ProgressCallback = None,
+) -> Iterator[ForecastOutcome]:
+    """Run jobs with the given executor, yielding outcomes as they finish.
+
+    workers defaults to the number of CPUs. Each job's model_params must
+    be picklable for the process executor, e.g. module-level functions.
+    """
+    if executor not in BATCH_EXECUTORS:
+        raise ValueError(
+            f"unknown executor {executor!r};"
+            + f" expected one of {', '.join(BATCH_EXECUTORS)}",
+        )
+    # longest processing time first
+    jobs = sorted(jobs, key=lambda job: len(job.train), reverse=True)
+    if executor == "serial":
+        outcomes: Iterator[ForecastOutcome] = map(run_forecast_job, jobs)
+        for done, outcome in enumerate(outcomes, 1):
+            if progress is not None:
+                progress(done, len(jobs), outcome)
+            yield outcome
+        return
+    # one job at a time per worker: jobs are few and slow
+    with Pool(workers) as pool:
+        outcomes = pool.imap_unordered(run_forecast_job, jobs, chunksize=1)
+        for done, outcome in enumerate(outcomes, 1):
+            if progress is not None:
+                progress(done, len(jobs), outcome)
+            yield outcome
+        # explicitly call close() and join() for coverage.py to work
+        pool.close()
+        pool.join()
+
+
+def forecast_channels(  # noqa: WPS211  # Found too many arguments
+    channels: Mapping[str, TimeSeries],
+    predictions_to_make: ModelsToMake,
+    prediction_duration_past: pd.Timedelta = _ONE_DAY,
+    prediction_duration_future: pd.Timedelta = None,
+    metric: Metric = metrics.coefficient_of_variation,
+    transform: bool = False,
+    timeout: float = None,
+    executor: str = "process",
+    workers: int = None,
+    progress: ProgressCallback = None,
+    model_cache: ModelCache = None,
+) -> BatchForecasts:
+    """Run make_and_compare_predictions on every channel, in parallel.
+
+    Every (channel, model) pair is fitted as a separate job; see
+    run_forecast_jobs. timeout limits each job, in seconds. Failed jobs
+    are left out of their channel's predictions and evaluations and
+    listed in BatchForecasts.failures instead. With a model_cache,
+    untransformed fits are reused and refitted cheaply across runs; see
+    clogstats.forecasting.model_cache.
+    """
+    actuals: Dict[str, TimeSeries] = {}
+    jobs: List[ForecastJob] = []
+    for channel, gathered_stats in channels.items():
+        train, actuals[channel], n_pred = split_for_evaluation(
+            gathered_stats, prediction_duration_past, prediction_duration_future,
+        )
+        jobs.extend(
+            ForecastJob(
+                channel=channel,
+                model_name=model_name,
+                model_params=model_params,
+                train=train,
+                n_pred=n_pred,
+                transform=transform,
+                timeout=timeout,
+                model_cache=model_cache,
+            )
+            for model_name, model_params in predictions_to_make.items()
+        )
+    forecasts: Dict[str, Dict[str, TimeSeries]] = {channel: {} for channel in channels}
+    failures: List[ForecastOutcome] = []
+    for outcome in run_forecast_jobs(jobs, executor, workers, progress):
+        if outcome.forecast is None:
+            failures.append(outcome)
+        else:
+            forecasts[outcome.channel][outcome.model_name] = outcome.forecast
+    return BatchForecasts(
+        channels={
+            channel: PredictionEvaluations(
+                # in the order of predictions_to_make, like make_forecasts
+                predictions={
+                    model_name: channel_forecasts[model_name]
+                    for model_name in predictions_to_make
+                    if model_name in channel_forecasts
+                },
+                evaluations=compare_predictions(
+                    actuals[channel], channel_forecasts, metric,
+                ),
+            )
+            for channel, channel_forecasts in forecasts.items()
+        },
+        failures=failures,
+    )
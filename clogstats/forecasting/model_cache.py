@@ -0,0 +1,206 @@
+"""Cache fitted models on disk, and refit them cheaply as their series grow.
+
+arima_analyzed_log, auto_arima_analyzed_log and hw_analyzed_log fit a
+new model on every call, even if the series only gained a day of data
+since the last time. fit_cached keeps one fitted model per channel and
+model (function and arguments), along with a fingerprint of the series
+it was trained on:
+
+- if the series is unchanged, the cached model is returned as-is;
+- if the series only grew, i.e. the old series is a prefix of the new
+  one, the model is refitted with a warm start where one is known; see
+  WARM_STARTS. AutoARIMA reuses the orders its last full search chose
+  instead of searching again, until the series has grown by more than
+  ModelCache.max_growth since that search;
+- otherwise the model is fitted from scratch.
+
+Entries are pickled, one file per channel and model, and evicted least
+recently used first once they take up more than ModelCache.max_bytes.
+Only load a cache directory you wrote yourself: unpickling runs code.
+"""
+
+import hashlib
+import os
+import pickle  # noqa: S403  # only our own cache entries get unpickled
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, NamedTuple, Optional
+
+import pandas as pd
+from darts.models.forecasting_model import UnivariateForecastingModel  # for typing
+from darts.timeseries import TimeSeries
+
+from clogstats.forecasting.arima import (
+    auto_arima_analyzed_log,
+    chosen_orders,
+    fixed_orders_kwargs,
+)
+from clogstats.forecasting.ts_utils import ModelParams
+from clogstats.stats.cache import default_cache_dir
+
+# bump this whenever ModelEntry changes
+MODEL_CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ModelCache(NamedTuple):
+    """Settings for the on-disk cache of fitted models."""
+
+    # defaults to the "models" directory in default_cache_dir()
+    cache_dir: Optional[Path] = None
+    # least recently used entries are evicted beyond this many bytes
+    max_bytes: int = DEFAULT_MAX_BYTES
+    # warm starts are used until the series grows by this fraction of its
+    # length at the last full fit; beyond that, fit from scratch again
+    max_growth: float = 0.5
+    # ignore existing entries and fit every model from scratch
+    rebuild: bool = False
+
+
+class ModelEntry(NamedTuple):
+    """A fitted model and the series it was fitted on."""
+
+    version: int
+    # see model_key; guards against hash collisions
+    key: str
+    # length and series_fingerprint of the training series
+    length: int
+    fingerprint: str
+    # length of the training series the last time it was fitted from scratch
+    full_fit_length: int
+    model: UnivariateForecastingModel
+
+
+def model_key(channel: str, model_params: ModelParams) -> str:
+    """Describe a channel and a model to fit, including all of its arguments."""
+    function = model_params.prediction_function
+    arguments = ", ".join(
+        f"{name}={argument!r}"
+        for name, argument in sorted(model_params.prediction_kwargs.items())
+    )
+    return f"{channel}: {function.__module__}.{function.__qualname__}({arguments})"
+
+
+def model_file(key: str, cache_dir: Path) -> Path:
+    """Get the location of the cache entry for a model_key."""
+    return cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.pickle"
+
+
+def series_fingerprint(series: TimeSeries, length: int) -> str:
+    """Hash the times and values of the first length points of a series."""
+    head = series.pd_dataframe().iloc[:length]
+    return hashlib.sha256(
+        pd.util.hash_pandas_object(head, index=True).to_numpy().tobytes(),
+    ).hexdigest()
+
+
+def save_model_entry(entry: ModelEntry, destination: Path) -> None:
+    """Write a cache entry to disk atomically."""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp_destination = destination.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_destination, "wb") as cache_out:
+        pickle.dump(entry, cache_out, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_destination, destination)
+
+
+def load_model_entry(source: Path, key: str) -> Optional[ModelEntry]:
+    """Read a cache entry from disk, if there's a usable one."""
+    try:
+        with open(source, "rb") as cache_in:
+            entry = pickle.load(cache_in)  # noqa: S301
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None  # missing, corrupt, or pickled by an incompatible version
+    if not isinstance(entry, ModelEntry) or entry.version != MODEL_CACHE_VERSION:
+        return None
+    if entry.key != key:  # hash collision
+        return None
+    return entry
+
+
+def evict_models(cache_dir: Path, max_bytes: int) -> None:
+    """Delete the least recently used entries until the rest fit in max_bytes."""
+    entries = []
+    for path in cache_dir.glob("*.pickle"):
+        try:
+            stat_result = path.stat()
+        except FileNotFoundError:  # evicted by another process
+            continue
+        entries.append((stat_result.st_mtime_ns, stat_result.st_size, path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass  # evicted by another process
+        total_size -= size
+
+
+def warm_start_auto_arima(
+    model_params: ModelParams, fitted: UnivariateForecastingModel,
+) -> ModelParams:
+    """Narrow an AutoARIMA search down to the orders it chose last time."""
+    prediction_kwargs = dict(model_params.prediction_kwargs)
+    prediction_kwargs.update(fixed_orders_kwargs(*chosen_orders(fitted)))
+    return ModelParams(model_params.prediction_function, prediction_kwargs)
+
+
+# ways to refit a model on a longer series, starting from its previous fit.
+# Models without one get fitted from scratch.
+WARM_STARTS: Mapping[
+    Callable[..., UnivariateForecastingModel],
+    Callable[[ModelParams, Any], ModelParams],
+] = MappingProxyType({auto_arima_analyzed_log: warm_start_auto_arima})
+
+
+def fit_cached(
+    channel: str,
+    model_params: ModelParams,
+    train: TimeSeries,
+    model_cache: ModelCache = None,
+) -> UnivariateForecastingModel:
+    """Fit a model like make_forecasts does, reusing the cached fit if possible."""
+    if model_cache is None:
+        model_cache = ModelCache()
+    cache_dir = model_cache.cache_dir or default_cache_dir() / "models"
+    key = model_key(channel, model_params)
+    destination = model_file(key, cache_dir)
+    cached: Optional[ModelEntry] = None
+    if not model_cache.rebuild:
+        cached = load_model_entry(destination, key)
+    if cached is not None and (
+        cached.length > len(train)
+        or series_fingerprint(train, cached.length) != cached.fingerprint
+    ):
+        cached = None  # not a prefix of train
+    if cached is not None and cached.length == len(train):
+        os.utime(destination)  # mark it as recently used
+        return cached.model
+    fit_params = model_params
+    full_fit_length = len(train)
+    warm_start = WARM_STARTS.get(model_params.prediction_function)
+    if (
+        cached is not None
+        and warm_start is not None
+        and len(train) <= cached.full_fit_length * (1 + model_cache.max_growth)
+    ):
+        fit_params = warm_start(model_params, cached.model)
+        full_fit_length = cached.full_fit_length
+    model = fit_params.prediction_function(
+        gathered_stats=train, **fit_params.prediction_kwargs,
+    )
+    save_model_entry(
+        ModelEntry(
+            version=MODEL_CACHE_VERSION,
+            key=key,
+            length=len(train),
+            fingerprint=series_fingerprint(train, len(train)),
+            full_fit_length=full_fit_length,
+            model=model,
+        ),
+        destination,
+    )
+    evict_models(cache_dir, model_cache.max_bytes)
+    return model
@@ -0,0 +1,368 @@
+"""Baseline forecasts of many channels at once, with nothing but NumPy.
+
+The models in arima.py and holt_winters.py need darts, scikit-learn and
+pmdarima, take seconds just to import, and fit one channel at a time.
+The models here fit a whole matrix of series at once, with a row per
+channel and a column per interval (see clogstats.stats.peaks.activity_matrix):
+
+- SeasonalNaive repeats each series' last season;
+- SimpleSmoothing is simple exponential smoothing;
+- AdditiveHoltWinters is additive Holt-Winters (ETS(A,A,A)).
+
+Smoothing parameters minimize the sum of squared one-step errors of each
+series. They're optimized for every series at once: the recursions run
+along time, vectorized across series and candidate parameters, first
+over a coarse grid and then by golden-section search on one parameter
+at a time.
+
+forecast_activity forecasts a whole activity matrix. To pick these
+models per run with make_forecasts, use seasonal_naive_analyzed_log,
+ses_analyzed_log and numpy_hw_analyzed_log in a ModelsToMake; those
+need darts only to wrap their forecasts in a TimeSeries.
+"""
+
+import itertools
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from darts.timeseries import TimeSeries  # type: ignore
+except ImportError:  # optional; only needed to plug into make_forecasts
+    TimeSeries = None  # noqa: WPS440
+
+# golden-section steps per parameter; each shrinks the bracket by ~38%
+GOLDEN_ITERATIONS = 12
+
+# coarse grids of (alpha, beta, gamma) tried before refining each parameter
+SMOOTHING_GRID = (0.1, 0.3, 0.5, 0.7, 0.9)
+TREND_GRID = (0.05, 0.3)
+SEASONAL_GRID = (0.05, 0.3)
+
+_INV_PHI = (math.sqrt(5) - 1) / 2
+
+Objective = Callable[[np.ndarray], np.ndarray]
+
+
+def as_matrix(values: np.ndarray) -> np.ndarray:
+    """Get series as a float matrix with a row per series."""
+    matrix: np.ndarray = np.atleast_2d(np.asarray(values, dtype=float))
+    return matrix
+
+
+def golden_section(
+    objective: Objective, series_count: int, iterations: int = GOLDEN_ITERATIONS,
+) -> np.ndarray:
+    """Minimize a per-series objective over [0, 1], for every series at once.
+
+    objective takes a parameter per series and returns a loss per series.
+    """
+    low = np.zeros(series_count)
+    high = np.ones(series_count)
+    lower_probe = high - _INV_PHI * (high - low)
+    upper_probe = low + _INV_PHI * (high - low)
+    lower_loss = objective(lower_probe)
+    upper_loss = objective(upper_probe)
+    for _ in range(iterations):
+        # keep the half of the bracket around the lower loss
+        go_left = lower_loss < upper_loss
+        high = np.where(go_left, upper_probe, high)
+        low = np.where(go_left, low, lower_probe)
+        new_lower = np.where(go_left, high - _INV_PHI * (high - low), upper_probe)
+        new_upper = np.where(go_left, lower_probe, low + _INV_PHI * (high - low))
+        new_loss = objective(np.where(go_left, new_lower, new_upper))
+        lower_loss, upper_loss = (
+            np.where(go_left, new_loss, upper_loss),
+            np.where(go_left, lower_loss, new_loss),
+        )
+        lower_probe, upper_probe = new_lower, new_upper
+    return np.where(lower_loss < upper_loss, lower_probe, upper_probe)
+
+
+@dataclass
+class SeasonalNaive:
+    """Forecast each series by repeating its last season."""
+
+    season: int
+    last_season: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def fit(self, values: np.ndarray) -> "SeasonalNaive":
+        """Remember the last season of each series."""
+        values = as_matrix(values)
+        if values.shape[1] < self.season:
+            raise ValueError("seasonal naive forecasts need a whole season")
+        self.last_season = values[:, -self.season :]
+        return self
+
+    def predict(self, n_pred: int) -> np.ndarray:
+        """Forecast n_pred steps of each series."""
+        if self.last_season is None:
+            raise ValueError("fit the model before predicting")
+        return self.last_season[:, np.arange(n_pred) % self.season]
+
+
+def ses_errors(
+    values: np.ndarray, alpha: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Run simple exponential smoothing with a column of alphas per series.
+
+    Returns the sum of squared one-step errors and the final level, both
+    shaped like alpha.
+    """
+    alpha = np.broadcast_to(alpha, (values.shape[0], np.shape(alpha)[-1]))
+    level = np.repeat(values[:, :1], alpha.shape[1], axis=1)
+    sse = np.zeros(alpha.shape)
+    for column in values.T[1:]:
+        error = column[:, None] - level
+        sse += error ** 2
+        level = level + alpha * error
+    return sse, level
+
+
+@dataclass
+class SimpleSmoothing:
+    """Simple exponential smoothing, with a fitted alpha per series."""
+
+    alpha: Optional[np.ndarray] = field(default=None)
+    level: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def fit(self, values: np.ndarray) -> "SimpleSmoothing":
+        """Fit alpha and the final level of each series."""
+        values = as_matrix(values)
+        self.alpha = golden_section(
+            lambda alpha: ses_errors(values, alpha[:, None])[0][:, 0], len(values),
+        )
+        _, level = ses_errors(values, self.alpha[:, None])
+        self.level = level[:, 0]
+        return self
+
+    def predict(self, n_pred: int) -> np.ndarray:
+        """Forecast n_pred steps of each series."""
+        if self.level is None:
+            raise ValueError("fit the model before predicting")
+        return np.repeat(self.level[:, None], n_pred, axis=1)
+
+
+class HoltWintersState:
+    """Level, trend and seasonal components, per series and per candidate."""
+
+    def __init__(self, values: np.ndarray, season: int, candidates: int) -> None:
+        """Initialize the components from the first two seasons of each series."""
+        first_mean = values[:, :season].mean(axis=1)
+        second_mean = values[:, season : 2 * season].mean(axis=1)
+        self.level = np.repeat(first_mean[:, None], candidates, axis=1)
+        self.trend = np.repeat(
+            ((second_mean - first_mean) / season)[:, None], candidates, axis=1,
+        )
+        self.seasonals = np.repeat(
+            (values[:, :season] - first_mean[:, None])[:, None, :], candidates, axis=1,
+        )
+
+
+def hw_errors(
+    values: np.ndarray,
+    season: int,
+    alpha: np.ndarray,
+    beta: np.ndarray,
+    gamma: np.ndarray,
+) -> Tuple[np.ndarray, HoltWintersState]:
+    """Run additive Holt-Winters with columns of candidate parameters per series.
+
+    beta and gamma are given as fractions of their upper bounds, alpha
+    and 1 - alpha, so that every parameter is within [0, 1]. Returns the
+    sum of squared one-step errors after the first season, and the final
+    state.
+    """
+    candidates = max(np.shape(param)[-1] for param in (alpha, beta, gamma))
+    shape = (values.shape[0], candidates)
+    alpha = np.broadcast_to(alpha, shape)
+    trend_gain = alpha * np.broadcast_to(beta, shape)
+    seasonal_gain = (1 - alpha) * np.broadcast_to(gamma, shape)
+    state = HoltWintersState(values, season, shape[1])
+    sse = np.zeros(shape)
+    for time_step in range(season, values.shape[1]):
+        phase = time_step % season
+        error = values[:, time_step, None] - (
+            state.level + state.trend + state.seasonals[:, :, phase]
+        )
+        sse += error ** 2
+        state.level = state.level + state.trend + alpha * error
+        state.trend = state.trend + trend_gain * error
+        state.seasonals[:, :, phase] += seasonal_gain * error
+    return sse, state
+
+
+@dataclass
+class AdditiveHoltWinters:
+    """Additive Holt-Winters, with fitted parameters per series.
+
+    beta and gamma are fractions of their upper bounds; see hw_errors.
+    """
+
+    season: int
+    # rounds of golden-section search over each parameter in turn
+    rounds: int = 2
+    params: Optional[np.ndarray] = field(default=None)
+    state: Optional[HoltWintersState] = field(default=None, repr=False)
+    # the number of points each series was fitted on
+    length: int = 0
+
+    def fit(self, values: np.ndarray) -> "AdditiveHoltWinters":
+        """Fit the parameters and final state of each series."""
+        values = as_matrix(values)
+        if values.shape[1] < 2 * self.season:
+            raise ValueError("Holt-Winters forecasts need two whole seasons")
+        grid = np.array(
+            list(itertools.product(SMOOTHING_GRID, TREND_GRID, SEASONAL_GRID)),
+        )
+        grid_errors, _ = hw_errors(values, self.season, *grid.T[:, None, :])
+        # (alpha, beta, gamma) of each series
+        params = grid[grid_errors.argmin(axis=1)]
+        for _ in range(self.rounds):
+            for param in range(params.shape[1]):
+                params[:, param] = golden_section(
+                    self._objective(values, params, param), len(values),
+                )
+        _, self.state = hw_errors(values, self.season, *params.T[:, :, None])
+        self.params = params
+        self.length = values.shape[1]
+        return self
+
+    def predict(self, n_pred: int) -> np.ndarray:
+        """Forecast n_pred steps of each series."""
+        if self.state is None:
+            raise ValueError("fit the model before predicting")
+        steps = np.arange(1, n_pred + 1)
+        phases = (self.length - 1 + steps) % self.season
+        forecast: np.ndarray = (
+            self.state.level
+            + self.state.trend * steps
+            + self.state.seasonals[:, 0, phases]
+        )
+        return forecast
+
+    def _objective(
+        self, values: np.ndarray, params: np.ndarray, param: int,
+    ) -> Objective:
+        def objective(candidate: np.ndarray) -> np.ndarray:
+            trial = params.copy()
+            trial[:, param] = candidate
+            return hw_errors(values, self.season, *trial.T[:, :, None])[0][:, 0]
+
+        return objective
+
+
+BatchModel = Union[SeasonalNaive, SimpleSmoothing, AdditiveHoltWinters]
+
+MODELS = ("seasonal_naive", "ses", "holt_winters")
+
+
+def make_model(model: str, season: int = 1) -> BatchModel:
+    """Create one of MODELS, e.g. to choose it from the command line."""
+    if model == "seasonal_naive":
+        return SeasonalNaive(season)
+    if model == "ses":
+        return SimpleSmoothing()
+    if model == "holt_winters":
+        return AdditiveHoltWinters(season)
+    raise ValueError(f"unknown model {model!r}; expected one of {', '.join(MODELS)}")
+
+
+def future_times(times: pd.DatetimeIndex, n_pred: int) -> pd.DatetimeIndex:
+    """Get the n_pred evenly spaced times after times."""
+    step = times[-1] - times[-2]
+    return pd.DatetimeIndex(times[-1] + step * np.arange(1, n_pred + 1))
+
+
+def forecast_activity(
+    activity: pd.DataFrame,
+    n_pred: int,
+    model: str = "holt_winters",
+    seasonal_length: pd.Timedelta = pd.Timedelta("1D"),
+) -> pd.DataFrame:
+    """Forecast every channel of an activity matrix at once.
+
+    activity has a row per channel and a column per evenly spaced time,
+    like the result of clogstats.stats.peaks.activity_matrix. Returns a
+    matrix like it of the next n_pred times.
+    """
+    times = pd.DatetimeIndex(activity.columns)
+    season = max(int(seasonal_length / (times[1] - times[0])), 1)
+    fitted = make_model(model, season).fit(activity.to_numpy(dtype=float))
+    return pd.DataFrame(
+        fitted.predict(n_pred),
+        index=activity.index,
+        columns=future_times(times, n_pred),
+    )
+
+
+class FittedSeries:
+    """A model fitted on one component of a darts TimeSeries, like darts models.
+
+    Lets the models here be used through ModelParams and make_forecasts.
+    """
+
+    def __init__(
+        self, model: BatchModel, gathered_stats: "TimeSeries", component_index: int,
+    ) -> None:
+        """Fit model on one component of gathered_stats."""
+        if TimeSeries is None:
+            raise ImportError("forecasting a darts TimeSeries requires darts")
+        component = gathered_stats.pd_dataframe().iloc[:, component_index]
+        self.name = component.name
+        self.times = component.index
+        self.freq = self.times.freqstr or pd.infer_freq(self.times)
+        self.model = model.fit(component.to_numpy(dtype=float))
+
+    def predict(self, n_pred: int) -> "TimeSeries":
+        """Forecast n_pred steps, as a darts TimeSeries."""
+        forecast_df = pd.DataFrame(
+            {self.name: self.model.predict(n_pred)[0]},
+            index=future_times(self.times, n_pred),
+        )
+        return TimeSeries.from_dataframe(
+            forecast_df, time_col=None, value_cols=[self.name], freq=self.freq,
+        )
+
+
+def _season(gathered_stats: "TimeSeries", seasonal_length: pd.Timedelta) -> int:
+    return max(int(seasonal_length / gathered_stats.freq()), 1)
+
+
+def seasonal_naive_analyzed_log(
+    gathered_stats: "TimeSeries",
+    seasonal_length: pd.Timedelta = pd.Timedelta("1D"),
+    component_index: int = 0,
+) -> FittedSeries:
+    """Create a pre-fitted seasonal naive model from IRC log stats."""
+    return FittedSeries(
+        SeasonalNaive(_season(gathered_stats, seasonal_length)),
+        gathered_stats,
+        component_index,
+    )
+
+
+def ses_analyzed_log(
+    gathered_stats: "TimeSeries", component_index: int = 0,
+) -> FittedSeries:
+    """Create a pre-fitted simple exponential smoothing model from IRC log stats."""
+    return FittedSeries(SimpleSmoothing(), gathered_stats, component_index)
+
+
+def numpy_hw_analyzed_log(
+    gathered_stats: "TimeSeries",
+    seasonal_length: pd.Timedelta = pd.Timedelta("1D"),
+    component_index: int = 0,
+) -> FittedSeries:
+    """Create a pre-fitted additive Holt-Winters model from IRC log stats.
+
+    Like hw_analyzed_log, without darts or statsmodels doing the fitting.
+    """
+    return FittedSeries(
+        AdditiveHoltWinters(_season(gathered_stats, seasonal_length)),
+        gathered_stats,
+        component_index,
+    )
@@ -0,0 +1,375 @@
+"""Search for ARIMA orders in parallel, within a budget.
+
+auto_arima_analyzed_log leaves the search to pmdarima, which tries one
+order after another in a single process, for as long as it takes.
+search_orders instead fits candidate (p, d, q)(P, D, Q) orders in waves,
+each spread across a pool of workers:
+
+- the first wave holds the same starting orders as pmdarima's stepwise
+  search;
+- each later wave holds the untried neighbours (one step away in p, q,
+  P or Q) of every candidate whose AIC is within SearchBudget.aic_margin
+  of the best so far. Neighbours of worse candidates are pruned without
+  being fitted;
+- the search stops when a wave finds nothing better, or when it runs out
+  of fits or time. No wave starts once time runs out, and fits still
+  running are stopped with SIGALRM (see batch.time_limit). With the
+  thread executor, fits can't be interrupted and run to completion.
+
+d and D are estimated once up front with unit root tests, like pmdarima
+does, unless they're given. Every fit's AIC and timing is kept, to show
+where the time went; see OrderSearch.to_frame.
+"""
+
+import time
+import warnings
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import pmdarima  # type: ignore
+from darts.models.arima import AutoARIMA
+from darts.timeseries import TimeSeries
+
+from clogstats.forecasting.arima import (
+    ArimaParams,
+    auto_arima_analyzed_log,
+    fixed_orders_kwargs,
+)
+from clogstats.forecasting.batch import ForecastTimeout, time_limit
+from clogstats.stats.executors import imap_shared
+
+_ONE_DAY = pd.Timedelta("1D")
+
+# the largest seasonal (P, D, Q) searched by default. Seasonal fits with a
+# period of a day in 10-minute buckets (m = 144) are very slow already.
+DEFAULT_MAX_SEASONAL = ArimaParams(p=1, d=1, q=1)
+
+
+class SearchBudget(NamedTuple):
+    """Limits on how long search_orders may take."""
+
+    # wall-clock seconds for the whole search; None means no limit
+    seconds: Optional[float] = 60
+    # the most candidates to fit; None means no limit
+    fits: Optional[int] = 40
+    # neighbours are only tried for candidates this close to the best AIC
+    aic_margin: float = 2
+
+
+class Candidate(NamedTuple):
+    """An ARIMA order and a seasonal order, like pmdarima.ARIMA takes."""
+
+    order: Tuple[int, int, int]
+    # (P, D, Q, m)
+    seasonal_order: Tuple[int, int, int, int]
+
+
+class FitData(NamedTuple):
+    """What every candidate is fitted on, shared with each worker once."""
+
+    endog: np.ndarray
+    # time.time() by which every fit must finish; None means no limit
+    deadline: Optional[float] = None
+
+
+class CandidateFit(NamedTuple):
+    """How well and how fast a candidate fit."""
+
+    candidate: Candidate
+    # infinite if the fit failed
+    aic: float
+    seconds: float
+    # the exception that stopped the fit, formatted
+    error: Optional[str] = None
+
+
+@dataclass
+class OrderSearch:
+    """The outcome of search_orders."""
+
+    fits: List[CandidateFit] = field(default_factory=list)
+    # candidates never tried because, in some wave, all the candidates
+    # next to them were worse than aic_margin
+    pruned: int = 0
+    # why the search stopped: "converged", "fits" or "seconds"
+    stopped_by: str = "converged"
+    seconds: float = 0
+
+    @property
+    def best(self) -> Optional[CandidateFit]:
+        """Get the successful fit with the lowest AIC, if there's one."""
+        successful = [fit for fit in self.fits if np.isfinite(fit.aic)]
+        if not successful:
+            return None
+        return min(successful, key=lambda fit: fit.aic)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get each fit's orders, AIC, timing and error, slowest first."""
+        return pd.DataFrame(
+            [
+                {
+                    "order": fit.candidate.order,
+                    "seasonal_order": fit.candidate.seasonal_order,
+                    "aic": fit.aic,
+                    "seconds": fit.seconds,
+                    "error": fit.error,
+                }
+                for fit in self.fits
+            ],
+            columns=["order", "seasonal_order", "aic", "seconds", "error"],
+        ).sort_values("seconds", ascending=False)
+
+
+def fit_candidate(data: FitData, candidate: Candidate) -> CandidateFit:
+    """Fit one candidate and get its AIC, catching any error.
+
+    A fit still running at data.deadline is stopped with ForecastTimeout.
+    """
+    start = time.perf_counter()
+    seconds = None
+    if data.deadline is not None:
+        seconds = data.deadline - time.time()
+    try:
+        if seconds is not None and seconds <= 0:
+            raise ForecastTimeout("the search ran out of time before this fit")
+        # time_limit's warning outside the main thread is ignored with the rest
+        with warnings.catch_warnings(), time_limit(seconds):
+            warnings.simplefilter("ignore")
+            fitted = pmdarima.ARIMA(
+                order=candidate.order,
+                seasonal_order=candidate.seasonal_order,
+                suppress_warnings=True,
+            ).fit(data.endog)
+        aic = float(fitted.aic())
+    # statsmodels fails in many ways on orders that don't suit the data
+    except Exception as error:  # noqa: B902, W0703
+        return CandidateFit(
+            candidate=candidate,
+            aic=np.inf,
+            seconds=time.perf_counter() - start,
+            error=f"{type(error).__name__}: {error}",
+        )
+    return CandidateFit(candidate, aic, time.perf_counter() - start)
+
+
+def first_candidates(
+    start_arima_params: ArimaParams, seasonal_d: int, seasonal_periods: int,
+) -> List[Candidate]:
+    """Get the orders pmdarima's stepwise search starts with.
+
+    start_arima_params.d must already be estimated; see search_orders.
+    """
+    p, d, q = (  # noqa: VNE001,WPS111,C0103
+        start_arima_params.p,
+        start_arima_params.d,
+        start_arima_params.q,
+    )
+    if d is None:
+        raise ValueError("d must be given or estimated before searching")
+    no_season = (0, 0, 0, 0)
+    if seasonal_periods <= 1:
+        return [
+            Candidate((p, d, q), no_season),
+            Candidate((0, d, 0), no_season),
+            Candidate((1, d, 0), no_season),
+            Candidate((0, d, 1), no_season),
+        ]
+    return [
+        Candidate((p, d, q), (1, seasonal_d, 1, seasonal_periods)),
+        Candidate((0, d, 0), (0, seasonal_d, 0, seasonal_periods)),
+        Candidate((1, d, 0), (1, seasonal_d, 0, seasonal_periods)),
+        Candidate((0, d, 1), (0, seasonal_d, 1, seasonal_periods)),
+    ]
+
+
+def neighbours(
+    candidate: Candidate, max_arima_params: ArimaParams, max_seasonal: ArimaParams,
+) -> Iterator[Candidate]:
+    """Get the candidates one step away in p, q, P or Q, within the maximums."""
+    p, d, q = candidate.order  # noqa: VNE001,WPS111,C0103
+    seasonal_p, seasonal_d, seasonal_q, seasonal_periods = candidate.seasonal_order
+    steps = [(1, 0, 0, 0), (0, 1, 0, 0), (1, 1, 0, 0)]
+    if seasonal_periods > 1:
+        steps.extend([(0, 0, 1, 0), (0, 0, 0, 1)])
+    for step in steps:
+        for sign in (1, -1):
+            new_p, new_q, new_seasonal_p, new_seasonal_q = (
+                value + sign * delta
+                for value, delta in zip((p, q, seasonal_p, seasonal_q), step)
+            )
+            if (
+                0 <= new_p <= max_arima_params.p
+                and 0 <= new_q <= max_arima_params.q
+                and 0 <= new_seasonal_p <= max_seasonal.p
+                and 0 <= new_seasonal_q <= max_seasonal.q
+            ):
+                yield Candidate(
+                    (new_p, d, new_q),
+                    (new_seasonal_p, seasonal_d, new_seasonal_q, seasonal_periods),
+                )
+
+
+def _next_wave(
+    fitted: Dict[Candidate, CandidateFit],
+    max_arima_params: ArimaParams,
+    max_seasonal: ArimaParams,
+    aic_margin: float,
+) -> Tuple[List[Candidate], Set[Candidate]]:
+    best_aic = min(fit.aic for fit in fitted.values())
+    # the best AIC of the candidates each untried neighbour is next to
+    parent_aics: Dict[Candidate, float] = {}
+    pruned: Set[Candidate] = set()
+    for candidate, fit in fitted.items():
+        for neighbour in neighbours(candidate, max_arima_params, max_seasonal):
+            if neighbour in fitted:
+                continue
+            if fit.aic > best_aic + aic_margin:
+                pruned.add(neighbour)
+            else:
+                parent_aics[neighbour] = min(
+                    fit.aic, parent_aics.get(neighbour, np.inf),
+                )
+    # neighbours of the best candidates first, in case the budget runs out
+    wave = sorted(parent_aics, key=parent_aics.__getitem__)
+    return wave, pruned - set(parent_aics)
+
+
+def series_values(
+    gathered_stats: TimeSeries, component_index: int = None,
+) -> np.ndarray:
+    """Get one component of a series as a float array."""
+    component = gathered_stats.pd_dataframe().iloc[:, component_index or 0]
+    values: np.ndarray = component.to_numpy(dtype=float)
+    return values
+
+
+def search_orders(  # noqa: WPS211  # Found too many arguments
+    gathered_stats: TimeSeries,
+    start_arima_params: ArimaParams = None,
+    max_arima_params: ArimaParams = None,
+    component_index: int = None,
+    seasonal_length: pd.Timedelta = None,
+    max_seasonal: ArimaParams = DEFAULT_MAX_SEASONAL,
+    budget: SearchBudget = None,
+    executor: str = "process",
+    workers: int = None,
+) -> OrderSearch:
+    """Search for the ARIMA orders with the lowest AIC, fitting candidates in parallel.
+
+    Without a seasonal_length, only non-seasonal orders are searched.
+    executor and workers are like those of imap_ordered; use the serial
+    executor from within a process pool, e.g. in forecast_channels.
+    """
+    if start_arima_params is None:
+        start_arima_params = ArimaParams(p=2, d=None, q=2)
+    if max_arima_params is None:
+        max_arima_params = ArimaParams(p=5, d=2, q=5)
+    if budget is None:
+        budget = SearchBudget()
+    endog = series_values(gathered_stats, component_index)
+    seasonal_periods = 1
+    if seasonal_length:
+        seasonal_periods = int(seasonal_length / gathered_stats.freq())
+    if start_arima_params.d is None:
+        start_arima_params = replace(
+            start_arima_params,
+            d=pmdarima.arima.ndiffs(endog, max_d=max_arima_params.d or 0),
+        )
+    seasonal_d = 0
+    if seasonal_periods > 1:
+        seasonal_d = pmdarima.arima.nsdiffs(
+            endog, seasonal_periods, max_D=max_seasonal.d,
+        )
+    search = OrderSearch()
+    start = time.perf_counter()
+    deadline = None
+    if budget.seconds is not None:
+        deadline = time.time() + budget.seconds
+    fitted: Dict[Candidate, CandidateFit] = {}
+    pruned: Set[Candidate] = set()
+    wave = first_candidates(start_arima_params, seasonal_d, seasonal_periods)
+    while wave:
+        if budget.fits is not None and len(fitted) >= budget.fits:
+            search.stopped_by = "fits"
+            break
+        if deadline is not None and time.time() >= deadline:
+            search.stopped_by = "seconds"
+            break
+        if budget.fits is not None:
+            wave = wave[: budget.fits - len(fitted)]
+        best_aic = min((fit.aic for fit in fitted.values()), default=np.inf)
+        # one candidate at a time per worker: fits are few and slow
+        candidate_fits = imap_shared(
+            fit_candidate,
+            FitData(endog, deadline),
+            wave,
+            executor,
+            workers,
+            chunksize=1,
+        )
+        try:
+            for candidate_fit in candidate_fits:
+                fitted[candidate_fit.candidate] = candidate_fit
+                search.fits.append(candidate_fit)
+                if deadline is not None and time.time() >= deadline:
+                    search.stopped_by = "seconds"
+                    break
+        finally:
+            # stops fits still running in a process pool
+            candidate_fits.close()
+        if search.stopped_by == "seconds" or not np.isfinite(
+            min(fit.aic for fit in fitted.values()),
+        ):
+            break
+        if min(fit.aic for fit in fitted.values()) >= best_aic:
+            break  # converged: this wave found nothing better
+        wave, wave_pruned = _next_wave(
+            fitted, max_arima_params, max_seasonal, budget.aic_margin,
+        )
+        pruned |= wave_pruned
+    # a candidate pruned in one wave may still be tried in a later one
+    search.pruned = len(pruned - fitted.keys())
+    search.seconds = time.perf_counter() - start
+    return search
+
+
+def searched_arima_analyzed_log(  # noqa: WPS211  # Found too many arguments
+    gathered_stats: TimeSeries,
+    start_arima_params: ArimaParams = None,
+    max_arima_params: ArimaParams = None,
+    component_index: int = None,
+    seasonal_length: pd.Timedelta = None,
+    budget: SearchBudget = None,
+    executor: str = "process",
+    workers: int = None,
+) -> AutoARIMA:
+    """Like auto_arima_analyzed_log, but pick the orders with search_orders.
+
+    The chosen orders are then fitted once more, by a darts AutoARIMA
+    limited to just those orders.
+    """
+    search = search_orders(
+        gathered_stats,
+        start_arima_params=start_arima_params,
+        max_arima_params=max_arima_params,
+        component_index=component_index,
+        seasonal_length=seasonal_length,
+        budget=budget,
+        executor=executor,
+        workers=workers,
+    )
+    if search.best is None:
+        raise ValueError("every candidate ARIMA order failed to fit")
+    p, d, q = search.best.candidate.order  # noqa: VNE001,WPS111,C0103
+    seasonal_p, seasonal_d, seasonal_q, _ = search.best.candidate.seasonal_order
+    return auto_arima_analyzed_log(
+        gathered_stats,
+        component_index=component_index,
+        seasonal=seasonal_length is not None,
+        seasonal_length=seasonal_length or _ONE_DAY,
+        **fixed_orders_kwargs(
+            ArimaParams(p, d, q), (seasonal_p, seasonal_d, seasonal_q),
+        ),
+    )
@@ -1,7 +1,8 @@
 """Detect and list peaks in channel activity.
 
 Listing peaks across a forecast can be a useful way to figure out when
-the best time to visit a channel will be.
+the best time to visit a channel will be. To find the peaks of every
+channel at once, see clogstats.stats.peaks.
 """
 
 from dataclasses import dataclass
@@ -12,7 +13,7 @@ import pandas as pd
 import scipy as sp
 from darts.timeseries import TimeSeries
 
-from clogstats.stats.gather_stats import DateRange
+from clogstats.stats.parse import DateRange
 
 _SIX_HOURS = pd.Timedelta("6H")
 
@@ -69,8 +70,9 @@ def intervals_with_activity(
 ) -> List[DateRange]:
     """Specify the intervals across which a channel will be most active."""
     timestamps = time_series.pd_series().index.to_numpy()
-    pairs: np.ndarray = np.array((timestamps[:-1], timestamps[1:])).T
     indices, _ = find_peak_indices(time_series, PeakParams(interval, distance, wlen))
     # create DateRange objects from time intervals corresponding to peaks
-    # pylint false positive: pylint claims pairs is unsubscriptable
-    return [DateRange(*pair) for pair in pairs[indices]]  # noqa: E1136
+    return [
+        DateRange(start_time, end_time)
+        for start_time, end_time in zip(timestamps[indices], timestamps[indices + 1])
+    ]
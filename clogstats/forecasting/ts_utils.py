@@ -1,6 +1,6 @@
 """Common utilities for time-series manipulation."""
 
-from typing import Any, Callable, Dict, List, Mapping, NamedTuple
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Tuple
 
 import numpy as np
 import pandas as pd
@@ -110,6 +110,25 @@ class PredictionEvaluations(NamedTuple):
 _ONE_DAY: pd.Timedelta = pd.Timedelta("1D")
 
 
+def split_for_evaluation(
+    gathered_stats: TimeSeries,
+    prediction_duration_past: pd.Timedelta = _ONE_DAY,
+    prediction_duration_future: pd.Timedelta = None,
+) -> Tuple[TimeSeries, TimeSeries, int]:
+    """Split off the last prediction_duration_past of a series to compare forecasts to.
+
+    Returns the training series, the actual series it gets compared to,
+    and how many steps to forecast.
+    """
+    train, actual = gathered_stats.split_after(
+        gathered_stats.end_time() - prediction_duration_past,
+    )
+    n_pred: int = len(actual)
+    if prediction_duration_future:
+        n_pred += int(prediction_duration_future / gathered_stats.freq())
+    return train, actual, n_pred
+
+
 def make_and_compare_predictions(
     gathered_stats: TimeSeries,
     predictions_to_make: ModelsToMake,
@@ -119,12 +138,9 @@ def make_and_compare_predictions(
     transform: bool = False,
 ) -> PredictionEvaluations:
     """Run multiple forecasts and compare their accuracy."""
-    train, actual = gathered_stats.split_after(
-        gathered_stats.end_time() - prediction_duration_past,
+    train, actual, n_pred = split_for_evaluation(
+        gathered_stats, prediction_duration_past, prediction_duration_future,
     )
-    n_pred: int = len(actual)
-    if prediction_duration_future:
-        n_pred += int(prediction_duration_future / gathered_stats.freq())
     if transform:
         forecasts = make_forecasts_ensure_positive(
             train=train, n_pred=n_pred, predictions_to_make=predictions_to_make,
@@ -0,0 +1,117 @@
+"""Match nicks against per-network blacklists of names and patterns.
+
+Blacklist entries are case-insensitive and come in three forms:
+
+- plain nicks, like "gitter", which match just that nick;
+- globs containing "*" or "?", like "gtrackerbot*", which match nicks
+  the way fnmatch does (so "[0-9]" is a character class within a glob);
+- regular expressions prefixed with "re:", like "re:bitbot\\d*", which
+  must match the whole nick.
+
+Every entry of a blacklist gets compiled into a single regular
+expression, and each distinct nick is only matched against it once.
+"""
+
+import os
+import re
+from fnmatch import translate
+from functools import lru_cache
+from pathlib import Path
+from typing import Collection, Dict, FrozenSet, Mapping, Set
+
+REGEX_PREFIX = "re:"
+GLOB_CHARS = frozenset("*?")
+# matches nothing, for empty blacklists
+NEVER = "(?!)"
+# user-supplied blacklists are files in here named after their network
+BLACKLIST_SUFFIX = ".txt"
+# how many nicks a NickMatcher remembers, and how many blacklists stay compiled.
+# A long-running LogWatcher (the watch subcommand) keeps seeing new nicks.
+MATCH_CACHE_SIZE = 2 ** 16
+BLACKLIST_CACHE_SIZE = 64
+
+
+def entry_pattern(entry: str) -> str:
+    """Convert a blacklist entry to a regular expression."""
+    if entry.startswith(REGEX_PREFIX):
+        return entry[len(REGEX_PREFIX) :]
+    if GLOB_CHARS.intersection(entry):
+        return translate(entry)
+    return re.escape(entry)
+
+
+class NickMatcher:
+    """A compiled blacklist that remembers which nicks it matched.
+
+    Up to cache_size nicks are remembered; beyond that, the nicks
+    remembered first are forgotten first.
+    """
+
+    def __init__(
+        self, entries: FrozenSet[str], cache_size: int = MATCH_CACHE_SIZE,
+    ) -> None:
+        """Compile every entry into one regular expression."""
+        self.entries = entries
+        patterns = "|".join(f"(?:{entry_pattern(entry)})" for entry in sorted(entries))
+        self.pattern = re.compile(patterns or NEVER, re.IGNORECASE)
+        self.cache_size = cache_size
+        # dicts keep insertion order, so the first key is the oldest
+        self._matches: Dict[str, bool] = {}
+
+    def matches(self, nick: str) -> bool:
+        """Check if a nick is blacklisted."""
+        is_match = self._matches.get(nick)
+        if is_match is None:
+            is_match = self.pattern.fullmatch(nick) is not None
+            if len(self._matches) >= self.cache_size:
+                self._matches.pop(next(iter(self._matches)))
+            self._matches[nick] = is_match
+        return is_match
+
+
+@lru_cache(maxsize=BLACKLIST_CACHE_SIZE)
+def _compile_entries(entries: FrozenSet[str]) -> NickMatcher:
+    return NickMatcher(entries)
+
+
+def compile_blacklist(nick_blacklist: Collection[str] = None) -> NickMatcher:
+    """Get the matcher for a blacklist, compiling it only the first time."""
+    return _compile_entries(frozenset(nick_blacklist or ()))
+
+
+def default_blacklist_dir() -> Path:
+    """Get the directory of user-supplied blacklists, following the XDG spec."""
+    try:
+        config_home = Path(os.environ["XDG_CONFIG_HOME"])
+    except KeyError:
+        config_home = Path.home() / ".config"
+    return config_home / "clogstats" / "blacklists"
+
+
+def read_blacklist_file(path: Path) -> Set[str]:
+    """Read a blacklist file: one entry per line, with "#" starting comments."""
+    entries: Set[str] = set()
+    with open(path) as blacklist_file:
+        for line in blacklist_file:
+            entry = line.split("#", 1)[0].strip()
+            if entry:
+                entries.add(entry)
+    return entries
+
+
+def load_blacklists(
+    base_blacklists: Mapping[str, Collection[str]], blacklist_dir: Path = None,
+) -> Dict[str, Set[str]]:
+    """Add the entries of each NETWORK.txt in blacklist_dir to base_blacklists.
+
+    blacklist_dir defaults to default_blacklist_dir(), and is skipped if
+    it doesn't exist.
+    """
+    blacklists = {network: set(entries) for network, entries in base_blacklists.items()}
+    if blacklist_dir is None:
+        blacklist_dir = default_blacklist_dir()
+    if not blacklist_dir.is_dir():
+        return blacklists
+    for path in sorted(blacklist_dir.glob(f"*{BLACKLIST_SUFFIX}")):
+        blacklists.setdefault(path.stem, set()).update(read_blacklist_file(path))
+    return blacklists
@@ -0,0 +1,215 @@
+"""Cache parsed logs on disk and only parse what was appended since.
+
+WeeChat logs only ever grow, so a parsed log stays valid until the file
+is truncated or replaced. Each log's parsed DataFrame is stored column by
+column in a .npz file (categorical columns as integer codes plus their
+categories) together with the size, inode and mtime of the log it was
+parsed from. On the next read, only the bytes appended since then get
+parsed.
+"""
+
+import hashlib
+import io
+import os
+from pathlib import Path
+from typing import NamedTuple, Optional
+from zipfile import BadZipFile
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.parse import (
+    MSG_TYPES,
+    DateRange,
+    check_engine,
+    concat_chunks,
+    empty_parsed_lines,
+    in_date_range,
+    open_log,
+    parse_buffer,
+    parse_lines,
+    parse_timestamps,
+    read_raw_lines,
+)
+
+# bump this whenever the parsed DataFrame or the cache layout changes
+CACHE_VERSION = 1
+
+
+def default_cache_dir() -> Path:
+    """Get the cache directory for clogstats, following the XDG spec."""
+    try:
+        cache_home = Path(os.environ["XDG_CACHE_HOME"])
+    except KeyError:
+        cache_home = Path.home() / ".cache"
+    return cache_home / "clogstats"
+
+
+class ParseCache(NamedTuple):
+    """Settings for the on-disk cache of parsed logs."""
+
+    # defaults to default_cache_dir()
+    cache_dir: Optional[Path] = None
+    # ignore existing cache entries and parse every log from scratch
+    rebuild: bool = False
+
+
+class CacheKey(NamedTuple):
+    """The state of a log file when it was last parsed."""
+
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, stat_result: os.stat_result) -> "CacheKey":
+        """Make a CacheKey from the current state of a file."""
+        return cls(stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+    def still_valid(self, current: "CacheKey") -> bool:
+        """Check if a file in this state can only have grown since."""
+        if self.inode != current.inode or self.size > current.size:
+            return False  # the log was rotated or truncated
+        # same size but modified means the log was rewritten in-place
+        return self.size < current.size or self.mtime_ns == current.mtime_ns
+
+
+class CacheEntry(NamedTuple):
+    """A parsed log and how much of the file it covers."""
+
+    key: CacheKey
+    # bytes of the log that were parsed; only complete lines are parsed
+    offset: int
+    logfile_df: pd.DataFrame
+
+
+def cache_file(path: Path, cache_dir: Path) -> Path:
+    """Get the location of the cache entry for a log."""
+    path_hash = hashlib.sha256(str(path.resolve()).encode()).hexdigest()
+    return cache_dir / f"{path_hash}.npz"
+
+
+def _encode_strings(strings: pd.Series) -> np.ndarray:
+    """Convert a column of strings to a fixed-width unicode array."""
+    return np.asarray(strings, dtype=str)
+
+
+def save_entry(entry: CacheEntry, destination: Path, path: Path) -> None:
+    """Write a cache entry to disk atomically."""
+    logfile_df = entry.logfile_df
+    prefix_codes, prefix_categories = pd.factorize(logfile_df["prefixes"])
+    nicks = logfile_df["nicks"].astype("category")
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp_destination = destination.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_destination, "wb") as cache_out:
+        np.savez(
+            cache_out,
+            version=CACHE_VERSION,
+            path=str(path.resolve()),
+            key=np.array(entry.key, dtype=np.int64),
+            offset=entry.offset,
+            timestamps=logfile_df["timestamps"].to_numpy(dtype="datetime64[ns]"),
+            prefix_codes=prefix_codes.astype(np.int32),
+            prefix_categories=_encode_strings(prefix_categories),
+            msg_type_codes=logfile_df["msg_types"].cat.codes.to_numpy(),
+            nick_codes=nicks.cat.codes.to_numpy(dtype=np.int32),
+            nick_categories=_encode_strings(nicks.cat.categories),
+        )
+    os.replace(temp_destination, destination)
+
+
+def _decode_categorical(codes: np.ndarray, categories: np.ndarray) -> pd.Categorical:
+    return pd.Categorical.from_codes(codes, categories=categories.astype(object))
+
+
+def load_entry(source: Path, path: Path) -> Optional[CacheEntry]:
+    """Read a cache entry from disk, if there's a usable one."""
+    try:
+        return _load_entry(source, path)
+    except (OSError, ValueError, KeyError, BadZipFile):  # missing or corrupt
+        return None
+
+
+def _load_entry(source: Path, path: Path) -> Optional[CacheEntry]:
+    with np.load(source, allow_pickle=False) as cached:
+        if cached["version"] != CACHE_VERSION:
+            return None
+        if cached["path"] != str(path.resolve()):  # hash collision
+            return None
+        logfile_df = pd.DataFrame(
+            {
+                "timestamps": cached["timestamps"],
+                "prefixes": _decode_categorical(
+                    cached["prefix_codes"], cached["prefix_categories"],
+                ).astype(object),
+                "msg_types": pd.Categorical.from_codes(
+                    cached["msg_type_codes"], dtype=MSG_TYPES,
+                ),
+                "nicks": _decode_categorical(
+                    cached["nick_codes"], cached["nick_categories"],
+                ),
+            },
+        )
+        return CacheEntry(
+            key=CacheKey(*cached["key"].tolist()),
+            offset=int(cached["offset"]),
+            logfile_df=logfile_df,
+        )
+
+
+def read_new_lines(path: Path, offset: int, engine: str = "pandas") -> CacheEntry:
+    """Parse the complete lines of a log after the given byte offset.
+
+    The returned entry's offset points right after the last complete
+    line, so a line that's still being written gets parsed next time.
+    """
+    key = CacheKey.from_stat(path.stat())
+    with open_log(path) as logfile:
+        logfile.seek(offset)
+        new_bytes = logfile.read()
+    complete_length = new_bytes.rfind(b"\n") + 1
+    if not complete_length:
+        return CacheEntry(key, offset, empty_parsed_lines())
+    complete_lines = new_bytes[:complete_length]
+    if engine == "bytes":
+        logfile_df = parse_buffer(complete_lines)
+    else:
+        logfile_df = parse_lines(
+            parse_timestamps(read_raw_lines(io.BytesIO(complete_lines))),
+        )
+    return CacheEntry(key, offset + complete_length, logfile_df)
+
+
+def read_cached_lines(
+    path: Path,
+    cache: ParseCache = None,
+    date_range: DateRange = None,
+    engine: str = "pandas",
+) -> pd.DataFrame:
+    """Like read_all_lines, but reuse and update the cached parse of the log.
+
+    If date_range is given, only the lines within date_range are returned.
+    engine is used to parse whatever isn't cached yet.
+    """
+    check_engine(engine)
+    if cache is None:
+        cache = ParseCache()
+    destination = cache_file(path, cache.cache_dir or default_cache_dir())
+    cached: Optional[CacheEntry] = None
+    if not cache.rebuild:
+        cached = load_entry(destination, path)
+    current_key = CacheKey.from_stat(path.stat())
+    if cached is None or not cached.key.still_valid(current_key):
+        cached = CacheEntry(current_key, 0, empty_parsed_lines())
+    if cached.key != current_key or not cached.offset:
+        new_lines = read_new_lines(path, cached.offset, engine)
+        cached = CacheEntry(
+            key=new_lines.key,
+            offset=new_lines.offset,
+            logfile_df=concat_chunks([cached.logfile_df, new_lines.logfile_df]),
+        )
+        save_entry(cached, destination, path)
+    logfile_df = cached.logfile_df
+    if date_range is not None:
+        logfile_df = logfile_df[in_date_range(logfile_df["timestamps"], date_range)]
+    return logfile_df
@@ -0,0 +1,254 @@
+"""Run per-log work serially, in a thread pool, or in a process pool.
+
+A process pool normally pickles every parsed DataFrame to send it back
+to the parent process, which for large logs costs about as much as
+parsing them. With the process executor, parsed logs are instead
+written column by column into a block of shared memory (object columns
+as integer codes plus their categories, like the on-disk cache) and the
+parent only receives the name of the block.
+"""
+
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Tuple,
+    TypeVar,
+)
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.parse import MSG_TYPES
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # py38+ only; results get pickled instead
+    shared_memory = None  # type: ignore # noqa: WPS440
+
+# serial runs everything in the calling thread, which is easiest to debug.
+# thread releases the GIL only during I/O and parts of pandas' parsing.
+# process sidesteps the GIL; see SharedFrame.
+EXECUTORS = ("serial", "thread", "process")
+
+# how many items each pool worker takes at a time
+POOL_CHUNKSIZE = 4
+
+# the numeric columns of a parsed log in shared memory, in order
+SHARED_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("index", "int64"),
+    ("timestamps", "datetime64[ns]"),
+    ("prefix_codes", "int32"),
+    ("msg_type_codes", "int8"),
+    ("nick_codes", "int32"),
+)
+
+ArgType = TypeVar("ArgType")
+ResultType = TypeVar("ResultType")
+SharedType = TypeVar("SharedType")
+
+# state handed to each process pool worker when it starts; see imap_shared
+_worker_state: Dict[str, Any] = {}
+
+
+def check_executor(executor: str) -> None:
+    """Raise a ValueError if executor isn't one of EXECUTORS."""
+    if executor not in EXECUTORS:
+        raise ValueError(
+            f"unknown executor {executor!r}; expected one of {', '.join(EXECUTORS)}",
+        )
+
+
+def imap_ordered(
+    function: Callable[[ArgType], ResultType],
+    items: Iterable[ArgType],
+    executor: str = "process",
+    workers: int = None,
+) -> Iterator[ResultType]:
+    """Apply function to each item with the given executor, keeping their order.
+
+    workers defaults to the number of CPUs and is ignored by the serial
+    executor. function must be picklable for the process executor.
+    """
+    check_executor(executor)
+    if executor == "serial":
+        return map(function, items)
+    pool_type = ThreadPool if executor == "thread" else Pool
+    with pool_type(workers) as pool:
+        results: Iterator[ResultType] = pool.imap(function, items, POOL_CHUNKSIZE)
+        # explicitly call close() and join() for coverage.py to work
+        # otherwise redundant due to `with` statement
+        pool.close()
+        pool.join()
+    return results
+
+
+def _set_worker_state(shared: Any) -> None:
+    _worker_state["shared"] = shared
+
+
+def _call_with_worker_state(
+    item: ArgType, function: Callable[[Any, ArgType], ResultType],
+) -> ResultType:
+    return function(_worker_state["shared"], item)
+
+
+def imap_shared(
+    function: Callable[[SharedType, ArgType], ResultType],
+    shared: SharedType,
+    items: Iterable[ArgType],
+    executor: str = "process",
+    workers: int = None,
+    chunksize: int = POOL_CHUNKSIZE,
+) -> Generator[ResultType, None, None]:
+    """Lazily apply function(shared, item) to each item, in order of completion.
+
+    shared is handed to each worker once, when the pool starts, instead
+    of getting pickled along with every item. With the fork start method
+    (the default on Linux), process pool workers inherit it without
+    copying it at all.
+    """
+    check_executor(executor)
+    if executor == "serial":
+        yield from (function(shared, item) for item in items)
+    elif executor == "thread":
+        with ThreadPool(workers) as thread_pool:
+            yield from thread_pool.imap_unordered(
+                partial(function, shared), items, chunksize,
+            )
+            thread_pool.close()
+            thread_pool.join()
+    else:
+        with Pool(workers, _set_worker_state, (shared,)) as pool:
+            yield from pool.imap_unordered(
+                partial(_call_with_worker_state, function=function),
+                items,
+                chunksize,
+            )
+            # explicitly call close() and join() for coverage.py to work
+            pool.close()
+            pool.join()
+
+
+class SharedFrame(NamedTuple):
+    """A parsed log that's been moved into shared memory.
+
+    Only this handle gets pickled; the columns stay in the shared block.
+    """
+
+    # name of the shared memory block holding the SHARED_COLUMNS
+    name: str
+    length: int
+    prefix_categories: List[str]
+    nick_categories: List[str]
+
+
+def _column_sizes(length: int) -> Iterator[Tuple[str, str, int]]:
+    for column, dtype in SHARED_COLUMNS:
+        yield column, dtype, np.dtype(dtype).itemsize * length
+
+
+def share_frame(logfile_df: pd.DataFrame) -> SharedFrame:
+    """Copy a parsed log into a new block of shared memory.
+
+    The block outlives this process; whoever receives the SharedFrame has
+    to free it with unshare_frame.
+    """
+    prefix_codes, prefix_categories = pd.factorize(logfile_df["prefixes"])
+    nicks = logfile_df["nicks"].astype("category")
+    columns = {
+        "index": logfile_df.index.to_numpy(),
+        "timestamps": logfile_df["timestamps"].to_numpy(),
+        "prefix_codes": prefix_codes,
+        "msg_type_codes": logfile_df["msg_types"].cat.codes.to_numpy(),
+        "nick_codes": nicks.cat.codes.to_numpy(),
+    }
+    length = len(logfile_df)
+    total_size = sum(size for _, _, size in _column_sizes(length))
+    # blocks can't be empty
+    block = shared_memory.SharedMemory(create=True, size=max(total_size, 1))
+    offset = 0
+    for column, dtype, size in _column_sizes(length):
+        shared_column: np.ndarray = np.ndarray(
+            length, dtype=dtype, buffer=block.buf, offset=offset,
+        )
+        shared_column[:] = columns[column]
+        offset += size
+    block.close()
+    return SharedFrame(
+        name=block.name,
+        length=length,
+        prefix_categories=list(prefix_categories),
+        nick_categories=list(nicks.cat.categories),
+    )
+
+
+def unshare_frame(shared_frame: SharedFrame) -> pd.DataFrame:
+    """Rebuild a parsed log from shared memory and free the shared block."""
+    block = shared_memory.SharedMemory(name=shared_frame.name)
+    length = shared_frame.length
+    columns: Dict[str, np.ndarray] = {}
+    offset = 0
+    for column, dtype, size in _column_sizes(length):
+        # a single copy out of the block, so it can be freed right away
+        columns[column] = np.ndarray(
+            length, dtype=dtype, buffer=block.buf, offset=offset,
+        ).copy()
+        offset += size
+    block.close()
+    block.unlink()
+    return pd.DataFrame(
+        {
+            "timestamps": columns["timestamps"],
+            "prefixes": pd.Categorical.from_codes(
+                columns["prefix_codes"],
+                categories=pd.Index(shared_frame.prefix_categories, dtype=object),
+            ).astype(object),
+            "msg_types": pd.Categorical.from_codes(
+                columns["msg_type_codes"], dtype=MSG_TYPES,
+            ),
+            "nicks": pd.Categorical.from_codes(
+                columns["nick_codes"],
+                categories=pd.Index(shared_frame.nick_categories, dtype=object),
+            ),
+        },
+        index=pd.Index(columns["index"]),
+    )
+
+
+def read_into_shared_memory(
+    path: ArgType, read_log: Callable[[ArgType], pd.DataFrame],
+) -> SharedFrame:
+    """Read a log with read_log and move the result into shared memory."""
+    return share_frame(read_log(path))
+
+
+def imap_parsed(
+    read_log: Callable[[ArgType], pd.DataFrame],
+    paths: Iterable[ArgType],
+    executor: str = "process",
+    workers: int = None,
+) -> Iterator[pd.DataFrame]:
+    """Like imap_ordered, but for functions returning parsed logs.
+
+    With the process executor, parsed logs come back through shared
+    memory instead of being pickled, when shared memory is available.
+    """
+    if executor != "process" or shared_memory is None:
+        return imap_ordered(read_log, paths, executor, workers)
+    # start the resource tracker before forking, so that the workers and
+    # this process share it and blocks created by workers aren't freed
+    # when the workers exit.
+    resource_tracker.ensure_running()
+    shared_frames = imap_ordered(
+        partial(read_into_shared_memory, read_log=read_log), paths, executor, workers,
+    )
+    return map(unshare_frame, shared_frames)
@@ -1,34 +1,62 @@
 """Parse and aggregate statistics from all desired WeeChat logs."""
+import os
+import re
 from dataclasses import dataclass
 from datetime import datetime
-from multiprocessing import Pool
-from os import environ
+from fnmatch import fnmatchcase
+from functools import partial
+from itertools import chain
 from pathlib import Path
 from types import MappingProxyType
 from typing import (
+    TYPE_CHECKING,
+    Callable,
     Collection,
     Counter,
+    Dict,
     Iterable,
     Iterator,
     List,
     Mapping,
     NamedTuple,
     Optional,
+    Sequence,
     Set,
+    Tuple,
+    Union,
 )
 
 import numpy as np
 import pandas as pd
 
-from clogstats.stats.parse import read_all_lines
+from clogstats.stats.blacklists import compile_blacklist
+from clogstats.stats.cache import ParseCache, read_cached_lines
+from clogstats.stats.executors import imap_ordered, imap_parsed, imap_shared
+from clogstats.stats.nicks import MISSING_NICK, NickDictionary, encode_nicks
+from clogstats.stats.parse import (
+    DEFAULT_CHUNKSIZE,
+    DateRange,
+    concat_chunks,
+    in_date_range,
+    read_all_lines,
+    read_lines_in_range,
+    stream_lines,
+)
+from clogstats.stats.seek import MAX_CLOCK_SKEW
+from clogstats.stats.sketches import Approximation, ChannelSketch
+
+if TYPE_CHECKING:
+    from clogstats.stats.rollups import RollupStore  # noqa: F401  # circular import
 
+# blacklists of each network; entries may be globs or regexes, see
+# clogstats.stats.blacklists
 NickBlacklist = Mapping[str, Set[str]]
 BOT_BLACKLISTS: NickBlacklist = MappingProxyType(
     {
-        "2600net": {"jarvis", "gbot", "bitbot"},
+        "2600net": {"jarvis", "gbot", "bitbot*"},
         "darkscience": {"djbot", "zeta"},
         "efnet": {"pelosi"},
-        "installgentoo": {"gtrackerbot5"},
+        "installgentoo": {"gtrackerbot*"},
         "freenode": {
             "buttsbot",
             "fedbot",
@@ -39,26 +67,21 @@ BOT_BLACKLISTS: NickBlacklist = MappingProxyType(
             "mockturtle",
             "reddit-bot",
             "weebot",
-            "wlb1",
+            "wlb*",
             "zero1",
         },
         "gitter": {"gitter"},
         "gotham": {"mafalda", "southbay", "damon"},
         "rizon": {"internets", "chanstat", "yt-info"},
-        "tilde_chat": {"bitbot", "tildebot"},
+        "tilde_chat": {"bitbot*", "tildebot"},
         "snoonet": {"gonzobot", "jesi", "shinymetal", "subwatch", "nsa"},
         "supernets": {"scroll", "cancer", "faggotxxx", "fuckyou"},
     },
 )
 
 
-class DateRange(NamedTuple):
-    """A time range used to select the part of a log file we want to analyze."""
-
-    # IRC didn't exist on 0001-01-01 CE [citation needed]
-    start_time: np.datetime64 = np.datetime64(datetime.min)
-    # if civilization is a thing at datetime.max, I hope nobody runs this.
-    end_time: np.datetime64 = np.datetime64(datetime.max)
+# the msg_types of lines that count towards activity
+SPOKEN_MSG_TYPES = frozenset(("message", "action"))
 
 
 class ChannelsWanted(NamedTuple):
@@ -84,11 +107,87 @@ class IRCChannel:
     msgs: int
 
 
+def spoken_nicks(logfile_df: pd.DataFrame, column: str = "nicks") -> pd.Series:
+    """Nicks of the lines that count towards activity: messages and actions.
+
+    column is "nick_codes" for logs whose nicks were encoded with encode_nicks.
+    """
+    return logfile_df.loc[logfile_df["msg_types"].isin(SPOKEN_MSG_TYPES), column]
+
+
+def first_of_runs(
+    nicks: pd.Series, previous_nick: Union[str, int, None] = None,
+) -> pd.Series:
+    """Keep one nick out of each run of consecutive messages from that nick.
+
+    nicks holds either nicks or nick codes (see NickDictionary).
+    previous_nick is the last one seen before this series started, so
+    that a run spanning two chunks of a log is only counted once.
+    """
+    is_new_run = (nicks.shift(1) != nicks).to_numpy()
+    if previous_nick is not None and not nicks.empty:
+        is_new_run[0] = nicks.iloc[0] != previous_nick
+    return nicks.loc[is_new_run]
+
+
+def count_nicks(nicks: pd.Series, nick_blacklist: Set[str] = None) -> pd.Series:
+    """Count the messages per nick, skipping blacklisted nicks."""
+    if nick_blacklist:
+        # match each distinct nick once, rather than every message
+        matcher = compile_blacklist(nick_blacklist)
+        blacklisted = [
+            nick for nick in nicks.dropna().unique() if matcher.matches(nick)
+        ]
+        nicks = nicks[~nicks.isin(blacklisted)]
+    nick_counts: pd.Series = nicks.value_counts()
+    # categorical nicks also count nicks that never spoke in this date range
+    return nick_counts[nick_counts > 0]
+
+
+def count_nick_codes(
+    nick_codes: pd.Series,
+    nick_dictionary: NickDictionary,
+    nick_blacklist: Set[str] = None,
+) -> Counter[str]:
+    """Like count_nicks, but on encoded nicks. Only the results get decoded."""
+    codes, counts = np.unique(nick_codes.to_numpy(), return_counts=True)
+    is_counted = codes != MISSING_NICK
+    if nick_blacklist:
+        is_counted[is_counted] = ~nick_dictionary.blacklisted(
+            codes[is_counted], nick_blacklist,
+        )
+    return Counter(
+        dict(zip(nick_dictionary.decode(codes[is_counted]), counts[is_counted])),
+    )
+
+
+def ircchannel_from_topwords(name: str, topwords: Counter[str]) -> IRCChannel:
+    """Build an IRCChannel from its per-nick message counts."""
+    return IRCChannel(
+        name=name, topwords=topwords, nicks=len(topwords), msgs=sum(topwords.values()),
+    )
+
+
+def ircchannel_from_sketch(sketch: ChannelSketch) -> IRCChannel:
+    """Build an IRCChannel from approximate stats.
+
+    msgs is exact. topwords only has the most active nicks, with counts
+    that may be overestimated, and nicks is an estimate.
+    """
+    return IRCChannel(
+        name=sketch.name,
+        topwords=sketch.topwords.top(),
+        nicks=sketch.nicks.estimate(),
+        msgs=sketch.msgs,
+    )
+
+
 def analyze_log(
     logfile_df: pd.DataFrame,
     date_range: DateRange,
     name: str,
     nick_blacklist: Set[str] = None,
+    nick_dictionary: NickDictionary = None,
 ) -> IRCChannel:
     """Turn a parsed log file into an IRCChannel holding its stats.
 
@@ -96,32 +195,93 @@ def analyze_log(
     single-variable multithreaded map() function tricky. It gets wrapped
     by analyze_log_wrapper which unpacks a single arument into this
     function.
+
+    nick_dictionary must be given for logs whose nicks were encoded with
+    encode_nicks.
     """
     # filter date range
-    logfile_df = logfile_df[
-        (logfile_df["timestamps"] > date_range.start_time)
-        & (logfile_df["timestamps"] < date_range.end_time)  # noqa: S101 # no comma here
-    ]
-    if not nick_blacklist:
-        nick_blacklist = set()
+    logfile_df = logfile_df[in_date_range(logfile_df["timestamps"], date_range)]
     # the values we'll extract to build the IRCChannel
 
     # topwords
     # we want nicks for messages and actions.
-    nicks: pd.DataFrame = logfile_df.loc[
-        logfile_df["msg_types"].isin({"message", "action"}), "nicks",
-    ]
     # multiple consecutive messages from one nick should be grouped together
-    nicks = nicks.loc[nicks.shift(1) != nicks]
-    # remove blacklisted nicks. Nicks are case-insensitive
-    nicks = nicks[~nicks.str.lower().isin(nick_blacklist)]
-    nick_counts: pd.Series = nicks.value_counts()
-    topwords: Counter[str] = Counter(nick_counts.to_dict())
+    if nick_dictionary is not None:
+        nick_codes = first_of_runs(spoken_nicks(logfile_df, "nick_codes"))
+        topwords = count_nick_codes(nick_codes, nick_dictionary, nick_blacklist)
+    else:
+        nick_counts = count_nicks(
+            first_of_runs(spoken_nicks(logfile_df)), nick_blacklist,
+        )
+        topwords = Counter(nick_counts.to_dict())
+    return ircchannel_from_topwords(name, topwords)
 
-    # total messages
-    return IRCChannel(
-        name=name, topwords=topwords, nicks=len(topwords), msgs=nick_counts.sum(),
+
+def analyze_chunks(
+    chunks: Iterable[pd.DataFrame], nick_blacklist: Set[str] = None,
+) -> Iterator[Counter[str]]:
+    """Lazily compute partial topwords for each parsed chunk of a log.
+
+    Consecutive messages are grouped across chunk boundaries, so summing
+    the partial topwords gives the same result as analyzing every chunk
+    at once.
+    """
+    previous_nick: Optional[str] = None
+    for chunk in chunks:
+        nicks = spoken_nicks(chunk)
+        nick_counts = count_nicks(first_of_runs(nicks, previous_nick), nick_blacklist)
+        if not nicks.empty:
+            previous_nick = nicks.iloc[-1]
+        yield Counter(nick_counts.to_dict())
+
+
+def analyze_log_stream(  # noqa: WPS211  # Found too many arguments
+    paths: Sequence[Path],
+    date_range: DateRange,
+    nick_blacklist: Set[str] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    engine: str = "pandas",
+    approximation: Approximation = None,
+) -> IRCChannel:
+    """Gather stats on a channel's log without loading all of it into memory.
+
+    paths are the segments of the log in time order; see log_segments.
+    Only the lines within date_range get parsed; see stream_lines.
+    With an approximation, the stats are gathered into a ChannelSketch,
+    so memory usage doesn't grow with the number of nicks either.
+    """
+    if approximation is not None:
+        return ircchannel_from_sketch(
+            sketch_log_stream(
+                paths, date_range, approximation, nick_blacklist, chunksize, engine,
+            ),
+        )
+    chunks = chain.from_iterable(
+        stream_lines(path, date_range, chunksize, engine) for path in paths
+    )
+    name = channel_name(paths[0])
+    topwords: Counter[str] = Counter()
+    for partial_topwords in analyze_chunks(chunks, nick_blacklist):
+        topwords.update(partial_topwords)
+    return ircchannel_from_topwords(name, topwords)
+
+
+def sketch_log_stream(  # noqa: WPS211  # Found too many arguments
+    paths: Sequence[Path],
+    date_range: DateRange,
+    approximation: Approximation,
+    nick_blacklist: Set[str] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    engine: str = "pandas",
+) -> ChannelSketch:
+    """Like analyze_log_stream with an approximation, but keep the mergeable sketch."""
+    chunks = chain.from_iterable(
+        stream_lines(path, date_range, chunksize, engine) for path in paths
     )
+    sketch = ChannelSketch(channel_name(paths[0]), approximation)
+    for chunk_topwords in analyze_chunks(chunks, nick_blacklist):
+        sketch.update(chunk_topwords)
+    return sketch
 
 
 class AnalyzeLogArgs(NamedTuple):
@@ -131,6 +291,7 @@ class AnalyzeLogArgs(NamedTuple):
     date_range: DateRange
     name: str
     nick_blacklist: Set[str] = set()
+    nick_dictionary: Optional[NickDictionary] = None
 
 
 def analyze_log_wrapper(args: AnalyzeLogArgs) -> IRCChannel:
@@ -143,6 +304,7 @@ def analyze_log_wrapper(args: AnalyzeLogArgs) -> IRCChannel:
         date_range=args.date_range,
         name=args.name,
         nick_blacklist=args.nick_blacklist,
+        nick_dictionary=args.nick_dictionary,
     )
 
 
@@ -150,109 +312,501 @@ def analyze_log_wrapper(args: AnalyzeLogArgs) -> IRCChannel:
 ParsedLogs = Mapping[str, pd.DataFrame]
 
 
-def analyze_multiple_logs(
-    date_range: DateRange,
+@dataclass
+class ParseOptions:
+    """Options controlling how logs are read and parsed."""
+
+    # read logs in chunks instead of loading them into memory all at once.
+    # see clogstats.stats.parse.stream_lines
+    streaming: bool = False
+    # reuse parsed logs from an on-disk cache. Takes precedence over streaming.
+    cache: Optional[ParseCache] = None
+    # one of clogstats.stats.parse.ENGINES
+    engine: str = "pandas"
+    # what to read logs with; one of clogstats.stats.executors.EXECUTORS
+    executor: str = "process"
+    # how many threads/processes to use. Defaults to the number of CPUs.
+    workers: Optional[int] = None
+    # gather approximate stats in bounded memory; streaming without a cache only
+    approximation: Optional[Approximation] = None
+
+
+def log_reader(
+    date_range: DateRange = None, parse_options: ParseOptions = None,
+) -> Callable[[Path], pd.DataFrame]:
+    """Pick the function to read each log with.
+
+    The returned function can be pickled, so it can be used with a Pool.
+    """
+    if parse_options is None:
+        parse_options = ParseOptions()
+    engine = parse_options.engine
+    if parse_options.cache is not None:
+        return partial(
+            read_cached_lines,
+            cache=parse_options.cache,
+            date_range=date_range,
+            engine=engine,
+        )
+    if date_range is not None:
+        return partial(read_lines_in_range, date_range=date_range, engine=engine)
+    return partial(read_all_lines, engine=engine)
+
+
+class SharedAnalysis(NamedTuple):
+    """What every worker needs for analyze_multiple_logs, handed over once."""
+
+    parsed_logs: ParsedLogs
+    nick_dictionary: Optional[NickDictionary] = None
+
+
+class AnalyzeChannelArgs(NamedTuple):
+    """Container for the args to analyze one channel of a SharedAnalysis."""
+
+    name: str
+    date_range: DateRange
+    nick_blacklist: Set[str] = set()
+    # which of the date ranges passed to analyze_intervals this is
+    interval: int = 0
+
+
+class AnalyzedChannel(NamedTuple):
+    """The stats of a channel within one interval of analyze_intervals."""
+
+    interval: int
+    channel: IRCChannel
+
+
+def analyze_shared_log(
+    shared: SharedAnalysis, args: AnalyzeChannelArgs,
+) -> AnalyzedChannel:
+    """Run analyze_log on a channel of parsed logs that every worker already has.
+
+    This is a global function so it can be used with imap_shared.
+    """
+    channel = analyze_log_wrapper(
+        AnalyzeLogArgs(
+            logfile_df=shared.parsed_logs[args.name],
+            date_range=args.date_range,
+            name=args.name,
+            nick_blacklist=args.nick_blacklist,
+            nick_dictionary=shared.nick_dictionary,
+        ),
+    )
+    return AnalyzedChannel(args.interval, channel)
+
+
+def analyze_intervals(
+    date_ranges: Sequence[DateRange],
     parsed_logs: ParsedLogs,
     nick_blacklists: Mapping[str, Set[str]] = None,
-    sortkey: str = "msgs",
-) -> List[IRCChannel]:
-    """Gather stats on multiple parsed logs in parallel."""
+    nick_dictionary: NickDictionary = None,
+    executor: str = "process",
+    workers: int = None,
+) -> List[List[IRCChannel]]:
+    """Gather stats on multiple parsed logs within each date range, in parallel.
+
+    Returns one list of channels per date range, in the order of
+    parsed_logs. Every (date range, channel) pair is analyzed by the same
+    pool, and the parsed logs are handed to each of its workers only
+    once; see imap_shared.
+    nick_dictionary must be given if the logs were parsed with one.
+    """
     # set default values for optional arguments
     if nick_blacklists is None:
         nick_blacklists = BOT_BLACKLISTS
+    nick_blacklist_of = {
+        name: network_blacklist(name, nick_blacklists) for name in parsed_logs
+    }
 
-    # set the arguments for each run of analyze_log_wrapper
+    # set the arguments for each run of analyze_shared_log
     # for all the channels we want to analyze
-    analyze_log_args: Iterator[AnalyzeLogArgs] = (
-        AnalyzeLogArgs(
-            logfile_df=parsed_logs[channel_name],
+    analyze_channel_args: Iterator[AnalyzeChannelArgs] = (
+        AnalyzeChannelArgs(
+            name=name,
             date_range=date_range,
-            name=channel_name,
-            nick_blacklist=nick_blacklists.get(channel_name.split(".#", 1)[0], set()),
+            nick_blacklist=nick_blacklist_of[name],
+            interval=interval,
         )
-        for channel_name in parsed_logs
+        for interval, date_range in enumerate(date_ranges)
+        for name in parsed_logs
+    )
+    # channels finish in any order; slot each one back into place
+    positions = {name: position for position, name in enumerate(parsed_logs)}
+    intervals: List[List[IRCChannel]] = [[] for _ in date_ranges]
+    for interval, channel in imap_shared(
+        analyze_shared_log,
+        SharedAnalysis(parsed_logs, nick_dictionary),
+        analyze_channel_args,
+        executor,
+        workers,
+    ):
+        intervals[interval].append(channel)
+    for channels in intervals:
+        channels.sort(key=lambda channel: positions[channel.name])
+    return intervals
+
+
+def analyze_multiple_logs(  # noqa: WPS211  # Found too many arguments
+    date_range: DateRange,
+    parsed_logs: ParsedLogs,
+    nick_blacklists: Mapping[str, Set[str]] = None,
+    sortkey: str = "msgs",
+    nick_dictionary: NickDictionary = None,
+    executor: str = "process",
+    workers: int = None,
+) -> List[IRCChannel]:
+    """Gather stats on multiple parsed logs in parallel.
+
+    nick_dictionary must be given if the logs were parsed with one.
+    See analyze_intervals for how the work is spread across executor.
+    """
+    (channels,) = analyze_intervals(
+        [date_range], parsed_logs, nick_blacklists, nick_dictionary, executor, workers,
+    )
+    # channels that tie on sortkey stay in the order of parsed_logs
+    return sort_channels(channels, sortkey)
+
+
+class AnalyzeLogStreamArgs(NamedTuple):
+    """Container for the args to unpack and pass to analyze_log_stream."""
+
+    paths: Sequence[Path]
+    date_range: DateRange
+    nick_blacklist: Set[str] = set()
+    engine: str = "pandas"
+    approximation: Optional[Approximation] = None
+
+
+def analyze_log_stream_wrapper(args: AnalyzeLogStreamArgs) -> IRCChannel:
+    """Run analyze_log_stream on unpacked arguments.
+
+    This is a global function so it can be pickled and sent to a Pool.
+    """
+    return analyze_log_stream(
+        paths=args.paths,
+        date_range=args.date_range,
+        nick_blacklist=args.nick_blacklist,
+        engine=args.engine,
+        approximation=args.approximation,
     )
-    return sorted(
-        map(analyze_log_wrapper, analyze_log_args),
-        key=lambda channel: getattr(channel, sortkey),
-        reverse=True,
+
+
+def sketch_log_stream_wrapper(args: AnalyzeLogStreamArgs) -> ChannelSketch:
+    """Run sketch_log_stream on unpacked arguments; args.approximation is required.
+
+    This is a global function so it can be pickled and sent to a Pool.
+    """
+    if args.approximation is None:
+        raise ValueError("sketching a log requires an approximation")
+    return sketch_log_stream(
+        paths=args.paths,
+        date_range=args.date_range,
+        approximation=args.approximation,
+        nick_blacklist=args.nick_blacklist,
+        engine=args.engine,
+    )
+
+
+def analyze_multiple_log_streams(
+    date_range: DateRange,
+    paths: Iterable[Path],
+    nick_blacklists: Mapping[str, Set[str]] = None,
+    sortkey: str = "msgs",
+    parse_options: ParseOptions = None,
+) -> List[IRCChannel]:
+    """Gather stats on multiple unparsed logs in parallel, streaming each one.
+
+    Unlike analyze_multiple_logs, parsed logs are never held in memory:
+    each worker streams through one channel's log segments and only sends
+    back the stats.
+    """
+    if nick_blacklists is None:
+        nick_blacklists = BOT_BLACKLISTS
+    if parse_options is None:
+        parse_options = ParseOptions()
+    analyze_log_stream_args: List[AnalyzeLogStreamArgs] = [
+        AnalyzeLogStreamArgs(
+            paths=segments,
+            date_range=date_range,
+            nick_blacklist=network_blacklist(name, nick_blacklists),
+            engine=parse_options.engine,
+            approximation=parse_options.approximation,
+        )
+        for name, segments in log_segments(paths, date_range).items()
+    ]
+    channels = imap_ordered(
+        analyze_log_stream_wrapper,
+        analyze_log_stream_args,
+        parse_options.executor,
+        parse_options.workers,
     )
+    return sort_channels(channels, sortkey)
+
+
+def network_blacklist(name: str, nick_blacklists: NickBlacklist) -> Set[str]:
+    """Get the nick blacklist for the network of the given channel."""
+    return set(nick_blacklists.get(name.split(".#", 1)[0], set()))
+
+
+def sort_channels(channels: Iterable[IRCChannel], sortkey: str) -> List[IRCChannel]:
+    """Sort channels by the value of the given attribute, in descending order."""
+    return sorted(channels, key=lambda channel: getattr(channel, sortkey), reverse=True)
 
 
 def channel_name(path: Path) -> str:
     """Extract the channel name from its logfile's path."""
-    # strip the "irc." prefix and ".weechatlog" suffix
+    # strip the "irc." prefix and ".weechatlog" suffix, along with the
+    # rotation number and compression extension of rotated logs.
     # in py39 strings will get the removeprefix() and removesuffix() methods.
     # will probably make clogstats py39+ in like 2022 or something lol
-    return path.name[len("irc.") : -len(".weechatlog")]
+    return path.name[len("irc.") : path.name.rindex(".weechatlog")]
+
+
+# every log and rotated segment of a log is named like this
+LOG_GLOB = "irc.*.[#]*.weechatlog*"
+# logs rotated by WeeChat or logrotate get a number, and maybe get compressed:
+# irc.freenode.#foo.weechatlog.1, irc.freenode.#foo.weechatlog.2.gz, ...
+# a higher number means an older segment of the log.
+LOG_SEGMENT_PATTERN = re.compile(r"\.weechatlog(?:\.(\d+))?(?:\.(?:gz|bz2|xz))?$")
+
+
+def rotation_number(path: Path) -> int:
+    """Get the rotation number of a log segment; 0 for the live log."""
+    segment_match = LOG_SEGMENT_PATTERN.search(path.name)
+    if segment_match is None:
+        raise ValueError(f"not a log segment: {path}")
+    return int(segment_match.group(1) or 0)
+
+
+def segment_spans(segments: Sequence[Path]) -> Iterator[Tuple[datetime, datetime]]:
+    """Estimate the span of time covered by each of a log's segments.
+
+    segments must be in time order. Lines are only ever appended, so a
+    segment ends at its mtime and starts after the previous segment's mtime.
+    mtimes are converted to local time, like the timestamps WeeChat writes.
+    """
+    start_time = datetime.min
+    for segment in segments:
+        end_time = datetime.fromtimestamp(segment.stat().st_mtime)
+        yield start_time, end_time
+        start_time = end_time
+
+
+def segment_overlaps(span: Tuple[datetime, datetime], date_range: DateRange) -> bool:
+    """Check if a segment's span might contain lines within date_range."""
+    start_time, end_time = map(np.datetime64, span)
+    return bool(
+        end_time + MAX_CLOCK_SKEW >= np.datetime64(date_range.start_time)
+        and start_time - MAX_CLOCK_SKEW <= np.datetime64(date_range.end_time),
+    )
+
+
+def log_segments(
+    paths: Iterable[Path], date_range: DateRange = None,
+) -> Dict[str, List[Path]]:
+    """Group log segments by channel, oldest segment first.
+
+    If date_range is given, rotated segments that can't contain lines
+    within it are left out, so they never get decompressed. The live log
+    is always kept.
+    """
+    segments: Dict[str, List[Path]] = {}
+    for path in paths:
+        segments.setdefault(channel_name(path), []).append(path)
+    for channel_segments in segments.values():
+        channel_segments.sort(key=rotation_number, reverse=True)
+    if date_range is None:
+        return segments
+    return {
+        name: [
+            segment
+            for segment, span in zip(channel_segments, segment_spans(channel_segments))
+            if not rotation_number(segment) or segment_overlaps(span, date_range)
+        ]
+        for name, channel_segments in segments.items()
+    }
 
 
 def path_is_wanted(path: Path, channels_wanted: ChannelsWanted = None) -> bool:
     """Determine if the given path is to be analyzed or ignored."""
     # Analyze all paths if no channels to include/exclude are specified
+    if channels_wanted is None:
+        return True
+    return channel_is_wanted(channel_name(path), channels_wanted)
+
+
+def channel_is_wanted(name: str, channels_wanted: ChannelsWanted = None) -> bool:
+    """Determine if the given channel is to be analyzed or ignored."""
     if channels_wanted is None:
         return True
     path_not_excluded = (
         channels_wanted.exclude_channels is None
-        or channel_name(path) not in channels_wanted.exclude_channels
+        or name not in channels_wanted.exclude_channels
     )
     path_included = (
         not channels_wanted.include_channels
-        or channel_name(path) in channels_wanted.include_channels
+        or name in channels_wanted.include_channels
     )
     return path_not_excluded and path_included
 
 
+def may_be_in_range(stat_result: os.stat_result, date_range: DateRange) -> bool:
+    """Check if a log with the given stat data might have lines in date_range.
+
+    Logs only ever get appended to, so an empty log or one that was last
+    modified before date_range.start_time has nothing in range.
+    """
+    if not stat_result.st_size:
+        return False
+    last_modified = np.datetime64(datetime.fromtimestamp(stat_result.st_mtime))
+    return bool(
+        last_modified + MAX_CLOCK_SKEW >= np.datetime64(date_range.start_time),
+    )
+
+
+def log_directory(log_dir: str = None) -> Path:
+    """Get the directory holding the logs; defaults to WeeChat's."""
+    if log_dir:
+        return Path(log_dir)
+    try:
+        weechat_home = Path(os.environ["WEECHAT_HOME"])
+    except KeyError:
+        weechat_home = Path.home() / ".weechat"
+    return weechat_home / "logs"
+
+
 def log_paths(
-    channels_wanted: ChannelsWanted = None, log_dir: str = None,
+    channels_wanted: ChannelsWanted = None,
+    log_dir: str = None,
+    date_range: DateRange = None,
 ) -> Iterator[Path]:
-    """Get all the .weechatlog paths to analyze for the current user."""
-    if log_dir:
-        log_path = Path(log_dir)
-    else:
-        try:
-            weechat_home = Path(environ["WEECHAT_HOME"])
-        except KeyError:
-            weechat_home = Path.home() / ".weechat"
-        log_path = weechat_home / "logs"
-    for path in log_path.glob("irc.*.[#]*.weechatlog"):
-        if path_is_wanted(path, channels_wanted):
-            yield path
-
-
-def parse_multiple_logs(paths: Iterable[Path]) -> ParsedLogs:
-    """Return a dict mapping each channel name to its parsed DataFrame."""
-    paths = list(paths)  # collect paths into a list so we can iterate multiple times
-    with Pool() as pool:
-        log_contents: Iterable[pd.DataFrame] = pool.imap(read_all_lines, paths, 4)
-        # explicitly call close() and join() for coverage.py to work
-        # otherwise redundant due to `with` statement
-        pool.close()
-        pool.join()
-    log_names = (channel_name(path) for path in paths)
-    return dict(zip(log_names, log_contents))
+    """Get all the .weechatlog paths to analyze for the current user.
+
+    Rotated and compressed segments of logs are included; see log_segments.
+    If date_range is given, logs that can't have lines within it are
+    skipped, going by the stat data gathered while listing log_dir.
+    """
+    with os.scandir(log_directory(log_dir)) as entries:
+        for entry in entries:
+            if not (
+                fnmatchcase(entry.name, LOG_GLOB)
+                and LOG_SEGMENT_PATTERN.search(entry.name)
+            ):
+                continue
+            if date_range is not None and not may_be_in_range(
+                entry.stat(), date_range,
+            ):
+                continue
+            path = Path(entry.path)
+            if path_is_wanted(path, channels_wanted):
+                yield path
+
+
+def parse_multiple_logs(
+    paths: Iterable[Path],
+    date_range: DateRange = None,
+    parse_options: ParseOptions = None,
+    nick_dictionary: NickDictionary = None,
+) -> ParsedLogs:
+    """Return a dict mapping each channel name to its parsed DataFrame.
+
+    paths may include rotated segments of logs, which get parsed
+    separately (and decompressed, if needed) by the workers and then
+    joined per channel; see log_segments.
+    If date_range is given, only the lines within date_range are kept.
+    If nick_dictionary is given, nicks get encoded with it; see encode_nicks.
+    Logs are read with parse_options.executor; see imap_parsed.
+    """
+    if parse_options is None:
+        parse_options = ParseOptions()
+    segments = log_segments(paths, date_range)
+    segment_contents = imap_parsed(
+        log_reader(date_range, parse_options),
+        chain.from_iterable(segments.values()),
+        parse_options.executor,
+        parse_options.workers,
+    )
+    log_contents: Iterable[pd.DataFrame] = (
+        join_segments([next(segment_contents) for _ in channel_segments])
+        for channel_segments in segments.values()
+    )
+    if nick_dictionary is not None:
+        log_contents = (
+            encode_nicks(logfile_df, nick_dictionary) for logfile_df in log_contents
+        )
+    return dict(zip(segments, log_contents))
+
+
+def join_segments(segment_contents: List[pd.DataFrame]) -> pd.DataFrame:
+    """Join the parsed segments of a log into one DataFrame."""
+    if len(segment_contents) == 1:
+        return segment_contents[0]
+    return concat_chunks(segment_contents)
 
 
 def parse_all_logs(
-    channels_wanted: ChannelsWanted = None, log_dir: str = None,
+    channels_wanted: ChannelsWanted = None,
+    log_dir: str = None,
+    date_range: DateRange = None,
+    parse_options: ParseOptions = None,
+    nick_dictionary: NickDictionary = None,
 ) -> ParsedLogs:
-    """Parse every log on the system."""
+    """Parse every log on the system.
+
+    If date_range is given, only the lines within it are kept, and logs
+    without any lines within it are skipped; see log_paths.
+    """
     # maybe parallelize this in the future.
     return parse_multiple_logs(
-        log_paths(channels_wanted=channels_wanted, log_dir=log_dir),
+        log_paths(channels_wanted, log_dir, date_range),
+        date_range=date_range,
+        parse_options=parse_options,
+        nick_dictionary=nick_dictionary,
     )
 
 
-def analyze_all_logs(
+def analyze_all_logs(  # noqa: WPS211  # Found too many arguments
     date_range: DateRange,
     channels_wanted: ChannelsWanted = None,
     nick_blacklists: NickBlacklist = None,
     sortkey: str = "msgs",
     log_dir: str = None,
+    parse_options: ParseOptions = None,
+    rollups: "RollupStore" = None,
 ) -> List[IRCChannel]:
-    """Gather stats on all logs in parallel."""
+    """Gather stats on all logs in parallel.
+
+    If rollups are given, stats are summed from them instead of reading
+    any logs; see clogstats.stats.rollups.
+
+    With parse_options.streaming enabled (and no cache), each log is read
+    in chunks and only the lines within date_range are parsed, so memory
+    usage doesn't grow with the size of the logs.
+    Logs that weren't written to within date_range are skipped entirely.
+    """
+    if rollups is not None:
+        return rollups.select(channels_wanted).analyze(
+            date_range, nick_blacklists, sortkey,
+        )
+    if parse_options is None:
+        parse_options = ParseOptions()
+    if parse_options.streaming and parse_options.cache is None:
+        return analyze_multiple_log_streams(
+            date_range=date_range,
+            paths=log_paths(channels_wanted, log_dir, date_range),
+            nick_blacklists=nick_blacklists,
+            sortkey=sortkey,
+            parse_options=parse_options,
+        )
     # set default values for optional arguments
-    parsed_logs = parse_all_logs(channels_wanted=channels_wanted, log_dir=log_dir)
+    nick_dictionary = NickDictionary()
+    # parse whole logs rather than just date_range, so the cache covers them
+    parsed_logs = parse_multiple_logs(
+        log_paths(channels_wanted, log_dir, date_range),
+        parse_options=parse_options,
+        nick_dictionary=nick_dictionary,
+    )
     # set the arguments for each run of analyze_log_wrapper
     # for all the channels we want to analyze
     return analyze_multiple_logs(
@@ -260,4 +814,7 @@ def analyze_all_logs(
         parsed_logs=parsed_logs,
         nick_blacklists=nick_blacklists,
         sortkey=sortkey,
+        nick_dictionary=nick_dictionary,
+        executor=parse_options.executor,
+        workers=parse_options.workers,
     )
@@ -0,0 +1,250 @@
+"""Time-series data as a sparse matrix of per-nick activity.
+
+Time-series DataFrames (see clogstats.stats.time_series) hold a whole
+Counter of topwords in every (channel, interval) row, which takes a lot
+of memory and can only be worked with one row at a time. A NickMatrix
+holds the same counts as a sparse matrix in CSR form, with a row per
+(channel, interval) and a column per nick code, so per-nick series,
+top nicks and totals are computed with array operations.
+"""
+
+from dataclasses import dataclass
+from typing import Counter, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.gather_stats import IRCChannel, ircchannel_from_topwords
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DateRange
+
+try:
+    from scipy import sparse  # type: ignore
+except ImportError:  # optional; only needed for to_scipy
+    sparse = None  # noqa: WPS440
+
+try:
+    from darts.timeseries import TimeSeries  # type: ignore
+except ImportError:  # optional; installed with the "forecasting" extra
+    TimeSeries = None  # noqa: WPS440
+
+
+@dataclass
+class NickMatrix:
+    """The runs of messages from each nick within each (channel, interval).
+
+    Row channel * len(date_ranges) + interval holds the run counts data
+    of nick codes indices, both between indptr[row] and indptr[row + 1].
+    Within a row, nick codes are in increasing order.
+    """
+
+    names: List[str]
+    date_ranges: List[DateRange]
+    # decodes the column of each nick code
+    nick_dictionary: NickDictionary
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+
+    @classmethod
+    def from_sorted_runs(  # noqa: WPS211  # Found too many arguments
+        cls,
+        names: Sequence[str],
+        date_ranges: Sequence[DateRange],
+        nick_dictionary: NickDictionary,
+        rows: np.ndarray,
+        codes: np.ndarray,
+        counts: np.ndarray,
+    ) -> "NickMatrix":
+        """Build a matrix from its nonzero entries, sorted by row then code."""
+        row_count = len(names) * len(date_ranges)
+        return cls(
+            names=list(names),
+            date_ranges=list(date_ranges),
+            nick_dictionary=nick_dictionary,
+            indptr=np.searchsorted(rows, np.arange(row_count + 1)),
+            indices=codes.astype(np.int32),
+            data=counts.astype(np.int64),
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """The number of rows and columns."""
+        return len(self.indptr) - 1, len(self.nick_dictionary)
+
+    @property
+    def date_starts(self) -> np.ndarray:
+        """The start time of each interval."""
+        return np.array(
+            [date_range.start_time for date_range in self.date_ranges],
+            dtype="datetime64[ns]",
+        )
+
+    @property
+    def date_ends(self) -> np.ndarray:
+        """The end time of each interval."""
+        return np.array(
+            [date_range.end_time for date_range in self.date_ranges],
+            dtype="datetime64[ns]",
+        )
+
+    @property
+    def row_channels(self) -> np.ndarray:
+        """The channel (index into names) of each row."""
+        return np.repeat(np.arange(len(self.names)), len(self.date_ranges))
+
+    @property
+    def row_intervals(self) -> np.ndarray:
+        """The interval (index into date_ranges) of each row."""
+        return np.tile(np.arange(len(self.date_ranges)), len(self.names))
+
+    def msgs(self) -> np.ndarray:
+        """Count the runs of messages within each row."""
+        data_before = np.concatenate(([0], np.cumsum(self.data)))
+        msgs: np.ndarray = data_before[self.indptr[1:]] - data_before[self.indptr[:-1]]
+        return msgs
+
+    def nicks(self) -> np.ndarray:
+        """Count the nicks that sent messages within each row."""
+        return np.diff(self.indptr)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get time-series data like aggregate_timeseries_data's, without topwords.
+
+        Rows are ordered by interval, then by channel in the order of names.
+        """
+        order = np.argsort(self.row_intervals, kind="stable")
+        row_intervals = self.row_intervals[order]
+        return pd.DataFrame(
+            {
+                "date_start": self.date_starts[row_intervals],
+                "name": np.array(self.names, dtype=object)[self.row_channels[order]],
+                "nicks": self.nicks()[order],
+                "msgs": self.msgs()[order],
+                "date_end": self.date_ends[row_intervals],
+            },
+        ).set_index("date_start")
+
+    def channel_rows(self, name: str) -> slice:
+        """Get the rows of a channel, one per interval."""
+        first_row = self.names.index(name) * len(self.date_ranges)
+        return slice(first_row, first_row + len(self.date_ranges))
+
+    def channel_activity(self, name: str, nicks: Sequence[str]) -> pd.DataFrame:
+        """Get the run counts of the given nicks in a channel, per interval.
+
+        Returns a dense DataFrame indexed by the start of each interval,
+        with a column per nick.
+        """
+        rows = self.channel_rows(name)
+        entries = slice(self.indptr[rows.start], self.indptr[rows.stop])
+        # column of each nick code in the result, or -1 for other nicks
+        columns = np.full(len(self.nick_dictionary), -1)
+        for column, nick in enumerate(nicks):
+            code = self.nick_dictionary.codes.get(nick)
+            if code is not None:
+                columns[code] = column
+        entry_columns = columns[self.indices[entries]]
+        entry_intervals = np.repeat(
+            np.arange(len(self.date_ranges)), self.nicks()[rows],
+        )
+        is_wanted = entry_columns >= 0
+        wanted_counts = self.data[entries][is_wanted]
+        activity = np.zeros((len(self.date_ranges), len(nicks)), dtype=np.int64)
+        activity[entry_intervals[is_wanted], entry_columns[is_wanted]] = wanted_counts
+        return pd.DataFrame(
+            activity,
+            index=pd.DatetimeIndex(self.date_starts, name="date_start"),
+            columns=list(nicks),
+        )
+
+    def nick_series(self, name: str, nick: str) -> pd.Series:
+        """Get the run counts of one nick in a channel, per interval."""
+        return self.channel_activity(name, [nick])[nick]
+
+    def top_nicks(self, number: int = 3) -> pd.DataFrame:
+        """Get the number most active nicks of each row.
+
+        Returns a row per (channel, interval, nick) like to_frame, with
+        name, nick, msgs and rank (starting at 0) columns.
+        """
+        entry_rows = np.repeat(np.arange(self.shape[0]), self.nicks())
+        # most active first within each row; ties by nick code
+        order = np.lexsort((self.indices, -self.data, entry_rows))
+        ranks = np.arange(len(order)) - self.indptr[entry_rows[order]]
+        top = order[ranks < number]
+        top_rows = entry_rows[top]
+        names = np.array(self.names, dtype=object)
+        nick_names = np.array(self.nick_dictionary.nicks, dtype=object)
+        top_df = pd.DataFrame(
+            {
+                "date_start": self.date_starts[self.row_intervals[top_rows]],
+                "name": names[self.row_channels[top_rows]],
+                "nick": nick_names[self.indices[top]],
+                "msgs": self.data[top],
+                "rank": ranks[ranks < number],
+            },
+        )
+        return top_df.sort_values(["date_start"], kind="stable").set_index(
+            "date_start",
+        )
+
+    def channels(self) -> List[List[IRCChannel]]:
+        """Decode into the IRCChannels of each interval, like analyze_intervals."""
+        nicks = self.nick_dictionary.decode(self.indices)
+        run_counts = self.data.tolist()
+        interval_count = len(self.date_ranges)
+        intervals: List[List[IRCChannel]] = [[] for _ in self.date_ranges]
+        for row, (start, end) in enumerate(zip(self.indptr[:-1], self.indptr[1:])):
+            topwords: Counter[str] = Counter(
+                dict(zip(nicks[start:end], run_counts[start:end])),
+            )
+            channel = ircchannel_from_topwords(
+                self.names[row // interval_count], topwords,
+            )
+            intervals[row % interval_count].append(channel)
+        return intervals
+
+    def interval_channels(self, interval: int) -> List[IRCChannel]:
+        """Decode only the IRCChannels of one interval, in the order of names."""
+        channels: List[IRCChannel] = []
+        for channel, name in enumerate(self.names):
+            row = channel * len(self.date_ranges) + interval
+            entries = slice(self.indptr[row], self.indptr[row + 1])
+            topwords: Counter[str] = Counter(
+                dict(
+                    zip(
+                        self.nick_dictionary.decode(self.indices[entries]),
+                        self.data[entries].tolist(),
+                    ),
+                ),
+            )
+            channels.append(ircchannel_from_topwords(name, topwords))
+        return channels
+
+    def to_scipy(self) -> "sparse.csr_matrix":
+        """Convert to a scipy.sparse CSR matrix, without copying."""
+        if sparse is None:
+            raise ImportError("NickMatrix.to_scipy() requires scipy")
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), self.shape)
+
+    def to_timeseries(
+        self, name: str, nicks: Sequence[str] = (), freq: str = None,
+    ) -> "TimeSeries":
+        """Convert a channel's activity to a darts TimeSeries.
+
+        Its columns are nicks and msgs, like create_timeseries, followed by
+        the run counts of each of the given nicks.
+        """
+        if TimeSeries is None:
+            raise ImportError("NickMatrix.to_timeseries() requires darts")
+        channel_df = self.channel_activity(name, nicks)
+        rows = self.channel_rows(name)
+        channel_df.insert(0, "msgs", self.msgs()[rows])
+        channel_df.insert(0, "nicks", self.nicks()[rows])
+        return TimeSeries.from_dataframe(
+            channel_df.astype(float),
+            time_col=None,
+            value_cols=list(channel_df.columns),
+            freq=freq,
+        )
@@ -0,0 +1,95 @@
+"""Encode nicks as integers shared across every parsed log.
+
+The same regulars show up in many channels and in millions of lines.
+Storing each nick once in a NickDictionary and storing parsed logs as
+arrays of int32 codes keeps memory usage down when many logs are parsed
+at once, and lets stats get counted on integers instead of strings.
+"""
+
+from typing import Collection, Dict, FrozenSet, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.blacklists import compile_blacklist
+
+# code of a missing nick, e.g. for lines that aren't messages.
+MISSING_NICK = -1
+
+
+class NickDictionary:
+    """A two-way mapping between nicks and int32 codes.
+
+    Nicks are stored exactly as they appear in the logs so they can be
+    displayed as-is. Which nicks each blacklist matches is remembered, so
+    repeated analyses only match nicks that are new to the dictionary.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty dictionary."""
+        self.codes: Dict[str, int] = {}
+        self.nicks: List[str] = []
+        # per blacklist, whether each nick (by code) is blacklisted
+        self._blacklisted: Dict[FrozenSet[str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        """Count the distinct nicks in the dictionary."""
+        return len(self.nicks)
+
+    def add(self, nicks: Iterable[str]) -> np.ndarray:
+        """Get the code of each nick, adding new nicks to the dictionary."""
+        codes: List[int] = []
+        for nick in nicks:
+            code = self.codes.get(nick)
+            if code is None:
+                code = len(self.nicks)
+                self.codes[nick] = code
+                self.nicks.append(nick)
+            codes.append(code)
+        return np.array(codes, dtype=np.int32)
+
+    def encode(self, nicks: pd.Series) -> np.ndarray:
+        """Convert a column of nicks to codes.
+
+        Each distinct nick is only looked up once. Missing nicks become
+        MISSING_NICK.
+        """
+        nicks = nicks.astype("category")
+        # the trailing entry maps the category code of missing values, -1
+        lookup = np.append(self.add(nicks.cat.categories), MISSING_NICK)
+        codes: np.ndarray = lookup.take(nicks.cat.codes.to_numpy()).astype(np.int32)
+        return codes
+
+    def decode(self, codes: Iterable[int]) -> List[str]:
+        """Convert codes back to nicks."""
+        return [self.nicks[code] for code in codes]
+
+    def blacklisted(
+        self, codes: np.ndarray, nick_blacklist: Collection[str],
+    ) -> np.ndarray:
+        """Check which of the given non-missing codes are of blacklisted nicks.
+
+        nick_blacklist may hold patterns; see clogstats.stats.blacklists.
+        """
+        matcher = compile_blacklist(nick_blacklist)
+        is_blacklisted = self._blacklisted.get(matcher.entries, np.zeros(0, dtype=bool))
+        if len(is_blacklisted) < len(self.nicks):
+            new_nicks = self.nicks[len(is_blacklisted) :]
+            is_blacklisted = np.append(
+                is_blacklisted,
+                np.fromiter(
+                    (matcher.matches(nick) for nick in new_nicks),
+                    dtype=bool,
+                    count=len(new_nicks),
+                ),
+            )
+            self._blacklisted[matcher.entries] = is_blacklisted
+        return is_blacklisted.take(codes)
+
+
+def encode_nicks(
+    logfile_df: pd.DataFrame, nick_dictionary: NickDictionary,
+) -> pd.DataFrame:
+    """Replace the nicks column of a parsed log with a nick_codes column."""
+    logfile_df["nick_codes"] = nick_dictionary.encode(logfile_df.pop("nicks"))
+    return logfile_df
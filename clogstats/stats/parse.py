@@ -1,12 +1,69 @@
 """Components for reading WeeChat logs and gathering statistics from them."""
 
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import (
+    IO,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
+import numpy as np
 import pandas as pd
 
+from clogstats.stats.seek import seek_offset
+
 ANSI_ESCAPE = r"(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]"
 NICK_PREFIXES = frozenset(("+", "%", "@", "~", "&"))
+# number of lines to parse at a time when streaming a log
+DEFAULT_CHUNKSIZE = 2 ** 16
+
+
+def open_gzip(path: Path, mode: str = "rb") -> IO[bytes]:
+    """Open a gzipped file, like bz2.open and lzma.open open theirs."""
+    # typeshed doesn't declare GzipFile as an IO[bytes], though it is one
+    return cast(IO[bytes], gzip.GzipFile(path, mode))
+
+
+# rotated logs are often compressed; these open them by file extension.
+DECOMPRESSORS: Mapping[str, Callable[..., IO[bytes]]] = MappingProxyType(
+    {".gz": open_gzip, ".bz2": bz2.open, ".xz": lzma.open},
+)
+# "pandas" parses logs with pd.read_csv() followed by vectorized string ops.
+# "bytes" parses mmap'd logs in a single pass; see parse_buffer().
+ENGINES = ("pandas", "bytes")
+
+
+class DateRange(NamedTuple):
+    """A time range used to select the part of a log file we want to analyze."""
+
+    # IRC didn't exist on 0001-01-01 CE [citation needed]
+    start_time: np.datetime64 = np.datetime64(datetime.min)
+    # if civilization is a thing at datetime.max, I hope nobody runs this.
+    end_time: np.datetime64 = np.datetime64(datetime.max)
+
+
+# the range of times a pandas Timestamp can hold, to microsecond precision
+_EARLIEST_TIMESTAMP = np.datetime64(pd.Timestamp.min.ceil("us"), "us")
+_LATEST_TIMESTAMP = np.datetime64(pd.Timestamp.max, "us")
 
 
 def strip_nick_prefix(nick: Optional[str]) -> Optional[str]:
@@ -18,64 +75,460 @@ def strip_nick_prefix(nick: Optional[str]) -> Optional[str]:
     return nick
 
 
+# if the prefix string isn't a nick, it's a special kind of message.
+# See WeeChat Plugin API docs for prefixes and their meanings.
+PREFIX_MSG_TYPES: Mapping[str, str] = MappingProxyType(
+    {
+        "=!=": "error",
+        "--": "network",  # e.g., changing channel topic
+        " *": "action",  # usually created with the "/me" cmd.
+        "-->": "join",
+        "<--": "quit",
+        "": "other",  # empty string = no prefix: other. rarely occurs in the wild.
+    },
+)
+# every prefix that isn't in PREFIX_MSG_TYPES is a nick, making the line a message.
+MSG_TYPES = pd.CategoricalDtype(("message", *PREFIX_MSG_TYPES.values()))
+# matches a single leading nick prefix
+NICK_PREFIX_PATTERN = f"^[{re.escape(''.join(sorted(NICK_PREFIXES)))}]"
+# matches the first word of a message body, skipping leading whitespace
+FIRST_WORD_PATTERN = r"^\s*(\S+)"
+
+
 def msg_type(prefix: str) -> str:
     """Type of IRC message, determined by the message prefix.
 
     See WeeChat Plugin API docs for prefixes and their meanings.
     """
-    # if the prefix string isn't a nick, it's a special kind of message.
-    # otherwise, it's a regular message
-    try:
-        return {
-            "=!=": "error",
-            "--": "network",  # e.g., changing channel topic
-            " *": "action",  # usually created with the "/me" cmd.
-            "-->": "join",
-            "<--": "quit",
-            "": "other",  # empty string = no prefix: other. rarely occurs in the wild.
-        }[prefix]
-    except KeyError:
-        # the prefix is a nick
-        return "message"
-
-
-def read_all_lines(path: Path) -> pd.DataFrame:
-    """Convert a WeeChat log file to a DataFrame with the relevant information."""
-    logfile_df = pd.read_csv(
-        path,
+    # if the prefix isn't a special one, it's a nick: the line is a regular message
+    return PREFIX_MSG_TYPES.get(prefix, "message")
+
+
+def msg_types(prefixes: pd.Series) -> pd.Series:
+    """Vectorized msg_type(): classify a whole column of prefixes at once."""
+    # unknown prefixes (and NaN) are nicks, so they're messages
+    return prefixes.map(PREFIX_MSG_TYPES).fillna("message").astype(MSG_TYPES)
+
+
+def map_distinct(
+    strings: pd.Series, transform: Callable[[pd.Series], pd.Series],
+) -> pd.Series:
+    """Apply a vectorized string transformation once per distinct value.
+
+    Columns like prefixes and nicks repeat the same few strings over and
+    over, so transforming the uniques and broadcasting the results back
+    through factorized codes is much cheaper than transforming every row.
+    Missing values stay missing.
+    """
+    codes, uniques = pd.factorize(strings)
+    transformed = transform(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    mapped = pd.Series(transformed.take(codes), index=strings.index, dtype=object)
+    return mapped.where(codes != -1)
+
+
+def strip_ansi_escapes(strings: pd.Series) -> pd.Series:
+    """Remove ANSI color escape codes from a column of strings."""
+    return map_distinct(
+        strings, lambda uniques: uniques.str.replace(ANSI_ESCAPE, "", regex=True),
+    )
+
+
+def strip_nick_prefixes(nicks: pd.Series) -> pd.Series:
+    """Vectorized strip_nick_prefix(): strip the mode prefix of every nick."""
+    return map_distinct(
+        nicks,
+        lambda uniques: uniques.str.replace(NICK_PREFIX_PATTERN, "", regex=True),
+    )
+
+
+def read_raw_lines(
+    logfile: Union[Path, IO[bytes]], chunksize: int = None,
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Read the tab-separated columns of a WeeChat log without interpreting them.
+
+    logfile is either a path or an open file, which is read from its
+    current position. If chunksize is given, return an iterator of
+    DataFrames holding at most chunksize lines each instead of a single
+    DataFrame.
+    """
+    return pd.read_csv(
+        logfile,
         sep="\t",
         error_bad_lines=False,
         names=("timestamps", "prefixes", "bodies"),
         dtype={"prefixes": str},
+        chunksize=chunksize,
     )
-    # convert timestamp column to pandas datetime
+
+
+def parse_timestamps(logfile_df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the timestamp column of raw log lines to pandas datetimes."""
     logfile_df["timestamps"] = pd.to_datetime(
         logfile_df["timestamps"], format="%Y-%m-%d %H:%M:%S",  # noqa: WPS323
     )
+    return logfile_df
+
+
+def timestamp_bounds(date_range: DateRange) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Get the start and end of date_range as pandas Timestamps.
+
+    Times beyond what pandas can represent, like those of DateRange(),
+    become pd.Timestamp.min or pd.Timestamp.max, which no log line can
+    reach either.
+    """
+    start_time = np.datetime64(date_range.start_time, "us")
+    end_time = np.datetime64(date_range.end_time, "us")
+    return (
+        pd.Timestamp(min(max(start_time, _EARLIEST_TIMESTAMP), _LATEST_TIMESTAMP)),
+        pd.Timestamp(min(max(end_time, _EARLIEST_TIMESTAMP), _LATEST_TIMESTAMP)),
+    )
+
+
+def in_date_range(timestamps: pd.Series, date_range: DateRange) -> pd.Series:
+    """Boolean mask of the timestamps that fall within date_range."""
+    start_time, end_time = timestamp_bounds(date_range)
+    return (timestamps > start_time) & (timestamps < end_time)
+
+
+def parse_lines(logfile_df: pd.DataFrame) -> pd.DataFrame:
+    """Extract message types and nicks from log lines with parsed timestamps."""
     # remove ANSI color escape codes from prefix column
-    logfile_df["prefixes"] = logfile_df["prefixes"].str.replace(ANSI_ESCAPE, "")
+    logfile_df["prefixes"] = strip_ansi_escapes(logfile_df["prefixes"])
     # this is time-series data. set timestamp column to index
     logfile_df.set_index("timestamps")
     # save message type of each line
-    logfile_df["msg_types"] = logfile_df["prefixes"].apply(msg_type)
+    logfile_df["msg_types"] = msg_types(logfile_df["prefixes"])
     # nick column
     # rows with msgtype "message" have the nick in the "prefix" column.
     # Rows with msgtype join/leave/action have nick as the first word of the msg body.
-    logfile_df["nicks"] = logfile_df["prefixes"]
-    logfile_df.loc[logfile_df["msg_types"] != "message", "nicks"] = None
+    is_message: pd.Series = logfile_df["msg_types"] == "message"
+    nicks = pd.Series(None, index=logfile_df.index, dtype=object)
     # strip nick prefixes (+Seirdy -> Seirdy, @Seirdy -> Seirdy, etc.)
-    logfile_df["nicks"] = logfile_df["nicks"].apply(strip_nick_prefix)
+    # someone on gitter has the nick "nan", which read_csv() turns into NaN.
+    # https://xkcd.com/327/
+    nicks[is_message] = strip_nick_prefixes(
+        logfile_df.loc[is_message, "prefixes"].fillna("nan"),
+    )
     # add nicks to msgtypes join, leave, and action
     is_join_leave_action: pd.Series = logfile_df["msg_types"].isin(
         {"join", "leave", "action"},
     )
-    logfile_df.loc[is_join_leave_action, "nicks"] = (
-        logfile_df.loc[is_join_leave_action, "bodies"]
-        .apply(lambda body: body.split()[0])
-        .str.replace(ANSI_ESCAPE, "")
+    nicks[is_join_leave_action] = strip_ansi_escapes(
+        logfile_df.loc[is_join_leave_action, "bodies"].str.extract(
+            FIRST_WORD_PATTERN, expand=False,
+        ),
     )
+    logfile_df["nicks"] = nicks.astype("category")
     # discard message bodies since they won't be used again.
     # this significantly improves memory usage when working with several logfiles
     # at once
     logfile_df.pop("bodies")
     return logfile_df
+
+
+def read_all_lines(
+    path: Path, start_time: np.datetime64 = None, engine: str = "pandas",
+) -> pd.DataFrame:
+    """Convert a WeeChat log file to a DataFrame with the relevant information.
+
+    If start_time is given, skip straight to the part of the log around
+    start_time instead of reading the log from the beginning. A few
+    lines from shortly before start_time may still be included.
+    Compressed logs (see DECOMPRESSORS) are decompressed on the fly.
+
+    engine is one of ENGINES.
+    """
+    check_engine(engine)
+    if engine == "bytes":
+        with log_buffer(path, start_time) as (buffer, offset):
+            return parse_buffer(buffer[offset:])
+    with open_log(path, start_time) as logfile:
+        return parse_lines(parse_timestamps(read_raw_lines(logfile)))
+
+
+def stream_lines(
+    path: Path,
+    date_range: DateRange,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    engine: str = "pandas",
+) -> Iterator[pd.DataFrame]:
+    """Lazily parse the lines of a WeeChat log that fall within date_range.
+
+    The log is read chunksize lines at a time, so memory usage doesn't
+    depend on the size of the file. Lines outside date_range are dropped
+    before the expensive string processing happens. WeeChat appends to
+    its logs in time order, so reading starts around date_range.start_time
+    (see clogstats.stats.seek; compressed logs are read from the start)
+    and stops at the first chunk that reaches date_range.end_time.
+    """
+    check_engine(engine)
+    if engine == "bytes":
+        yield from stream_buffer(path, date_range, chunksize)
+        return
+    _, end_time = timestamp_bounds(date_range)
+    with open_log(path, date_range.start_time) as logfile:
+        reader = read_raw_lines(logfile, chunksize=chunksize)
+        for raw_chunk in reader:
+            chunk = parse_timestamps(raw_chunk)
+            chunk_in_range = chunk.loc[in_date_range(chunk["timestamps"], date_range)]
+            if not chunk_in_range.empty:
+                yield parse_lines(chunk_in_range.copy())
+            if chunk["timestamps"].max() >= end_time:
+                break
+
+
+def concat_chunks(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Join parsed chunks of a log into a single parsed DataFrame.
+
+    Each chunk has its own nick categories, so the combined nick column
+    gets re-categorized.
+    """
+    logfile_df = pd.concat(chunks, ignore_index=True, copy=False)
+    logfile_df["nicks"] = logfile_df["nicks"].astype("category")
+    return logfile_df
+
+
+def read_lines_in_range(
+    path: Path,
+    date_range: DateRange,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    engine: str = "pandas",
+) -> pd.DataFrame:
+    """Like read_all_lines, but only keep lines within date_range.
+
+    Uses stream_lines, so memory usage during parsing stays bounded by
+    the number of lines in date_range rather than the size of the file.
+    """
+    return concat_chunks(
+        [empty_parsed_lines(), *stream_lines(path, date_range, chunksize, engine)],
+    )
+
+
+def empty_parsed_lines() -> pd.DataFrame:
+    """Parsed DataFrame with no lines, for logs with nothing in range."""
+    return pd.DataFrame(
+        {
+            "timestamps": pd.Series(dtype="datetime64[ns]"),
+            "prefixes": pd.Series(dtype=object),
+            "msg_types": pd.Series(dtype=MSG_TYPES),
+            "nicks": pd.Series(dtype="category"),
+        },
+    )
+
+
+def check_engine(engine: str) -> None:
+    """Raise a ValueError if engine isn't one of ENGINES."""
+    if engine not in ENGINES:
+        raise ValueError(f"unknown parse engine {engine!r}; choose from {ENGINES}")
+
+
+# the default strings that read_csv() treats as missing values.
+# the bytes engine treats fields the same way so both engines agree.
+NA_FIELDS = frozenset(
+    field.encode()
+    for field in (
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "n/a",
+        "nan",
+        "null",
+    )
+)
+MSG_TYPE_CODES: Mapping[str, int] = MappingProxyType(
+    {msg_type_name: code for code, msg_type_name in enumerate(MSG_TYPES.categories)},
+)
+# msg types whose nick is the first word of the message body
+NICK_IN_BODY_CODES = frozenset(
+    MSG_TYPE_CODES[msg_type_name]
+    for msg_type_name in ("join", "leave", "action")
+    if msg_type_name in MSG_TYPE_CODES
+)
+_ANSI_ESCAPE_PATTERN = re.compile(ANSI_ESCAPE)
+# lines that have the same prefix get the same msg type and nick, and there
+# aren't many distinct prefixes. Caching lets each one get decoded just once.
+_DISTINCT_FIELDS_CACHED = 2 ** 16
+
+
+@lru_cache(maxsize=_DISTINCT_FIELDS_CACHED)
+def classify_prefix(raw_prefix: bytes) -> Tuple[Optional[str], int, Optional[str]]:
+    """Get the prefix, msg type code, and nick of a line from its raw prefix."""
+    if raw_prefix in NA_FIELDS:
+        # someone on gitter has the nick "nan". https://xkcd.com/327/
+        return None, MSG_TYPE_CODES["message"], "nan"
+    prefix = _ANSI_ESCAPE_PATTERN.sub("", raw_prefix.decode(errors="replace"))
+    line_type = msg_type(prefix)
+    if line_type == "message":
+        return prefix, MSG_TYPE_CODES[line_type], strip_nick_prefix(prefix)
+    return prefix, MSG_TYPE_CODES[line_type], None
+
+
+@lru_cache(maxsize=_DISTINCT_FIELDS_CACHED)
+def decode_nick(raw_word: bytes) -> str:
+    """Decode a nick from the start of a message body, removing color codes."""
+    return _ANSI_ESCAPE_PATTERN.sub("", raw_word.decode(errors="replace"))
+
+
+def body_nick(raw_body: bytes) -> Optional[str]:
+    """Get the nick from the first word of a join/leave/action message body."""
+    if raw_body in NA_FIELDS:
+        return None
+    words = raw_body.split(None, 1)
+    if not words:
+        return None
+    return decode_nick(words[0])
+
+
+class _ParsedColumns(NamedTuple):
+    """The columns of a parsed DataFrame, collected line by line."""
+
+    timestamps: List[Optional[str]]
+    prefixes: List[Optional[str]]
+    msg_type_codes: List[int]
+    nicks: List[Optional[str]]
+
+
+def parse_line(line: bytes, columns: _ParsedColumns) -> None:
+    """Split one line of a log into its fields and add them to columns."""
+    if line.endswith(b"\r"):
+        line = line[:-1]
+    if not line:  # read_csv() skips blank lines
+        return
+    fields = line.split(b"\t", 3)
+    if len(fields) > 3:  # read_csv() skips lines with too many fields
+        return
+    fields += [b""] * (3 - len(fields))
+    raw_timestamp, raw_prefix, raw_body = fields
+    prefix, msg_type_code, nick = classify_prefix(raw_prefix)
+    if msg_type_code in NICK_IN_BODY_CODES:
+        nick = body_nick(raw_body)
+    columns.timestamps.append(
+        None if raw_timestamp in NA_FIELDS else raw_timestamp.decode(errors="replace"),
+    )
+    columns.prefixes.append(prefix)
+    columns.msg_type_codes.append(msg_type_code)
+    columns.nicks.append(nick)
+
+
+def parse_buffer(buffer: bytes) -> pd.DataFrame:
+    """Parse the raw contents of a log in a single pass.
+
+    This is the "bytes" engine. Unlike read_all_lines with the "pandas"
+    engine, message bodies are never decoded or stored: only the
+    timestamp and prefix of each line get decoded, and only the first
+    word of a message body is looked at, and only for joins/actions.
+    Quotes aren't special, whereas read_csv() treats a field that starts
+    with a double quote as a quoted field.
+    """
+    columns = _ParsedColumns([], [], [], [])
+    for line in buffer.split(b"\n"):
+        parse_line(line, columns)
+    return pd.DataFrame(
+        {
+            "timestamps": pd.to_datetime(
+                pd.Series(columns.timestamps, dtype=object),
+                format="%Y-%m-%d %H:%M:%S",  # noqa: WPS323
+            ),
+            "prefixes": pd.Series(columns.prefixes, dtype=object).fillna(np.nan),
+            "msg_types": pd.Categorical.from_codes(
+                np.array(columns.msg_type_codes, dtype=np.int8), dtype=MSG_TYPES,
+            ),
+            "nicks": pd.Series(columns.nicks, dtype="category"),
+        },
+    )
+
+
+def is_compressed(path: Path) -> bool:
+    """Check if a log is a compressed (usually rotated) log."""
+    return path.suffix in DECOMPRESSORS
+
+
+@contextmanager
+def open_log(path: Path, start_time: np.datetime64 = None) -> Iterator[IO[bytes]]:
+    """Open a log for reading, positioned around start_time if it's given.
+
+    Compressed logs get decompressed as they're read. They can't be
+    searched, so they're always read from the start.
+    """
+    if is_compressed(path):
+        with DECOMPRESSORS[path.suffix](path, "rb") as decompressed_log:
+            yield decompressed_log
+        return
+    with open(path, "rb") as logfile:
+        if start_time is not None:
+            logfile.seek(seek_offset(logfile, start_time))
+        yield logfile
+
+
+@contextmanager
+def log_buffer(
+    path: Path, start_time: np.datetime64 = None,
+) -> Iterator[Tuple[Union[mmap.mmap, bytes], int]]:
+    """Get the contents of a log and the offset of start_time within them.
+
+    Uncompressed logs are mmap'd. Compressed logs are decompressed into
+    memory and start at offset 0.
+    """
+    if is_compressed(path):
+        with open_log(path) as decompressed_log:
+            yield decompressed_log.read(), 0
+        return
+    with open(path, "rb") as logfile, mapped_log(logfile) as buffer:
+        offset = 0 if start_time is None else seek_offset(logfile, start_time)
+        yield buffer, offset
+
+
+@contextmanager
+def mapped_log(logfile: BinaryIO) -> Iterator[Union[mmap.mmap, bytes]]:
+    """Memory-map an open log for reading.
+
+    Empty files can't be mmap'd, so they're mapped to an empty bytes
+    object instead.
+    """
+    if not os.fstat(logfile.fileno()).st_size:
+        yield b""
+        return
+    with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield buffer
+
+
+def line_chunks(
+    buffer: Union[mmap.mmap, bytes], offset: int, chunksize: int,
+) -> Iterator[bytes]:
+    """Lazily split a buffer into chunks of up to chunksize complete lines."""
+    while offset < len(buffer):
+        end = offset
+        for _ in range(chunksize):
+            end = buffer.find(b"\n", end) + 1
+            if not end:
+                end = len(buffer)
+                break
+        yield buffer[offset:end]
+        offset = end
+
+
+def stream_buffer(
+    path: Path, date_range: DateRange, chunksize: int = DEFAULT_CHUNKSIZE,
+) -> Iterator[pd.DataFrame]:
+    """Like stream_lines, but with the "bytes" engine."""
+    _, end_time = timestamp_bounds(date_range)
+    with log_buffer(path, date_range.start_time) as (buffer, offset):
+        for raw_chunk in line_chunks(buffer, offset, chunksize):
+            chunk = parse_buffer(raw_chunk)
+            chunk_in_range = chunk.loc[in_date_range(chunk["timestamps"], date_range)]
+            if not chunk_in_range.empty:
+                yield chunk_in_range
+            if chunk["timestamps"].max() >= end_time:
+                break
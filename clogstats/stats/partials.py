@@ -0,0 +1,344 @@
+"""Gather stats as partial results that can be merged with other partial results.
+
+Stats can be gathered on each machine that has logs, e.g. bouncers that
+each log a different set of networks, and combined on another machine
+without moving any logs around. A PartialStats holds the stats of each
+channel within each interval in a form that can be summed: the exact
+message count of every nick, or a ChannelSketch for approximate stats.
+
+Partial stats are saved as JSON, compressed if the file name ends in a
+suffix from clogstats.stats.parse.DECOMPRESSORS.
+"""
+
+import base64
+import io
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Any,
+    Counter,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Sequence,
+    Union,
+)
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.executors import imap_ordered
+from clogstats.stats.gather_stats import (
+    BOT_BLACKLISTS,
+    AnalyzeLogStreamArgs,
+    ChannelsWanted,
+    IRCChannel,
+    NickBlacklist,
+    ParseOptions,
+    ircchannel_from_sketch,
+    ircchannel_from_topwords,
+    log_paths,
+    log_segments,
+    network_blacklist,
+    parse_multiple_logs,
+    sketch_log_stream_wrapper,
+    sort_channels,
+)
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DECOMPRESSORS, DateRange
+from clogstats.stats.sketches import Approximation, ChannelSketch, SpaceSaving
+from clogstats.stats.time_series import bucket_intervals, timeseries_frame
+
+# bumped whenever saved partial stats change in an incompatible way
+PARTIAL_VERSION = 1
+
+# the stats of a channel within an interval: every nick's message count, or a sketch
+ChannelState = Union[Counter[str], ChannelSketch]
+
+
+def interval_key(date_range: DateRange) -> DateRange:
+    """Normalize a date range, so that equal ones from different hosts are equal."""
+    return DateRange(
+        start_time=np.datetime64(date_range.start_time, "us"),
+        end_time=np.datetime64(date_range.end_time, "us"),
+    )
+
+
+def as_sketch(
+    name: str, state: ChannelState, approximation: Approximation,
+) -> ChannelSketch:
+    """Copy a channel's stats into a new sketch."""
+    sketch = ChannelSketch(name, approximation)
+    if isinstance(state, ChannelSketch):
+        sketch.merge(state)
+    else:
+        sketch.update(state)
+    return sketch
+
+
+def merge_states(name: str, state: ChannelState, other: ChannelState) -> ChannelState:
+    """Sum two stats of the same channel without modifying either of them.
+
+    Exact stats merged with a sketch become a sketch.
+    """
+    if isinstance(state, ChannelSketch):
+        approximation = state.approximation
+    elif isinstance(other, ChannelSketch):
+        approximation = other.approximation
+    else:
+        return state + other
+    merged = as_sketch(name, state, approximation)
+    merged.merge(as_sketch(name, other, approximation))
+    return merged
+
+
+def state_to_channel(name: str, state: ChannelState) -> IRCChannel:
+    """Get the IRCChannel of a channel's stats."""
+    if isinstance(state, ChannelSketch):
+        return ircchannel_from_sketch(state)
+    return ircchannel_from_topwords(name, Counter(state))
+
+
+def state_to_dict(state: ChannelState) -> Dict[str, Any]:
+    """Convert a channel's stats to something json.dump can handle."""
+    if not isinstance(state, ChannelSketch):
+        return {"topwords": {nick: int(count) for nick, count in state.items()}}
+    return {
+        "sketch": {
+            "error": state.approximation.error,
+            "msgs": state.msgs,
+            "registers": base64.b64encode(state.nicks.registers.tobytes()).decode(),
+            "topwords": state.topwords.counts,
+        },
+    }
+
+
+def state_from_dict(name: str, state_dict: Mapping[str, Any]) -> ChannelState:
+    """Convert the output of state_to_dict back to a channel's stats."""
+    if "topwords" in state_dict:
+        return Counter(state_dict["topwords"])
+    sketch_dict = state_dict["sketch"]
+    sketch = ChannelSketch(
+        name, Approximation(error=sketch_dict["error"]), msgs=sketch_dict["msgs"],
+    )
+    registers = np.frombuffer(base64.b64decode(sketch_dict["registers"]), np.uint8)
+    if len(registers) != len(sketch.nicks.registers):
+        raise ValueError(f"sketch of {name} doesn't match its error")
+    sketch.nicks.registers = registers.copy()
+    sketch.topwords = SpaceSaving(
+        sketch.topwords.capacity, dict(sketch_dict["topwords"]),
+    )
+    return sketch
+
+
+@dataclass
+class PartialStats:
+    """The stats of some channels within some intervals, mergeable with others."""
+
+    # the stats of each channel within each date range; see interval_key
+    intervals: Dict[DateRange, Dict[str, ChannelState]] = field(default_factory=dict)
+
+    @classmethod
+    def from_channels(
+        cls, date_range: DateRange, channels: Iterable[IRCChannel],
+    ) -> "PartialStats":
+        """Wrap exact stats, like those of analyze_all_logs without an approximation.
+
+        The topwords of approximate IRCChannels are incomplete and can't be
+        merged; use sketches instead.
+        """
+        partial_stats = cls()
+        partial_stats.add_interval(date_range)
+        for channel in channels:
+            partial_stats.add(date_range, channel.name, channel.topwords)
+        return partial_stats
+
+    @classmethod
+    def from_timeseries(cls, timeseries: pd.DataFrame) -> "PartialStats":
+        """Wrap time-series data, like that of aggregate_timeseries_data."""
+        partial_stats = cls()
+        for date_start, row in timeseries.iterrows():
+            date_range = DateRange(start_time=date_start, end_time=row["date_end"])
+            partial_stats.add(date_range, row["name"], Counter(row["topwords"]))
+        return partial_stats
+
+    def add_interval(self, date_range: DateRange) -> Dict[str, ChannelState]:
+        """Get the stats of each channel within date_range, adding it if it's new."""
+        return self.intervals.setdefault(interval_key(date_range), {})
+
+    def add(self, date_range: DateRange, name: str, state: ChannelState) -> None:
+        """Add stats of a channel within date_range to any it already has."""
+        channels = self.add_interval(date_range)
+        if name in channels:
+            state = merge_states(name, channels[name], state)
+        channels[name] = state
+
+    def merge(self, other: "PartialStats") -> None:
+        """Add all the stats of other."""
+        for date_range, channels in other.intervals.items():
+            self.add_interval(date_range)
+            for name, state in channels.items():
+                self.add(date_range, name, state)
+
+    def date_ranges(self) -> List[DateRange]:
+        """Get every interval, in order."""
+        return sorted(self.intervals)
+
+    def channels(
+        self, date_range: DateRange, sortkey: str = "msgs",
+    ) -> List[IRCChannel]:
+        """Get the stats of each channel within one of the intervals."""
+        return sort_channels(
+            (
+                state_to_channel(name, state)
+                for name, state in self.intervals[interval_key(date_range)].items()
+            ),
+            sortkey,
+        )
+
+    def combined(self, sortkey: str = "msgs") -> List[IRCChannel]:
+        """Get the stats of each channel within all the intervals put together.
+
+        A run of messages spanning two intervals counts once in each.
+        """
+        combined = PartialStats()
+        whole_range = DateRange(
+            start_time=min(date_range.start_time for date_range in self.intervals),
+            end_time=max(date_range.end_time for date_range in self.intervals),
+        )
+        combined.add_interval(whole_range)
+        for channels in self.intervals.values():
+            for name, state in channels.items():
+                combined.add(whole_range, name, state)
+        return combined.channels(whole_range, sortkey)
+
+    def to_timeseries(self, sortkey: str = "msgs") -> pd.DataFrame:
+        """Convert to time-series data, like that of aggregate_timeseries_data."""
+        date_ranges = self.date_ranges()
+        return timeseries_frame(
+            date_ranges,
+            [self.channels(date_range, sortkey) for date_range in date_ranges],
+            sortkey,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to something json.dump can handle."""
+        return {
+            "version": PARTIAL_VERSION,
+            "intervals": [
+                {
+                    "start_time": str(date_range.start_time),
+                    "end_time": str(date_range.end_time),
+                    "channels": {
+                        name: state_to_dict(state)
+                        for name, state in self.intervals[date_range].items()
+                    },
+                }
+                for date_range in self.date_ranges()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, partial_dict: Mapping[str, Any]) -> "PartialStats":
+        """Convert the output of to_dict back to partial stats."""
+        version = partial_dict.get("version")
+        if version != PARTIAL_VERSION:
+            raise ValueError(f"unsupported partial stats version {version!r}")
+        partial_stats = cls()
+        for interval in partial_dict["intervals"]:
+            date_range = DateRange(
+                start_time=np.datetime64(interval["start_time"]),
+                end_time=np.datetime64(interval["end_time"]),
+            )
+            channels = partial_stats.add_interval(date_range)
+            for name, state_dict in interval["channels"].items():
+                channels[name] = state_from_dict(name, state_dict)
+        return partial_stats
+
+
+def save_partial(partial_stats: PartialStats, path: Path) -> None:
+    """Save partial stats to a JSON file, compressing it according to its suffix."""
+    opener = DECOMPRESSORS.get(path.suffix, open)
+    with io.TextIOWrapper(opener(path, "wb"), encoding="utf-8") as partial_file:
+        json.dump(partial_stats.to_dict(), partial_file)
+
+
+def load_partial(path: Path) -> PartialStats:
+    """Load partial stats saved with save_partial."""
+    opener = DECOMPRESSORS.get(path.suffix, open)
+    with opener(path, "rb") as partial_file:
+        return PartialStats.from_dict(json.load(partial_file))
+
+
+def merge_partials(partials: Iterable[PartialStats]) -> PartialStats:
+    """Sum partial stats, e.g. from different hosts."""
+    merged = PartialStats()
+    for partial_stats in partials:
+        merged.merge(partial_stats)
+    return merged
+
+
+def gather_partial(
+    date_ranges: Sequence[DateRange],
+    channels_wanted: ChannelsWanted = None,
+    nick_blacklists: NickBlacklist = None,
+    log_dir: str = None,
+    parse_options: ParseOptions = None,
+) -> PartialStats:
+    """Gather mergeable stats of the logs in log_dir within each date range.
+
+    With parse_options.approximation, each channel's stats are sketched
+    while streaming its log, once per date range. Otherwise logs get
+    parsed once and bucketed into date_ranges, which must be consecutive;
+    see bucket_intervals.
+    """
+    if nick_blacklists is None:
+        nick_blacklists = BOT_BLACKLISTS
+    if parse_options is None:
+        parse_options = ParseOptions()
+    whole_range = DateRange(
+        start_time=min(date_range.start_time for date_range in date_ranges),
+        end_time=max(date_range.end_time for date_range in date_ranges),
+    )
+    partial_stats = PartialStats()
+    for date_range in date_ranges:
+        partial_stats.add_interval(date_range)
+    paths = log_paths(channels_wanted, log_dir, whole_range)
+    if parse_options.approximation is not None:
+        sketch_args = [
+            AnalyzeLogStreamArgs(
+                paths=segments,
+                date_range=date_range,
+                nick_blacklist=network_blacklist(name, nick_blacklists),
+                engine=parse_options.engine,
+                approximation=parse_options.approximation,
+            )
+            for name, segments in log_segments(paths, whole_range).items()
+            for date_range in date_ranges
+        ]
+        sketches = imap_ordered(
+            sketch_log_stream_wrapper,
+            sketch_args,
+            parse_options.executor,
+            parse_options.workers,
+        )
+        for args, sketch in zip(sketch_args, sketches):
+            partial_stats.add(args.date_range, sketch.name, sketch)
+        return partial_stats
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_multiple_logs(
+        paths,
+        # the cache covers whole logs
+        date_range=whole_range if parse_options.cache is None else None,
+        parse_options=parse_options,
+        nick_dictionary=nick_dictionary,
+    )
+    gathered_intervals = bucket_intervals(
+        date_ranges, parsed_logs, nick_blacklists, nick_dictionary,
+    )
+    for date_range, channels in zip(date_ranges, gathered_intervals):
+        for channel in channels:
+            partial_stats.add(date_range, channel.name, channel.topwords)
+    return partial_stats
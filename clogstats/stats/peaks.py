@@ -0,0 +1,138 @@
+"""Find peaks of activity in every channel at once.
+
+clogstats.forecasting.peak_detection finds the peaks of one darts
+TimeSeries at a time with scipy.signal.find_peaks. This module finds the
+same peaks across a whole activity matrix, with a row per channel and a
+column per interval:
+
+- local maxima (the middle of a plateau, like find_peaks) are found for
+  every row at once, from the signs of the differences along each row;
+- each row's height threshold, its mean, is computed for all rows at
+  once;
+- only the distance between peaks is enforced row by row, over the few
+  peaks that are left.
+
+The intervals peaks fall in are built from one array of interval starts
+and one of interval ends, shared by every channel.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.parse import DateRange
+
+_SIX_HOURS = pd.Timedelta("6H")
+
+
+def activity_matrix(timeseries: pd.DataFrame, value: str = "msgs") -> pd.DataFrame:
+    """Turn time-series data into a matrix of activity per channel and interval.
+
+    timeseries is like that of aggregate_timeseries_data or of
+    NickMatrix.to_frame(). The result has a row per channel and a column
+    per interval start, holding the given value column; intervals in
+    which a channel has no row count as 0.
+    """
+    return timeseries.pivot_table(
+        index="name",
+        columns=timeseries.index,
+        values=value,
+        aggfunc="sum",
+        fill_value=0,
+    )
+
+
+def local_maxima(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the row and column of each local maximum of each row of values.
+
+    Like scipy.signal.find_peaks, a maximum is a sample (or the middle of
+    a run of equal samples) higher than both of its neighbours; the
+    first and last samples of a row are never maxima. Maxima are ordered
+    by row, then by column.
+    """
+    column_count = values.shape[1]
+    if column_count < 3:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    signs = np.sign(np.diff(values, axis=1))
+    # for each difference, the position of the next nonzero one at or after it
+    positions = np.where(signs != 0, np.arange(column_count - 1), column_count - 1)
+    next_change = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1]
+    # a maximum's plateau starts after a rise...
+    rows, rises = np.nonzero(signs[:, :-1] > 0)
+    first = rises + 1
+    # ...and ends right before the next fall
+    last = next_change[rows, first]
+    is_maximum = last < column_count - 1
+    is_maximum[is_maximum] = signs[rows[is_maximum], last[is_maximum]] < 0
+    rows = rows[is_maximum]
+    return rows, (first[is_maximum] + last[is_maximum]) // 2
+
+
+def select_by_distance(
+    columns: np.ndarray, heights: np.ndarray, distance: int,
+) -> np.ndarray:
+    """Drop the lower of peaks closer than distance, like find_peaks' distance.
+
+    columns must be in increasing order; returns a mask of peaks to keep.
+    """
+    keep = np.ones(len(columns), dtype=bool)
+    # highest first; among equal heights, the rightmost first, like scipy
+    for peak in np.argsort(heights, kind="stable")[::-1]:
+        if not keep[peak]:
+            continue
+        too_close = np.abs(columns - columns[peak]) < distance
+        too_close[peak] = False
+        keep[too_close] = False
+    return keep
+
+
+def find_peaks_2d(
+    values: np.ndarray, distance: int = 1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the row and column of every peak in every row of values.
+
+    A peak is a local maximum at least as high as its row's mean, at
+    least distance columns away from any higher peak in its row.
+    """
+    rows, columns = local_maxima(values)
+    heights = values[rows, columns]
+    is_high = heights >= values.mean(axis=1)[rows]
+    rows, columns, heights = rows[is_high], columns[is_high], heights[is_high]
+    if distance <= 1:
+        return rows, columns
+    keep = np.ones(len(rows), dtype=bool)
+    # peaks are ordered by row, so each row's peaks are contiguous
+    bounds = np.searchsorted(rows, np.arange(values.shape[0] + 1))
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if last - first > 1:
+            keep[first:last] = select_by_distance(
+                columns[first:last], heights[first:last], distance,
+            )
+    return rows[keep], columns[keep]
+
+
+def peak_intervals(
+    activity: pd.DataFrame, interval: pd.Timedelta = _SIX_HOURS,
+) -> Dict[str, List[DateRange]]:
+    """Specify the intervals across which each channel will be most active.
+
+    activity has a row per channel and a column per time, in order and
+    evenly spaced, like the result of activity_matrix. Peaks of each row
+    are at least interval apart; each peak is reported as the interval
+    from its time to the next one, like intervals_with_activity.
+    """
+    times = pd.DatetimeIndex(activity.columns).to_numpy()
+    step = pd.Timedelta(times[1] - times[0]) if len(times) > 1 else interval
+    rows, columns = find_peaks_2d(
+        activity.to_numpy(dtype=float), max(math.ceil(interval / step), 1),
+    )
+    # a peak is never the last column, so its interval always has an end
+    starts = times[:-1]
+    ends = times[1:]
+    intervals: Dict[str, List[DateRange]] = {name: [] for name in activity.index}
+    names = activity.index.to_numpy()
+    for row, column in zip(rows.tolist(), columns.tolist()):
+        intervals[names[row]].append(DateRange(starts[column], ends[column]))
+    return intervals
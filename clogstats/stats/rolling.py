@@ -0,0 +1,226 @@
+"""Gather stats over a trailing window of time, sampled at regular steps.
+
+Dividing a date range into intervals (see clogstats.stats.time_series)
+gives stats for disjoint intervals. Rolling stats instead cover a window
+ending at each sample time, e.g. the last 24 hours every 5 minutes, so
+consecutive windows overlap almost entirely. Rather than analyzing each
+window from scratch:
+
+- messages are counted with prefix sums over the spoken lines that start
+  a run (see first_of_runs), so each window costs two lookups;
+- active nicks are counted with SlidingNickCounts, which only looks at
+  the lines entering and leaving the window as it moves.
+
+Like analyze_log, a window holds the lines strictly between its start
+and end, and its first line always starts a run. This relies on logs
+being in time order.
+"""
+
+from datetime import timedelta
+from typing import List, Mapping, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.blacklists import compile_blacklist
+from clogstats.stats.gather_stats import (
+    BOT_BLACKLISTS,
+    SPOKEN_MSG_TYPES,
+    ChannelsWanted,
+    NickBlacklist,
+    ParsedLogs,
+    log_paths,
+    network_blacklist,
+    parse_multiple_logs,
+)
+from clogstats.stats.nicks import MISSING_NICK, NickDictionary
+from clogstats.stats.parse import DateRange
+
+# columns of rolling stats, besides the date_start index
+ROLLING_COLUMNS = ("name", "nicks", "msgs", "date_end")
+
+
+class SlidingNickCounts:
+    """The number of distinct nicks among the lines in a sliding window.
+
+    Keeps the number of lines in the window per nick code, so adding or
+    evicting lines only costs as much as the lines themselves.
+    """
+
+    def __init__(self, code_count: int) -> None:
+        """Start with an empty window over codes in range(code_count)."""
+        self.counts = np.zeros(code_count, dtype=np.int64)
+        self.distinct = 0
+
+    def add(self, codes: np.ndarray) -> None:
+        """Add lines entering the window, by nick code."""
+        added_codes, added_counts = np.unique(codes, return_counts=True)
+        self.distinct += int(np.count_nonzero(self.counts[added_codes] == 0))
+        self.counts[added_codes] += added_counts
+
+    def evict(self, codes: np.ndarray) -> None:
+        """Remove lines leaving the window, which must have been added before."""
+        evicted_codes, evicted_counts = np.unique(codes, return_counts=True)
+        self.counts[evicted_codes] -= evicted_counts
+        self.distinct -= int(np.count_nonzero(self.counts[evicted_codes] == 0))
+
+
+def sample_times(
+    date_range: DateRange, window: timedelta, step: timedelta,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the start and end times of every window within date_range.
+
+    Windows end every step, from date_range.start_time + window up to
+    date_range.end_time.
+    """
+    window_ns = np.timedelta64(window, "ns")
+    end_times: np.ndarray = np.arange(
+        np.datetime64(date_range.start_time, "ns") + window_ns,
+        np.datetime64(date_range.end_time, "ns") + np.timedelta64(1, "ns"),
+        np.timedelta64(step, "ns"),
+    )
+    return end_times - window_ns, end_times
+
+
+def counted_lines(
+    logfile_df: pd.DataFrame,
+    nick_blacklist: Set[str],
+    nick_dictionary: NickDictionary = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """Get what rolling_channel_stats needs of a log's spoken lines.
+
+    That is their timestamps, their nick codes with MISSING_NICK for
+    nicks that don't count (missing or blacklisted), whether they start a
+    run, and how many codes there are. nick_dictionary must be given for
+    logs whose nicks were encoded with encode_nicks; otherwise nicks are
+    encoded just for this log.
+    """
+    spoken = logfile_df[logfile_df["msg_types"].isin(SPOKEN_MSG_TYPES)]
+    if nick_dictionary is not None:
+        nick_codes = spoken["nick_codes"].to_numpy()
+        code_count = len(nick_dictionary)
+        is_blacklisted = nick_dictionary.blacklisted(
+            np.arange(code_count), nick_blacklist,
+        )
+    else:
+        nick_codes, nicks = pd.factorize(spoken["nicks"])
+        code_count = len(nicks)
+        matcher = compile_blacklist(nick_blacklist)
+        is_blacklisted = np.fromiter(
+            (matcher.matches(nick) for nick in nicks), dtype=bool, count=code_count,
+        )
+    starts_run = np.ones(len(nick_codes), dtype=bool)
+    starts_run[1:] = nick_codes[1:] != nick_codes[:-1]
+    is_counted = nick_codes != MISSING_NICK
+    is_counted[is_counted] = ~is_blacklisted[nick_codes[is_counted]]
+    counted_codes = np.where(is_counted, nick_codes, MISSING_NICK)
+    timestamps = spoken["timestamps"].to_numpy(dtype="datetime64[ns]")
+    return timestamps, counted_codes, starts_run, code_count
+
+
+def rolling_channel_stats(
+    logfile_df: pd.DataFrame,
+    start_times: np.ndarray,
+    end_times: np.ndarray,
+    nick_blacklist: Set[str] = None,
+    nick_dictionary: NickDictionary = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get a log's message and nick counts within each window, like analyze_log.
+
+    start_times and end_times must both be in increasing order.
+    """
+    timestamps, codes, starts_run, code_count = counted_lines(
+        logfile_df, nick_blacklist or set(), nick_dictionary,
+    )
+    is_counted = codes != MISSING_NICK
+    # number of counted runs starting before each line
+    runs_before = np.concatenate(([0], np.cumsum(starts_run & is_counted)))
+    # each window holds lines[first:last]
+    firsts = timestamps.searchsorted(start_times, side="right")
+    lasts = timestamps.searchsorted(end_times, side="left")
+    msgs = runs_before[lasts] - runs_before[firsts]
+    # the first line of a window starts a run even if it doesn't in the whole log
+    first_lines = firsts[firsts < lasts]
+    continues_run = ~starts_run[first_lines] & is_counted[first_lines]
+    msgs[np.flatnonzero(firsts < lasts)[continues_run]] += 1
+
+    nick_counts = SlidingNickCounts(code_count)
+    nicks = np.zeros(len(end_times), dtype=np.int64)
+    added = evicted = 0
+    for sample, (first, last) in enumerate(zip(firsts, lasts)):
+        if last > added:
+            entering = codes[added:last]
+            nick_counts.add(entering[entering != MISSING_NICK])
+            added = last
+        if first > evicted:
+            leaving = codes[evicted:first]
+            nick_counts.evict(leaving[leaving != MISSING_NICK])
+            evicted = first
+        nicks[sample] = nick_counts.distinct
+    return msgs, nicks
+
+
+def rolling_stats(  # noqa: WPS211  # Found too many arguments
+    date_range: DateRange,
+    parsed_logs: ParsedLogs,
+    window: timedelta = timedelta(days=1),
+    step: timedelta = timedelta(minutes=5),
+    nick_blacklists: NickBlacklist = None,
+    nick_dictionary: NickDictionary = None,
+) -> pd.DataFrame:
+    """Gather the stats of each parsed log within a trailing window, every step.
+
+    Returns a DataFrame like that of aggregate_timeseries_data, indexed by
+    the start of each window, without topwords. nick_dictionary must be
+    given if the logs were parsed with one.
+    """
+    if nick_blacklists is None:
+        nick_blacklists = BOT_BLACKLISTS
+    start_times, end_times = sample_times(date_range, window, step)
+    frames: List[pd.DataFrame] = []
+    for name, logfile_df in parsed_logs.items():
+        msgs, nicks = rolling_channel_stats(
+            logfile_df,
+            start_times,
+            end_times,
+            network_blacklist(name, nick_blacklists),
+            nick_dictionary,
+        )
+        frames.append(
+            pd.DataFrame(
+                {
+                    "date_start": start_times,
+                    "name": name,
+                    "nicks": nicks,
+                    "msgs": msgs,
+                    "date_end": end_times,
+                },
+            ),
+        )
+    if not frames:
+        return pd.DataFrame(columns=["date_start", *ROLLING_COLUMNS]).set_index(
+            "date_start",
+        )
+    rolling_df = pd.concat(frames, ignore_index=True)
+    # like aggregate_timeseries_data: grouped by window, channels in log order
+    return rolling_df.sort_values("date_start", kind="stable").set_index("date_start")
+
+
+def aggregate_all_rolling_data(  # noqa: WPS211  # this is a wrapper function
+    date_range: DateRange,
+    window: timedelta = timedelta(days=1),
+    step: timedelta = timedelta(minutes=5),
+    channels_wanted: ChannelsWanted = None,
+    log_dir: str = None,
+    nick_blacklists: Mapping[str, Set[str]] = None,
+) -> pd.DataFrame:
+    """Parse the logs within date_range and gather rolling stats from them."""
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_multiple_logs(
+        log_paths(channels_wanted, log_dir, date_range),
+        date_range=date_range,
+        nick_dictionary=nick_dictionary,
+    )
+    return rolling_stats(
+        date_range, parsed_logs, window, step, nick_blacklists, nick_dictionary,
+    )
@@ -0,0 +1,310 @@
+"""Answer date range queries from per-bucket counts instead of raw lines.
+
+analyze_log filters every parsed line by timestamp on each query, so a
+time series of many intervals scans each log once per interval. A
+RollupStore instead counts the runs of consecutive messages that start
+within each bucket of time (a minute by default) per nick code, once per
+store. A query sums the buckets that fall entirely within its date range
+and only looks at the lines in the partial buckets at either edge.
+
+Rollups only live in memory: a store can be extended with new lines for
+as long as it's kept around, but every run of clogstats builds its own
+from the parsed logs.
+
+Within a date range, a spoken line starts a new run unless the spoken
+line before it is from the same nick (see first_of_runs). That's true
+of the log as a whole too, except for the first line in range: it always
+starts a run. So counting the runs that start within the range in the
+whole log, plus that one line, gives the same topwords as analyze_log.
+This relies on logs being in time order.
+"""
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Counter, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.gather_stats import (
+    BOT_BLACKLISTS,
+    ChannelsWanted,
+    IRCChannel,
+    NickBlacklist,
+    ParsedLogs,
+    ParseOptions,
+    channel_is_wanted,
+    first_of_runs,
+    ircchannel_from_topwords,
+    log_paths,
+    network_blacklist,
+    parse_multiple_logs,
+    sort_channels,
+    spoken_nicks,
+)
+from clogstats.stats.nicks import MISSING_NICK, NickDictionary
+from clogstats.stats.parse import DateRange
+
+DEFAULT_BUCKET_SIZE = timedelta(minutes=1)
+# the msg_types that get counted per bucket besides messages
+EVENT_TYPES = ("join", "quit")
+
+
+def _nanoseconds(timestamp: np.datetime64) -> int:
+    return int(np.datetime64(timestamp, "ns").astype(np.int64))
+
+
+@dataclass
+class ChannelRollup:
+    """The counts of one channel's log, per bucket of time.
+
+    Bucket number b covers [b * bucket_size, (b + 1) * bucket_size) since
+    the epoch. Every array is in time order. New lines are kept as
+    chunks until the next query, so extending a rollup costs O(new lines).
+    """
+
+    bucket_size: int  # in nanoseconds
+    # the last spoken nick code so far, to continue runs across extensions
+    previous_nick: Optional[int] = None
+    # spoken lines: timestamps (ns), nick codes and whether they start a run
+    spoken_times: np.ndarray = field(default_factory=lambda: np.empty(0, np.int64))
+    spoken_codes: np.ndarray = field(default_factory=lambda: np.empty(0, np.int32))
+    starts_run: np.ndarray = field(default_factory=lambda: np.empty(0, bool))
+    # runs started per (bucket, nick code), sorted by bucket. A pair can
+    # show up more than once if a bucket spans two extensions.
+    run_buckets: np.ndarray = field(default_factory=lambda: np.empty(0, np.int64))
+    run_nicks: np.ndarray = field(default_factory=lambda: np.empty(0, np.int32))
+    run_counts: np.ndarray = field(default_factory=lambda: np.empty(0, np.int64))
+    # timestamps (ns) of each of the EVENT_TYPES
+    event_times: Dict[str, np.ndarray] = field(default_factory=dict)
+    _pending: List[pd.DataFrame] = field(default_factory=list)
+
+    def extend(self, logfile_df: pd.DataFrame) -> None:
+        """Add lines appended to the log, encoded with encode_nicks."""
+        self._pending.append(logfile_df)
+
+    def spoken(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the timestamps, nick codes and run starts of every spoken line."""
+        self._consolidate()
+        return self.spoken_times, self.spoken_codes, self.starts_run
+
+    def run_counts_between(
+        self, first_bucket: int, end_bucket: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the nick codes and counts of the runs started in a range of buckets."""
+        self._consolidate()
+        start, end = np.searchsorted(self.run_buckets, (first_bucket, end_bucket))
+        return self.run_nicks[start:end], self.run_counts[start:end]
+
+    def count_events(self, msg_type: str, date_range: DateRange) -> int:
+        """Count the lines of one of the EVENT_TYPES within date_range."""
+        self._consolidate()
+        event_times = self.event_times.get(msg_type, np.empty(0, np.int64))
+        # lines at exactly start_time or end_time aren't in range
+        start = np.searchsorted(
+            event_times, _nanoseconds(date_range.start_time), side="right",
+        )
+        end = np.searchsorted(event_times, _nanoseconds(date_range.end_time))
+        return max(int(end - start), 0)
+
+    def _consolidate(self) -> None:
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        for logfile_df in pending:
+            self._add_events(logfile_df)
+        spoken = pd.concat(
+            [
+                logfile_df.loc[spoken_nicks(logfile_df, "nick_codes").index]
+                for logfile_df in pending
+            ],
+        )
+        nick_codes = spoken["nick_codes"].reset_index(drop=True)
+        if nick_codes.empty:
+            return
+        is_run_start = np.zeros(len(nick_codes), dtype=bool)
+        is_run_start[first_of_runs(nick_codes, self.previous_nick).index] = True
+        self.previous_nick = int(nick_codes.iloc[-1])
+        times = spoken["timestamps"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        codes = nick_codes.to_numpy(dtype=np.int32)
+        self._add_runs(times[is_run_start] // self.bucket_size, codes[is_run_start])
+        self.spoken_times = np.concatenate((self.spoken_times, times))
+        self.spoken_codes = np.concatenate((self.spoken_codes, codes))
+        self.starts_run = np.concatenate((self.starts_run, is_run_start))
+
+    def _add_runs(self, buckets: np.ndarray, nick_codes: np.ndarray) -> None:
+        # one group-by over (bucket, nick) pairs
+        pairs, counts = np.unique(
+            np.stack((buckets, nick_codes.astype(np.int64))),
+            axis=1,
+            return_counts=True,
+        )
+        self.run_buckets = np.concatenate((self.run_buckets, pairs[0]))
+        self.run_nicks = np.concatenate(
+            (self.run_nicks, pairs[1].astype(np.int32)),
+        )
+        self.run_counts = np.concatenate((self.run_counts, counts))
+
+    def _add_events(self, logfile_df: pd.DataFrame) -> None:
+        for msg_type in EVENT_TYPES:
+            times = logfile_df.loc[logfile_df["msg_types"] == msg_type, "timestamps"]
+            self.event_times[msg_type] = np.concatenate(
+                (
+                    self.event_times.get(msg_type, np.empty(0, np.int64)),
+                    times.to_numpy(dtype="datetime64[ns]").astype(np.int64),
+                ),
+            )
+
+
+class RollupStore:
+    """Per-bucket counts of every channel, sharing one NickDictionary."""
+
+    def __init__(
+        self,
+        nick_dictionary: NickDictionary,
+        bucket_size: timedelta = DEFAULT_BUCKET_SIZE,
+    ) -> None:
+        """Create an empty store; fill it with extend()."""
+        self.nick_dictionary = nick_dictionary
+        self.bucket_size = int(pd.Timedelta(bucket_size).value)
+        self.channels: Dict[str, ChannelRollup] = {}
+
+    @classmethod
+    def from_parsed_logs(
+        cls,
+        parsed_logs: ParsedLogs,
+        nick_dictionary: NickDictionary,
+        bucket_size: timedelta = DEFAULT_BUCKET_SIZE,
+    ) -> "RollupStore":
+        """Build a store from logs parsed with nick_dictionary."""
+        store = cls(nick_dictionary, bucket_size)
+        for name, logfile_df in parsed_logs.items():
+            store.extend(name, logfile_df)
+        return store
+
+    def extend(self, name: str, logfile_df: pd.DataFrame) -> None:
+        """Add lines appended to a channel's log, encoded with encode_nicks."""
+        if name not in self.channels:
+            self.channels[name] = ChannelRollup(self.bucket_size)
+        self.channels[name].extend(logfile_df)
+
+    def topwords(
+        self, name: str, date_range: DateRange, nick_blacklist: Set[str] = None,
+    ) -> Counter[str]:
+        """Count the runs per nick in a channel, like analyze_log does."""
+        channel = self.channels[name]
+        bucket_size = self.bucket_size
+        start_time = _nanoseconds(date_range.start_time)
+        end_time = _nanoseconds(date_range.end_time)
+        # whole buckets strictly after start_time and ending by end_time
+        first_bucket = start_time // bucket_size + 1
+        end_bucket = max(end_time // bucket_size, first_bucket)
+        nick_codes, counts = channel.run_counts_between(first_bucket, end_bucket)
+        middle_start = min(first_bucket * bucket_size, end_time)
+        middle_end = max(min(end_bucket * bucket_size, end_time), middle_start)
+
+        # lines in the partial buckets at each edge
+        spoken_times, spoken_codes, starts_run = channel.spoken()
+        # lines at exactly start_time aren't in range
+        first_line = np.searchsorted(spoken_times, start_time, side="right")
+        head_end, tail_start, tail_end = np.searchsorted(
+            spoken_times, (middle_start, middle_end, end_time),
+        )
+        edge_lines = np.r_[first_line:head_end, tail_start:tail_end]
+        edge_lines = edge_lines[starts_run[edge_lines]]
+        all_codes = np.concatenate((nick_codes, spoken_codes[edge_lines]))
+        all_counts = np.concatenate((counts, np.ones(len(edge_lines), np.int64)))
+        # the first line in range starts a run even if it continues one
+        if first_line < tail_end and not starts_run[first_line]:
+            all_codes = np.append(all_codes, spoken_codes[first_line])
+            all_counts = np.append(all_counts, 1)
+        return self._decode_counts(all_codes, all_counts, nick_blacklist)
+
+    def select(self, channels_wanted: ChannelsWanted = None) -> "RollupStore":
+        """Get a view of the store with just the wanted channels."""
+        selected = RollupStore(self.nick_dictionary)
+        selected.bucket_size = self.bucket_size
+        selected.channels = {
+            name: channel
+            for name, channel in self.channels.items()
+            if channel_is_wanted(name, channels_wanted)
+        }
+        return selected
+
+    def count_events(self, name: str, msg_type: str, date_range: DateRange) -> int:
+        """Count the joins or quits in a channel within date_range."""
+        return self.channels[name].count_events(msg_type, date_range)
+
+    def analyze(
+        self,
+        date_range: DateRange,
+        nick_blacklists: NickBlacklist = None,
+        sortkey: str = "msgs",
+    ) -> List[IRCChannel]:
+        """Gather stats on every channel in the store, like analyze_multiple_logs."""
+        (channels,) = self.analyze_intervals([date_range], nick_blacklists)
+        return sort_channels(channels, sortkey)
+
+    def analyze_intervals(
+        self,
+        date_ranges: Sequence[DateRange],
+        nick_blacklists: NickBlacklist = None,
+    ) -> List[List[IRCChannel]]:
+        """Gather stats on every channel within each date range.
+
+        Like clogstats.stats.gather_stats.analyze_intervals, but each
+        query only sums buckets.
+        """
+        if nick_blacklists is None:
+            nick_blacklists = BOT_BLACKLISTS
+        nick_blacklist_of = {
+            name: network_blacklist(name, nick_blacklists) for name in self.channels
+        }
+        return [
+            [
+                ircchannel_from_topwords(
+                    name, self.topwords(name, date_range, nick_blacklist_of[name]),
+                )
+                for name in self.channels
+            ]
+            for date_range in date_ranges
+        ]
+
+    def _decode_counts(
+        self,
+        nick_codes: np.ndarray,
+        counts: np.ndarray,
+        nick_blacklist: Optional[Set[str]],
+    ) -> Counter[str]:
+        codes, inverse = np.unique(nick_codes, return_inverse=True)
+        totals = np.bincount(inverse, weights=counts, minlength=len(codes))
+        is_counted = codes != MISSING_NICK
+        if nick_blacklist:
+            is_counted[is_counted] = ~self.nick_dictionary.blacklisted(
+                codes[is_counted], nick_blacklist,
+            )
+        return Counter(
+            dict(
+                zip(
+                    self.nick_dictionary.decode(codes[is_counted]),
+                    totals[is_counted].astype(int).tolist(),
+                ),
+            ),
+        )
+
+
+def build_rollups(
+    channels_wanted: ChannelsWanted = None,
+    log_dir: str = None,
+    parse_options: ParseOptions = None,
+    bucket_size: timedelta = DEFAULT_BUCKET_SIZE,
+) -> RollupStore:
+    """Parse every wanted log and roll it up into a new RollupStore."""
+    nick_dictionary = NickDictionary()
+    parsed_logs: Mapping[str, pd.DataFrame] = parse_multiple_logs(
+        log_paths(channels_wanted, log_dir),
+        parse_options=parse_options,
+        nick_dictionary=nick_dictionary,
+    )
+    return RollupStore.from_parsed_logs(parsed_logs, nick_dictionary, bucket_size)
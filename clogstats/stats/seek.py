@@ -0,0 +1,81 @@
+"""Find where a point in time begins inside a WeeChat log without reading all of it.
+
+WeeChat appends lines to its logs in time order, so the byte offset of
+the first line after a given time can be found with a binary search
+over the file instead of a linear scan.
+"""
+
+import mmap
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+# every line starts with a timestamp formatted like "2020-07-05 10:10:39"
+TIMESTAMP_LENGTH = len("YYYY-MM-DD HH:MM:SS")
+# lines can be slightly out of order (e.g. after the system clock gets adjusted).
+# seeking to this much earlier than the requested time catches those lines.
+MAX_CLOCK_SKEW = np.timedelta64(1, "h")
+# how many lines to look through for a valid timestamp before giving up
+MAX_RESYNC_LINES = 64
+
+
+def next_line_start(buffer: mmap.mmap, offset: int) -> int:
+    """Find the start of the first line beginning at or after offset."""
+    if offset == 0:
+        return 0
+    newline = buffer.find(b"\n", offset - 1)
+    if newline == -1:
+        return len(buffer)
+    return newline + 1
+
+
+def line_timestamp(buffer: mmap.mmap, offset: int) -> Optional[np.datetime64]:
+    """Parse the timestamp of the line starting at offset, if it has one."""
+    raw_timestamp = buffer[offset : offset + TIMESTAMP_LENGTH]
+    try:
+        return np.datetime64(raw_timestamp.decode().replace(" ", "T", 1))
+    except ValueError:  # also covers UnicodeDecodeError
+        return None
+
+
+def first_timestamp_after(buffer: mmap.mmap, offset: int) -> Optional[np.datetime64]:
+    """Get the first valid timestamp among the lines after offset.
+
+    Lines without a timestamp (e.g. garbage from a crash) are skipped,
+    but only up to MAX_RESYNC_LINES of them.
+    """
+    line_start = next_line_start(buffer, offset)
+    for _ in range(MAX_RESYNC_LINES):
+        if line_start >= len(buffer):
+            break
+        timestamp = line_timestamp(buffer, line_start)
+        if timestamp is not None:
+            return timestamp
+        line_start = next_line_start(buffer, line_start + 1)
+    return None
+
+
+def seek_offset(logfile: BinaryIO, start_time: np.datetime64) -> int:
+    """Byte offset of the first line of a log logged after start_time.
+
+    Bisects on byte offsets, resyncing to the next newline at each probe.
+    Probes that can't find a timestamp are treated as being after
+    start_time, and the search targets MAX_CLOCK_SKEW before start_time.
+    Both keep the search on the safe side: the returned offset may begin
+    a little early, but never after a line that's in range. Callers
+    still need to filter the lines they read by time.
+    """
+    logfile.seek(0, 2)
+    if logfile.tell() == 0:  # can't mmap an empty file
+        return 0
+    target = np.datetime64(start_time) - MAX_CLOCK_SKEW
+    with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        low, high = 0, len(buffer)
+        while low < high:
+            middle = (low + high) // 2
+            timestamp = first_timestamp_after(buffer, middle)
+            if timestamp is None or timestamp >= target:
+                high = middle
+            else:
+                low = middle + 1
+        return next_line_start(buffer, low)
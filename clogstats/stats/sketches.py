@@ -0,0 +1,194 @@
+"""Approximate channel stats in memory that doesn't grow with the number of nicks.
+
+An exact IRCChannel keeps a counter entry for every nick that ever spoke.
+A ChannelSketch instead estimates the number of distinct nicks with a
+HyperLogLog and keeps only the most active nicks with Space-Saving. Both
+have a fixed size set by the error bound, and sketches of different
+chunks, logs or time intervals can be merged into one.
+"""
+
+import hashlib
+import heapq
+import math
+from dataclasses import dataclass, field
+from typing import Counter, Dict, List, Mapping, NamedTuple, Tuple
+
+import numpy as np
+
+# smallest and largest supported HyperLogLog precisions (log2 of #registers)
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+HASH_BITS = 64
+# SpaceSaving's heap is rebuilt once it holds this many entries per counter
+STALE_HEAP_FACTOR = 4
+
+
+class Approximation(NamedTuple):
+    """Settings for approximate stats."""
+
+    # relative standard error of the nick count, and the largest error of a
+    # nick's message count as a fraction of the channel's messages
+    error: float = 0.01
+
+    @property
+    def precision(self) -> int:
+        """The HyperLogLog precision giving a standard error of at most error."""
+        registers = (1.04 / self.error) ** 2
+        return min(max(math.ceil(math.log2(registers)), MIN_PRECISION), MAX_PRECISION)
+
+    @property
+    def capacity(self) -> int:
+        """How many nicks Space-Saving needs to keep to stay within error."""
+        return math.ceil(1 / self.error)
+
+
+def nick_hash(nick: str) -> int:
+    """Hash a nick to a 64-bit integer that's the same in every process."""
+    digest = hashlib.blake2b(nick.encode(), digest_size=HASH_BITS // 8).digest()
+    return int.from_bytes(digest, "big")
+
+
+@dataclass
+class HyperLogLog:
+    """An estimate of the number of distinct nicks added to it."""
+
+    precision: int
+    registers: np.ndarray = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Start with every register at zero."""
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def add(self, nick: str) -> None:
+        """Add a nick; adding it again changes nothing."""
+        hashed = nick_hash(nick)
+        register = hashed >> (HASH_BITS - self.precision)
+        remaining_bits = HASH_BITS - self.precision
+        remaining = hashed & ((1 << remaining_bits) - 1)
+        # position of the leftmost 1 among the remaining bits
+        rank = remaining_bits - remaining.bit_length() + 1
+        self.registers[register] = max(self.registers[register], rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Add every nick that was added to other."""
+        if other.precision != self.precision:
+            raise ValueError("can't merge HyperLogLogs of different precisions")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """Estimate the number of distinct nicks added."""
+        register_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        raw_estimate = (
+            alpha
+            * register_count ** 2
+            / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        )
+        empty_registers = int(np.count_nonzero(self.registers == 0))
+        if raw_estimate <= 2.5 * register_count and empty_registers:
+            # linear counting is more accurate for small cardinalities
+            return round(register_count * math.log(register_count / empty_registers))
+        return round(raw_estimate)
+
+
+@dataclass
+class SpaceSaving:
+    """The approximate message counts of the most active nicks.
+
+    Keeps at most capacity nicks. A nick's count can be overestimated by
+    at most (messages added) / capacity, and every nick with more
+    messages than that is kept.
+    """
+
+    capacity: int
+    counts: Dict[str, int] = field(default_factory=dict)
+    # a min-heap of (count, nick) to find the least active nick quickly.
+    # Entries go stale when a nick's count changes; see _least_active.
+    _heap: List[Tuple[int, str]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        """Index the initial counts."""
+        self._rebuild_heap()
+
+    def add(self, nick: str, count: int = 1) -> None:
+        """Add count messages from a nick."""
+        if nick in self.counts or len(self.counts) < self.capacity:
+            self.counts[nick] = self.counts.get(nick, 0) + count
+        else:
+            # replace the least active nick, inheriting its count as error
+            self.counts[nick] = self.counts.pop(self._least_active()) + count
+        heapq.heappush(self._heap, (self.counts[nick], nick))
+        if len(self._heap) > STALE_HEAP_FACTOR * max(self.capacity, 1):
+            self._rebuild_heap()
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Add the counts of other, keeping the capacity most active nicks.
+
+        A nick missing from a full summary may still have had up to its
+        smallest count, so it's counted as having that many; this keeps
+        the error bound of the merged summary.
+        """
+        own_floor = self._floor()
+        other_floor = other._floor()  # noqa: WPS437  # same class
+        merged = Counter(
+            {
+                nick: self.counts.get(nick, own_floor)
+                + other.counts.get(nick, other_floor)
+                for nick in self.counts.keys() | other.counts.keys()
+            },
+        )
+        self.counts = dict(merged.most_common(self.capacity))
+        self._rebuild_heap()
+
+    def top(self, number: int = None) -> Counter[str]:
+        """Get the estimated counts of the most active nicks."""
+        return Counter(dict(Counter(self.counts).most_common(number)))
+
+    def _floor(self) -> int:
+        """Get the most messages a nick that isn't kept could have had."""
+        if len(self.counts) < self.capacity:
+            return 0  # nothing was evicted yet, so the counts are exact
+        return min(self.counts.values())
+
+    def _least_active(self) -> str:
+        """Get the nick with the lowest count, dropping stale heap entries."""
+        while True:
+            if not self._heap:
+                self._rebuild_heap()
+            count, nick = self._heap[0]
+            if self.counts.get(nick) == count:
+                return nick
+            heapq.heappop(self._heap)
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, nick) for nick, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+@dataclass
+class ChannelSketch:
+    """Mergeable approximate stats of a channel, with bounded memory."""
+
+    name: str
+    approximation: Approximation = Approximation()
+    msgs: int = 0
+    nicks: HyperLogLog = field(init=False)
+    topwords: SpaceSaving = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Size the sketches according to approximation."""
+        self.nicks = HyperLogLog(self.approximation.precision)
+        self.topwords = SpaceSaving(self.approximation.capacity)
+
+    def update(self, topwords: Mapping[str, int]) -> None:
+        """Add exact per-nick message counts, e.g. from one chunk of a log."""
+        for nick, count in topwords.items():
+            self.nicks.add(nick)
+            self.topwords.add(nick, count)
+            self.msgs += count
+
+    def merge(self, other: "ChannelSketch") -> None:
+        """Add the stats of other, e.g. from another log or time interval."""
+        self.nicks.merge(other.nicks)
+        self.topwords.merge(other.topwords)
+        self.msgs += other.msgs
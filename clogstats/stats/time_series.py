@@ -3,25 +3,51 @@
 Collecting stats across discrete many small time intervals allows for
 the creation of simple time-series data.
 
+Rather than analyzing each log once per interval, every spoken line is
+assigned to its interval with a binary search over the intervals' edges,
+and the runs of every (channel, interval, nick) are counted at once. The
+cost grows with the number of lines, not lines times intervals.
+
 For more advanced time-series manipulation and analysis, see
 clogstats.forecasting.
 """
 
 from dataclasses import asdict, dataclass
-from typing import Any, Dict, Iterator, List, Mapping, Optional, Set
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import numpy as np
 import pandas as pd
 
 from clogstats.stats.gather_stats import (
+    BOT_BLACKLISTS,
+    SPOKEN_MSG_TYPES,
     ChannelsWanted,
-    DateRange,
     IRCChannel,
     NickBlacklist,
     ParsedLogs,
-    analyze_multiple_logs,
-    parse_all_logs,
+    log_paths,
+    network_blacklist,
+    parse_multiple_logs,
+    sort_channels,
 )
+from clogstats.stats.nick_matrix import NickMatrix
+from clogstats.stats.nicks import MISSING_NICK, NickDictionary
+from clogstats.stats.parse import DateRange
+from clogstats.stats.rollups import RollupStore
+
+# columns of time-series data, besides the date_start index
+TIMESERIES_COLUMNS = ("name", "topwords", "nicks", "msgs", "date_end")
 
 
 def ircchannel_to_dict(ircchannel: IRCChannel) -> Dict[str, Any]:
@@ -48,6 +74,153 @@ def data_to_dataframe(
     return dataframe_stats.set_index("date_start")
 
 
+def timeseries_frame(
+    date_ranges: Iterable[DateRange],
+    gathered_intervals: Iterable[List[IRCChannel]],
+    sortkey: str = "msgs",
+) -> pd.DataFrame:
+    """Build time-series data from the stats of each interval, in a single frame.
+
+    Gives the same result as concatenating data_to_dataframe of each
+    interval, without building a DataFrame per interval.
+    """
+    records = [
+        dict(
+            ircchannel_to_dict(channel),
+            date_start=date_range.start_time,
+            date_end=date_range.end_time,
+        )
+        for date_range, channels in zip(date_ranges, gathered_intervals)
+        for channel in sort_channels(channels, sortkey)
+    ]
+    return pd.DataFrame(
+        records, columns=["date_start", *TIMESERIES_COLUMNS],
+    ).set_index("date_start")
+
+
+def interval_edges(date_ranges: Sequence[DateRange]) -> np.ndarray:
+    """Get the edges of consecutive date ranges, like those of divide_date_range."""
+    start_times = [date_range.start_time for date_range in date_ranges]
+    end_times = [date_range.end_time for date_range in date_ranges]
+    if start_times[1:] != end_times[:-1]:
+        raise ValueError("date ranges must be consecutive")
+    return np.array(start_times + end_times[-1:], dtype="datetime64[ns]")
+
+
+def assign_intervals(timestamps: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Get the interval each timestamp falls within, or -1 if there's none.
+
+    Like in_date_range, timestamps on an edge aren't within any interval.
+    """
+    positions = edges.searchsorted(timestamps)
+    on_edge = edges.take(positions, mode="clip") == timestamps
+    intervals = positions - 1
+    intervals[on_edge | (positions == 0) | (positions == len(edges))] = -1
+    return intervals
+
+
+def run_starts(
+    intervals: np.ndarray, nick_codes: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the interval and nick code of each run of consecutive messages.
+
+    Like first_of_runs on each interval's lines, so a run spanning two
+    intervals counts in both.
+    """
+    is_within = intervals >= 0
+    intervals = intervals[is_within]
+    nick_codes = nick_codes[is_within]
+    # group lines by interval, keeping their order within each interval
+    order = np.argsort(intervals, kind="stable")
+    intervals = intervals[order]
+    nick_codes = nick_codes[order]
+    is_new_run = np.ones(len(intervals), dtype=bool)
+    is_new_run[1:] = (intervals[1:] != intervals[:-1]) | (
+        nick_codes[1:] != nick_codes[:-1]
+    )
+    return intervals[is_new_run], nick_codes[is_new_run]
+
+
+def bucket_matrix(
+    date_ranges: Sequence[DateRange],
+    parsed_logs: ParsedLogs,
+    nick_blacklists: NickBlacklist = None,
+    nick_dictionary: NickDictionary = None,
+) -> NickMatrix:
+    """Count the runs of each nick in multiple parsed logs within each date range.
+
+    Every log is bucketed in one pass; date_ranges must be consecutive.
+    nick_dictionary must be given if the logs were parsed with one.
+    """
+    if nick_blacklists is None:
+        nick_blacklists = BOT_BLACKLISTS
+    if nick_dictionary is None:
+        nick_dictionary = NickDictionary()
+    edges = interval_edges(date_ranges)
+    interval_count = len(date_ranges)
+    names = list(parsed_logs)
+    # the (channel, interval) row and nick code of every run in every log
+    run_rows: List[np.ndarray] = [np.empty(0, np.int64)]
+    run_codes: List[np.ndarray] = [np.empty(0, np.int32)]
+    for channel, logfile_df in enumerate(parsed_logs.values()):
+        spoken = logfile_df[logfile_df["msg_types"].isin(SPOKEN_MSG_TYPES)]
+        if "nick_codes" in spoken:
+            nick_codes = spoken["nick_codes"].to_numpy()
+        else:
+            nick_codes = nick_dictionary.encode(spoken["nicks"])
+        intervals, codes = run_starts(
+            assign_intervals(spoken["timestamps"].to_numpy(), edges), nick_codes,
+        )
+        run_rows.append(channel * interval_count + intervals)
+        run_codes.append(codes)
+    # one group-by over (channel, interval, nick), as a single int64 key
+    code_count = len(nick_dictionary) + 1
+    keys, counts = np.unique(
+        np.concatenate(run_rows) * code_count
+        + np.concatenate(run_codes)
+        - MISSING_NICK,
+        return_counts=True,
+    )
+    rows, codes = np.divmod(keys, code_count)
+    codes += MISSING_NICK
+    is_counted = codes != MISSING_NICK
+    # keys are sorted, so each channel's runs are contiguous
+    channel_bounds = np.searchsorted(rows, np.arange(len(names) + 1) * interval_count)
+    for channel, name in enumerate(names):
+        nick_blacklist = network_blacklist(name, nick_blacklists)
+        if not nick_blacklist:
+            continue
+        channel_runs = slice(channel_bounds[channel], channel_bounds[channel + 1])
+        is_nick = is_counted[channel_runs]
+        is_nick[is_nick] = ~nick_dictionary.blacklisted(
+            codes[channel_runs][is_nick], nick_blacklist,
+        )
+    return NickMatrix.from_sorted_runs(
+        names,
+        date_ranges,
+        nick_dictionary,
+        rows[is_counted],
+        codes[is_counted],
+        counts[is_counted],
+    )
+
+
+def bucket_intervals(
+    date_ranges: Sequence[DateRange],
+    parsed_logs: ParsedLogs,
+    nick_blacklists: NickBlacklist = None,
+    nick_dictionary: NickDictionary = None,
+) -> List[List[IRCChannel]]:
+    """Gather stats on multiple parsed logs within each date range, in one pass.
+
+    Returns the same as clogstats.stats.gather_stats.analyze_intervals,
+    but date_ranges must be consecutive; see bucket_matrix.
+    """
+    return bucket_matrix(
+        date_ranges, parsed_logs, nick_blacklists, nick_dictionary,
+    ).channels()
+
+
 @dataclass
 class AnalyzeMultipleLogsArgs:
     """Arguments to pass to AnalyzeAllLogs, excluding date_range."""
@@ -55,6 +228,10 @@ class AnalyzeMultipleLogsArgs:
     parsed_logs: ParsedLogs
     sortkey: str = "msgs"
     nick_blacklists: Optional[NickBlacklist] = None
+    # must be given if parsed_logs were parsed with a NickDictionary
+    nick_dictionary: Optional[NickDictionary] = None
+    # if given, intervals are summed from these instead of parsed_logs
+    rollups: Optional[RollupStore] = None
 
 
 def divide_date_range(date_range: DateRange, intervals: int) -> List[DateRange]:
@@ -66,18 +243,48 @@ def divide_date_range(date_range: DateRange, intervals: int) -> List[DateRange]:
     return [DateRange(*interval) for interval in date_pairs]
 
 
+def analyze_across_intervals(
+    analyze_all_logs_args: AnalyzeMultipleLogsArgs, date_ranges: Sequence[DateRange],
+) -> Iterator[List[IRCChannel]]:
+    """Gather the stats of each channel within each of consecutive date ranges.
+
+    Sums rollups if there are any, and buckets parsed_logs otherwise; see
+    bucket_matrix. Bucketed stats are decoded one interval at a time, as
+    they get consumed.
+    """
+    if analyze_all_logs_args.rollups is not None:
+        yield from analyze_all_logs_args.rollups.analyze_intervals(
+            date_ranges, analyze_all_logs_args.nick_blacklists,
+        )
+        return
+    nick_matrix = bucket_matrix(
+        date_ranges,
+        analyze_all_logs_args.parsed_logs,
+        analyze_all_logs_args.nick_blacklists,
+        analyze_all_logs_args.nick_dictionary,
+    )
+    for interval in range(len(date_ranges)):
+        yield nick_matrix.interval_channels(interval)
+
+
 def rerun_analysis_across_intervals(
     analyze_all_logs_args: AnalyzeMultipleLogsArgs,
     date_range: DateRange,
     intervals: int = 0,
 ) -> Iterator[pd.DataFrame]:
-    """Lazily re-run analyze_all_logs across multiple time intervals."""
+    """Re-run analyze_all_logs across multiple time intervals.
+
+    Lines get bucketed into every interval at once, but each interval's
+    topwords and DataFrame are only built when it's reached, so the
+    DataFrames can be written out without holding all of them.
+    """
     date_ranges = divide_date_range(date_range, intervals)
-    for small_date_range in date_ranges:
-        gathered_stats = analyze_multiple_logs(
-            date_range=small_date_range, **asdict(analyze_all_logs_args),
+    gathered_intervals = analyze_across_intervals(analyze_all_logs_args, date_ranges)
+    for small_date_range, gathered_stats in zip(date_ranges, gathered_intervals):
+        yield data_to_dataframe(
+            sort_channels(gathered_stats, analyze_all_logs_args.sortkey),
+            small_date_range,
         )
-        yield data_to_dataframe(gathered_stats, small_date_range)
 
 
 def aggregate_timeseries_data(
@@ -90,26 +297,77 @@ def aggregate_timeseries_data(
     Collect the output in a DataFrame with a leading column for the date
     range for each run.
     """
-    return pd.concat(
-        rerun_analysis_across_intervals(analyze_all_logs_args, date_range, intervals),
+    date_ranges = divide_date_range(date_range, intervals)
+    return timeseries_frame(
+        date_ranges,
+        analyze_across_intervals(analyze_all_logs_args, date_ranges),
+        analyze_all_logs_args.sortkey,
     )
 
 
-def aggregate_all_timeseries_data(  # this is a wrapper function
+def aggregate_all_timeseries_data(  # noqa: WPS211  # this is a wrapper function
     date_range: DateRange,
     channels_wanted: ChannelsWanted = None,
     log_dir: str = None,
     nick_blacklists: Mapping[str, Set[str]] = None,
     sortkey: str = "msgs",
     intervals: int = 0,
+    rollups: RollupStore = None,
 ) -> pd.DataFrame:
-    """Wrap functions to parse logfiles and generate timeseries data from them."""
-    parsed_logs = parse_all_logs(channels_wanted=channels_wanted, log_dir=log_dir)
+    """Wrap functions to parse logfiles and generate timeseries data from them.
+
+    If rollups are given, no logs get parsed; see clogstats.stats.rollups.
+    """
+    if rollups is not None:
+        analyze_multiple_logs_args = AnalyzeMultipleLogsArgs(
+            parsed_logs={},
+            sortkey=sortkey,
+            nick_blacklists=nick_blacklists,
+            rollups=rollups.select(channels_wanted),
+        )
+        return aggregate_timeseries_data(
+            date_range=date_range,
+            analyze_all_logs_args=analyze_multiple_logs_args,
+            intervals=intervals,
+        )
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_multiple_logs(
+        log_paths(channels_wanted, log_dir, date_range),
+        nick_dictionary=nick_dictionary,
+    )
     analyze_multiple_logs_args = AnalyzeMultipleLogsArgs(
-        parsed_logs=parsed_logs, sortkey=sortkey, nick_blacklists=nick_blacklists,
+        parsed_logs=parsed_logs,
+        sortkey=sortkey,
+        nick_blacklists=nick_blacklists,
+        nick_dictionary=nick_dictionary,
     )
     return aggregate_timeseries_data(
         date_range=date_range,
         analyze_all_logs_args=analyze_multiple_logs_args,
         intervals=intervals,
     )
+
+
+def aggregate_all_timeseries_matrix(
+    date_range: DateRange,
+    channels_wanted: ChannelsWanted = None,
+    log_dir: str = None,
+    nick_blacklists: Mapping[str, Set[str]] = None,
+    intervals: int = 0,
+) -> NickMatrix:
+    """Like aggregate_all_timeseries_data, but return a sparse NickMatrix.
+
+    Use NickMatrix.to_frame() for the nicks and msgs of each row, and
+    NickMatrix.to_timeseries() for a darts TimeSeries of a channel.
+    """
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_multiple_logs(
+        log_paths(channels_wanted, log_dir, date_range),
+        nick_dictionary=nick_dictionary,
+    )
+    return bucket_matrix(
+        divide_date_range(date_range, intervals),
+        parsed_logs,
+        nick_blacklists,
+        nick_dictionary,
+    )
@@ -0,0 +1,338 @@
+"""Stream time-series data to partitioned files, and read slices of it back lazily.
+
+aggregate_timeseries_data returns every interval in one DataFrame, so
+long date ranges split into many short intervals need all of their
+topwords in memory at once. A TimeseriesWriter instead takes one interval
+at a time, e.g. from rerun_analysis_across_intervals, and appends its rows
+to the file of the partition of time they fall in (a day by default).
+
+Partitions are JSON Lines files, flushed after every interval, or Parquet
+files when pyarrow is installed. Parquet files can't be appended to, so
+a Parquet partition is buffered until the writer moves past it. Either
+way, rows must be written in time order.
+
+A manifest in the same directory records the partition length and file
+format. PartitionedTimeseries only opens the partitions that overlap the
+requested slice of time.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import (
+    Any,
+    Counter,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.gather_stats import ChannelsWanted, log_paths, parse_multiple_logs
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DateRange
+from clogstats.stats.time_series import (
+    TIMESERIES_COLUMNS,
+    AnalyzeMultipleLogsArgs,
+    rerun_analysis_across_intervals,
+)
+
+try:
+    import pyarrow  # type: ignore # noqa: F401
+except ImportError:  # optional; partitions are written as JSON Lines instead
+    pyarrow = None  # noqa: WPS440
+
+# bumped whenever the manifest or partition files change in an incompatible way
+PARTITIONS_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+# the file suffix of each partition format
+PARTITION_SUFFIXES = {"jsonl": ".jsonl", "parquet": ".parquet"}
+
+# partition file names are the start of their partition in this format
+PARTITION_NAME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def default_format() -> str:
+    """Get the best partition format available: Parquet if pyarrow is installed."""
+    return "jsonl" if pyarrow is None else "parquet"
+
+
+def check_format(file_format: str) -> None:
+    """Fail early if file_format can't be written or read."""
+    if file_format not in PARTITION_SUFFIXES:
+        raise ValueError(f"unknown partition format {file_format!r}")
+    if file_format == "parquet" and pyarrow is None:
+        raise ImportError("Parquet partitions require pyarrow")
+
+
+def partition_path(
+    directory: Path, partition_start: pd.Timestamp, file_format: str,
+) -> Path:
+    """Get the file holding the partition that starts at partition_start."""
+    file_name = partition_start.strftime(PARTITION_NAME_FORMAT)
+    return directory / f"{file_name}{PARTITION_SUFFIXES[file_format]}"
+
+
+def timeseries_records(timeseries: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+    """Convert rows of time-series data to something json.dump can handle."""
+    for date_start, row in zip(
+        timeseries.index, timeseries.itertuples(index=False),
+    ):
+        yield {
+            "date_start": pd.Timestamp(date_start).isoformat(),
+            "name": row.name,
+            "topwords": {nick: int(count) for nick, count in row.topwords.items()},
+            "nicks": int(row.nicks),
+            "msgs": int(row.msgs),
+            "date_end": pd.Timestamp(row.date_end).isoformat(),
+        }
+
+
+def records_to_timeseries(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Convert the output of timeseries_records back to time-series data."""
+    timeseries = pd.DataFrame(records, columns=["date_start", *TIMESERIES_COLUMNS])
+    timeseries["date_start"] = pd.to_datetime(timeseries["date_start"])
+    timeseries["date_end"] = pd.to_datetime(timeseries["date_end"])
+    timeseries["topwords"] = timeseries["topwords"].map(Counter)
+    return timeseries.astype({"nicks": np.int64, "msgs": np.int64}).set_index(
+        "date_start",
+    )
+
+
+def write_partition(records: List[Dict[str, Any]], path: Path) -> None:
+    """Write a whole partition to a Parquet file, with topwords as JSON."""
+    for record in records:
+        record["topwords"] = json.dumps(record["topwords"])
+    pd.DataFrame(records, columns=["date_start", *TIMESERIES_COLUMNS]).to_parquet(
+        path, index=False,
+    )
+
+
+def read_partition(path: Path, file_format: str) -> pd.DataFrame:
+    """Read a partition file back to time-series data."""
+    if file_format == "parquet":
+        records = pd.read_parquet(path).to_dict("records")
+        for record in records:
+            record["topwords"] = json.loads(record["topwords"])
+    else:
+        with open(path) as partition_file:
+            records = [json.loads(line) for line in partition_file]
+    return records_to_timeseries(records)
+
+
+class TimeseriesWriter:
+    """Write time-series data to a file per partition of time, as it's produced."""
+
+    def __init__(
+        self,
+        directory: Path,
+        partition_size: timedelta = timedelta(days=1),
+        file_format: str = None,
+    ) -> None:
+        """Start writing partitions to directory, creating it if needed.
+
+        file_format is "jsonl" or "parquet", and defaults to default_format().
+        """
+        if file_format is None:
+            file_format = default_format()
+        check_format(file_format)
+        self.directory = directory
+        self.partition_size = pd.Timedelta(partition_size)
+        self.file_format = file_format
+        self.partition_start: Optional[pd.Timestamp] = None
+        self._jsonl_file: Optional[TextIO] = None
+        self._buffered: List[Dict[str, Any]] = []
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / MANIFEST_NAME, "w") as manifest_file:
+            json.dump(
+                {
+                    "version": PARTITIONS_VERSION,
+                    "partition_size": self.partition_size.total_seconds(),
+                    "format": file_format,
+                },
+                manifest_file,
+            )
+
+    def write(self, timeseries: pd.DataFrame) -> None:
+        """Write rows of time-series data, e.g. one interval's.
+
+        Rows go to the partition their date_start falls in. They must not
+        start before the partition written last.
+        """
+        if timeseries.empty:
+            return
+        date_starts = pd.DatetimeIndex(timeseries.index)
+        for partition_start, partition_rows in timeseries.groupby(
+            date_starts.floor(self.partition_size), sort=True,
+        ):
+            self._start_partition(partition_start)
+            records = timeseries_records(partition_rows)
+            if self._jsonl_file is None:
+                self._buffered.extend(records)
+                continue
+            for record in records:
+                self._jsonl_file.write(json.dumps(record))
+                self._jsonl_file.write("\n")
+            self._jsonl_file.flush()
+
+    def close(self) -> None:
+        """Finish writing the last partition."""
+        self._finish_partition()
+        self.partition_start = None
+
+    def __enter__(self) -> "TimeseriesWriter":
+        """Use the writer as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the writer."""
+        self.close()
+
+    def _start_partition(self, partition_start: pd.Timestamp) -> None:
+        if partition_start == self.partition_start:
+            return
+        if self.partition_start is not None and partition_start < self.partition_start:
+            raise ValueError("time-series data must be written in time order")
+        self._finish_partition()
+        self.partition_start = partition_start
+        if self.file_format == "jsonl":
+            self._jsonl_file = open(  # noqa: WPS515  # closed by _finish_partition
+                partition_path(self.directory, partition_start, self.file_format),
+                "w",
+            )
+
+    def _finish_partition(self) -> None:
+        if self._jsonl_file is not None:
+            self._jsonl_file.close()
+            self._jsonl_file = None
+        if self._buffered:
+            write_partition(
+                self._buffered,
+                partition_path(self.directory, self.partition_start, self.file_format),
+            )
+            self._buffered = []
+
+
+@dataclass
+class PartitionedTimeseries:
+    """Time-series data written by a TimeseriesWriter, read one partition at a time."""
+
+    directory: Path
+    partition_size: pd.Timedelta
+    file_format: str
+    # the start of each partition, and its file, in time order
+    partitions: List[Tuple[pd.Timestamp, Path]]
+
+    @classmethod
+    def open(cls, directory: Path) -> "PartitionedTimeseries":
+        """List the partitions in a directory, without reading any of them."""
+        with open(directory / MANIFEST_NAME) as manifest_file:
+            manifest = json.load(manifest_file)
+        version = manifest.get("version")
+        if version != PARTITIONS_VERSION:
+            raise ValueError(f"unsupported time-series partitions version {version!r}")
+        file_format = manifest["format"]
+        check_format(file_format)
+        suffix = PARTITION_SUFFIXES[file_format]
+        partitions = sorted(
+            (pd.Timestamp(path.name[: -len(suffix)]), path)
+            for path in directory.glob(f"*{suffix}")
+        )
+        return cls(
+            directory=directory,
+            partition_size=pd.Timedelta(seconds=manifest["partition_size"]),
+            file_format=file_format,
+            partitions=partitions,
+        )
+
+    def overlapping(self, date_range: DateRange) -> List[Path]:
+        """Get the files of the partitions that overlap date_range."""
+        start_time = pd.Timestamp(date_range.start_time)
+        end_time = pd.Timestamp(date_range.end_time)
+        return [
+            path
+            for partition_start, path in self.partitions
+            if partition_start < end_time
+            and partition_start + self.partition_size > start_time
+        ]
+
+    def iter_slice(self, date_range: DateRange = None) -> Iterator[pd.DataFrame]:
+        """Read the rows of intervals starting within date_range, a partition at a time.
+
+        Unlike in_date_range, date_range includes its start. Without a
+        date_range, every partition gets read.
+        """
+        if date_range is None:
+            paths = [path for _, path in self.partitions]
+        else:
+            paths = self.overlapping(date_range)
+        for path in paths:
+            partition = read_partition(path, self.file_format)
+            if date_range is not None:
+                date_starts = partition.index
+                partition = partition[
+                    (date_starts >= pd.Timestamp(date_range.start_time))
+                    & (date_starts < pd.Timestamp(date_range.end_time))
+                ]
+            yield partition
+
+    def read_slice(self, date_range: DateRange = None) -> pd.DataFrame:
+        """Read the rows of intervals starting within date_range into one DataFrame.
+
+        The result is like that of aggregate_timeseries_data.
+        """
+        frames = list(self.iter_slice(date_range))
+        if not frames:
+            return records_to_timeseries([])
+        return pd.concat(frames)
+
+
+def write_timeseries_data(
+    analyze_all_logs_args: AnalyzeMultipleLogsArgs,
+    date_range: DateRange,
+    writer: TimeseriesWriter,
+    intervals: int = 0,
+) -> None:
+    """Like aggregate_timeseries_data, but write each interval out as it's done."""
+    for interval_df in rerun_analysis_across_intervals(
+        analyze_all_logs_args, date_range, intervals,
+    ):
+        writer.write(interval_df)
+
+
+def write_all_timeseries_data(  # noqa: WPS211  # this is a wrapper function
+    directory: Path,
+    date_range: DateRange,
+    channels_wanted: ChannelsWanted = None,
+    log_dir: str = None,
+    nick_blacklists: Mapping[str, Set[str]] = None,
+    sortkey: str = "msgs",
+    intervals: int = 0,
+    partition_size: timedelta = timedelta(days=1),
+    file_format: str = None,
+) -> PartitionedTimeseries:
+    """Parse logfiles and write their time-series data to partitions in directory."""
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_multiple_logs(
+        log_paths(channels_wanted, log_dir, date_range),
+        nick_dictionary=nick_dictionary,
+    )
+    analyze_multiple_logs_args = AnalyzeMultipleLogsArgs(
+        parsed_logs=parsed_logs,
+        sortkey=sortkey,
+        nick_blacklists=nick_blacklists,
+        nick_dictionary=nick_dictionary,
+    )
+    with TimeseriesWriter(directory, partition_size, file_format) as writer:
+        write_timeseries_data(analyze_multiple_logs_args, date_range, writer, intervals)
+    return PartitionedTimeseries.open(directory)
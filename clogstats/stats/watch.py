@@ -0,0 +1,242 @@
+"""Keep per-channel stats up to date as WeeChat appends to its logs.
+
+Instead of re-reading every log on each run, a LogWatcher remembers how
+far it got in each log and only parses the lines appended since. Each
+channel keeps the runs of consecutive messages within a sliding window,
+so its stats can be updated in O(new lines) and snapshotted at any time.
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Counter, Deque, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.blacklists import NickMatcher, compile_blacklist
+from clogstats.stats.cache import CacheKey, read_new_lines
+from clogstats.stats.gather_stats import (
+    BOT_BLACKLISTS,
+    ChannelsWanted,
+    IRCChannel,
+    NickBlacklist,
+    channel_name,
+    ircchannel_from_topwords,
+    log_paths,
+    may_be_in_range,
+    network_blacklist,
+    rotation_number,
+    sort_channels,
+    spoken_nicks,
+)
+from clogstats.stats.parse import DateRange
+from clogstats.stats.seek import seek_offset
+
+try:
+    from inotify_simple import INotify, flags  # type: ignore
+except ImportError:  # optional; fall back to polling
+    INotify = None  # noqa: WPS440
+
+
+@dataclass
+class Run:
+    """A run of consecutive messages from one nick."""
+
+    nick: str
+    start_time: np.datetime64
+    end_time: np.datetime64
+
+
+@dataclass
+class ChannelWindow:
+    """The runs of a channel's messages that might still be within the window.
+
+    analyze_log counts a nick once per run of consecutive messages within
+    its date range, so a run counts towards the window as long as its
+    last message does. Runs get evicted once their last message leaves
+    the window.
+    """
+
+    name: str
+    nick_blacklist: Set[str] = field(default_factory=set)
+    runs: Deque[Run] = field(default_factory=deque)
+    # the runs in the window per nick, without blacklisted nicks
+    topwords: Counter[str] = field(default_factory=Counter)
+    matcher: NickMatcher = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Compile the blacklist once, rather than for every run."""
+        self.matcher = compile_blacklist(self.nick_blacklist)
+
+    def add_lines(self, logfile_df: pd.DataFrame) -> None:
+        """Add newly parsed lines of the channel's log, in logging order."""
+        nicks = spoken_nicks(logfile_df)
+        timestamps = logfile_df.loc[nicks.index, "timestamps"].to_numpy()
+        for nick, timestamp in zip(nicks.to_numpy(), timestamps):
+            if self.runs and self.runs[-1].nick == nick:
+                self.runs[-1].end_time = timestamp
+                continue
+            self.runs.append(Run(nick, timestamp, timestamp))
+            if self._counts(nick):
+                self.topwords[nick] += 1
+
+    def evict(self, start_time: np.datetime64) -> None:
+        """Forget runs that ended at or before start_time.
+
+        A message from the nick of an evicted run starts a new run, just
+        like the first message within analyze_log's date range does.
+        """
+        while self.runs and self.runs[0].end_time <= start_time:
+            nick = self.runs.popleft().nick
+            if self._counts(nick):
+                self.topwords[nick] -= 1
+                if not self.topwords[nick]:
+                    del self.topwords[nick]  # noqa: WPS420
+
+    def channel(self) -> IRCChannel:
+        """Get the current stats of the channel."""
+        return ircchannel_from_topwords(self.name, self.topwords.copy())
+
+    def _counts(self, nick: Optional[str]) -> bool:
+        # missing nicks still break up runs, like in first_of_runs
+        return isinstance(nick, str) and not self.matcher.matches(nick)
+
+
+@dataclass
+class LogTail:
+    """How far a channel's live log has been read."""
+
+    path: Path
+    stat_result: os.stat_result
+    offset: int = 0
+
+    def read_new_lines(self, engine: str = "pandas") -> Optional[pd.DataFrame]:
+        """Parse the lines appended since the last read, if there are any.
+
+        A log that was rotated or truncated gets read from the start.
+        """
+        stat_result = self.path.stat()
+        current_key = CacheKey.from_stat(stat_result)
+        previous_key = CacheKey.from_stat(self.stat_result)
+        self.stat_result = stat_result
+        if not previous_key.still_valid(current_key):
+            self.offset = 0
+        elif current_key.size == self.offset:
+            return None
+        new_lines = read_new_lines(self.path, self.offset, engine)
+        self.offset = new_lines.offset
+        return new_lines.logfile_df
+
+
+class LogWatcher:
+    """Follow every wanted log and keep the stats of their last window of time.
+
+    Call poll() whenever logs might have changed (see wait_for_changes),
+    and snapshot() to get stats equivalent to those of analyze_all_logs
+    for the window ending at a given time.
+    """
+
+    def __init__(  # noqa: WPS211  # Found too many arguments
+        self,
+        window: timedelta,
+        channels_wanted: ChannelsWanted = None,
+        nick_blacklists: NickBlacklist = None,
+        log_dir: str = None,
+        engine: str = "pandas",
+    ) -> None:
+        """Set up watching logs. Nothing gets read until the first poll()."""
+        if nick_blacklists is None:
+            nick_blacklists = BOT_BLACKLISTS
+        self.window = window
+        self.channels_wanted = channels_wanted
+        self.nick_blacklists = nick_blacklists
+        self.log_dir = log_dir
+        self.engine = engine
+        self.tails: Dict[str, LogTail] = {}
+        self.channels: Dict[str, ChannelWindow] = {}
+
+    def poll(self, now: datetime = None) -> int:
+        """Read whatever was appended to the logs, and pick up new logs.
+
+        now is used to skip the part of newly found logs from before the
+        window, like the whole backlog of every log on the first poll.
+        Returns the number of new lines.
+        """
+        if now is None:
+            now = datetime.now()
+        self._discover(now - self.window)
+        new_lines = 0
+        for name, tail in self.tails.items():
+            logfile_df = tail.read_new_lines(self.engine)
+            if logfile_df is not None:
+                self.channels[name].add_lines(logfile_df)
+                new_lines += len(logfile_df)
+        return new_lines
+
+    def snapshot(
+        self, end_time: datetime = None, sortkey: str = "msgs",
+    ) -> List[IRCChannel]:
+        """Get the stats of each channel for the window ending at end_time.
+
+        end_time defaults to now, and must not be earlier than the last
+        snapshot's. Lines logged after end_time are assumed not to exist yet.
+        """
+        if end_time is None:
+            end_time = datetime.now()
+        date_range = DateRange(
+            start_time=np.datetime64(end_time - self.window),
+            end_time=np.datetime64(end_time),
+        )
+        start_time = date_range.start_time
+        channels: List[IRCChannel] = []
+        for name, channel_window in self.channels.items():
+            channel_window.evict(start_time)
+            # like log_paths, skip logs that weren't written to within the window
+            if may_be_in_range(self.tails[name].stat_result, date_range):
+                channels.append(channel_window.channel())
+        return sort_channels(channels, sortkey)
+
+    def _discover(self, start_time: datetime) -> None:
+        for path in log_paths(self.channels_wanted, self.log_dir):
+            name = channel_name(path)
+            # rotated segments are never appended to
+            if rotation_number(path) or name in self.tails:
+                continue
+            with open(path, "rb") as logfile:
+                offset = seek_offset(logfile, np.datetime64(start_time))
+                stat_result = os.fstat(logfile.fileno())
+            self.tails[name] = LogTail(path, stat_result, offset)
+            self.channels[name] = ChannelWindow(
+                name, network_blacklist(name, self.nick_blacklists),
+            )
+
+
+def wait_for_changes(log_dir: Path, timeout: float) -> Iterator[None]:
+    """Yield whenever logs in log_dir might have changed.
+
+    Uses inotify when inotify_simple is installed. Otherwise, or when it
+    can't be used, yields every timeout seconds.
+    """
+    if INotify is None:
+        yield from _poll_forever(timeout)
+        return
+    try:
+        inotify = INotify()
+        inotify.add_watch(log_dir, flags.MODIFY | flags.CREATE | flags.MOVED_TO)
+    except OSError:  # e.g. out of watches
+        yield from _poll_forever(timeout)
+        return
+    with inotify:
+        while True:  # noqa: WPS457
+            inotify.read(timeout=int(timeout * 1000))
+            yield
+
+
+def _poll_forever(timeout: float) -> Iterator[None]:
+    while True:  # noqa: WPS457
+        time.sleep(timeout)
+        yield
@@ -4,7 +4,7 @@ from pathlib import Path
 import numpy as np
 import pytest  # type: ignore
 
-from clogstats.stats.gather_stats import DateRange
+from clogstats.stats.parse import DateRange
 
 
 @pytest.fixture()
@@ -0,0 +1,201 @@
+"""Tests for scoring models from many forecast origins."""
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+pytest.importorskip("darts")
+
+from darts.timeseries import TimeSeries  # noqa: E402
+
+from clogstats.forecasting import backtest as backtest_module  # noqa: E402
+from clogstats.forecasting.backtest import (  # noqa: E402
+    Backtest,
+    BacktestPlan,
+    backtest,
+    forecast_origins,
+)
+from clogstats.forecasting.ts_utils import ModelParams  # noqa: E402
+
+# 72 hourly points, each equal to its position
+PERIODS = 72
+PLAN = BacktestPlan(
+    horizon=pd.Timedelta("6H"),
+    stride=pd.Timedelta("12H"),
+    min_train=pd.Timedelta("24H"),
+)
+
+# (points fitted on, points predicted) of each predict call, and
+# (new points, points predicted) of each state update
+predictions = []
+updates = []
+
+
+def _series(values: np.ndarray, start: pd.Timestamp) -> TimeSeries:
+    times = pd.date_range(start, periods=len(values), freq="1H")
+    return TimeSeries.from_dataframe(
+        pd.DataFrame({"msgs": values}, index=times),
+        time_col=None,
+        value_cols=["msgs"],
+        freq="H",
+    )
+
+
+class TrendModel:
+    """A stand-in for a fitted darts model, continuing the trend of +1 an hour.
+
+    Its forecasts are exact, until it's asked for more than max_pred points.
+    """
+
+    def __init__(self, gathered_stats: TimeSeries, max_pred: int) -> None:
+        self.frame = gathered_stats.pd_dataframe()
+        self.max_pred = max_pred
+
+    def predict(self, n_pred: int) -> TimeSeries:
+        predictions.append((len(self.frame), n_pred))
+        if n_pred > self.max_pred:
+            raise ValueError("too far ahead")
+        last_value = self.frame["msgs"].iloc[-1]
+        return _series(
+            last_value + np.arange(1, n_pred + 1, dtype=float),
+            self.frame.index[-1] + pd.Timedelta("1H"),
+        )
+
+
+def trend_model(gathered_stats: TimeSeries, max_pred: int = PERIODS) -> TrendModel:
+    return TrendModel(gathered_stats, max_pred)
+
+
+def failing_model(gathered_stats: TimeSeries) -> TrendModel:
+    raise ValueError("bad fit")
+
+
+def update_trend(model: TrendModel, new_values: np.ndarray, n_pred: int) -> np.ndarray:
+    updates.append((len(new_values), n_pred))
+    return new_values[-1] + np.arange(1, n_pred + 1, dtype=float)
+
+
+def mean_error(series1, series2) -> float:
+    actual, forecast = series1.pd_dataframe().align(
+        series2.pd_dataframe(), join="inner",
+    )
+    assert len(actual) == PLAN.horizon / pd.Timedelta("1H")
+    return float(np.mean(np.abs(actual.to_numpy() - forecast.to_numpy())))
+
+
+@pytest.fixture(autouse=True)
+def _no_state_updates(monkeypatch):
+    predictions.clear()
+    updates.clear()
+    monkeypatch.setattr(backtest_module, "STATE_UPDATES", MappingProxyType({}))
+
+
+@pytest.fixture
+def series():
+    return _series(np.arange(PERIODS, dtype=float), pd.Timestamp("2020-07-01"))
+
+
+def test_forecast_origins(series):
+    time_index = series.pd_dataframe().index
+    # from min_train after the start, every stride, leaving a full horizon
+    assert forecast_origins(time_index, 6, PLAN) == [24, 36, 48, 60]
+    assert forecast_origins(time_index, 11, PLAN) == [24, 36, 48, 60]
+    assert forecast_origins(time_index, 12, PLAN) == [24, 36, 48]
+    assert forecast_origins(time_index[:20], 6, PLAN) == []
+    # origin times between points go to the point before them
+    odd_plan = PLAN._replace(stride=pd.Timedelta("90min"))
+    assert forecast_origins(time_index, 6, odd_plan)[:4] == [24, 25, 27, 28]
+
+
+@pytest.mark.parametrize("executor", ["serial", "process"])
+def test_backtest_refits_every_origin(series, executor):
+    result = backtest(
+        series,
+        {"trend": ModelParams(trend_model, {})},
+        PLAN,
+        metric=mean_error,
+        executor=executor,
+    )
+    scores = result.scores
+    assert list(scores.index) == list(series.pd_dataframe().index[[24, 36, 48, 60]])
+    assert (scores["model_name"] == "trend").all()
+    assert scores["refitted"].all()
+    assert (scores["score"] == 0).all()
+    assert scores["error"].isna().all()
+
+
+def test_backtest_reuses_fits_in_blocks(series):
+    result = backtest(
+        series,
+        {"trend": ModelParams(trend_model, {})},
+        PLAN._replace(refit_every=3),
+        metric=mean_error,
+        executor="serial",
+    )
+    # blocks of origins (24, 36, 48) and (60,)
+    assert list(result.scores["refitted"]) == [True, False, False, True]
+    # reused fits forecast further ahead, up to a horizon past the new origin
+    assert predictions == [(25, 6), (25, 18), (25, 30), (61, 6)]
+    assert (result.scores["score"] == 0).all()
+    assert not updates
+
+
+def test_failed_forecast_refits_at_next_origin(series):
+    result = backtest(
+        series,
+        {"trend": ModelParams(trend_model, {"max_pred": 12})},
+        PLAN._replace(refit_every=4),
+        metric=mean_error,
+        executor="serial",
+    )
+    # 18 points ahead is too far, so the fit from 24 fails at 36
+    assert predictions == [(25, 6), (25, 18), (49, 6), (49, 18)]
+    scores = result.scores
+    assert list(scores["refitted"]) == [True, False, True, False]
+    assert scores["error"].tolist()[1::2] == ["ValueError: too far ahead"] * 2
+    assert scores["score"].isna().tolist() == [False, True, False, True]
+
+
+def test_backtest_updates_state(series, monkeypatch):
+    monkeypatch.setattr(
+        backtest_module, "STATE_UPDATES", MappingProxyType({trend_model: update_trend}),
+    )
+    result = backtest(
+        series,
+        {"trend": ModelParams(trend_model, {})},
+        PLAN._replace(refit_every=3),
+        metric=mean_error,
+        executor="serial",
+    )
+    assert list(result.scores["refitted"]) == [True, False, False, True]
+    # updated with the points since the last origin, instead of predicting further
+    assert predictions == [(25, 6), (61, 6)]
+    assert updates == [(12, 6), (12, 6)]
+    assert (result.scores["score"] == 0).all()
+
+
+def test_aggregate_leaves_out_failures(series):
+    result = backtest(
+        series,
+        {
+            "failing": ModelParams(failing_model, {}),
+            "short": ModelParams(trend_model, {"max_pred": 12}),
+            "trend": ModelParams(trend_model, {}),
+        },
+        PLAN._replace(refit_every=2),
+        metric=mean_error,
+        executor="serial",
+    )
+    assert result.scores["error"].notna().sum() == 6
+    # failing never forecast, and short's failures don't count against it
+    assert result.aggregate() == {"short": 0, "trend": 0}
+    scores = pd.DataFrame(
+        {
+            "model_name": ["worse", "worse", "better"],
+            "score": [3, np.nan, 1],
+            "error": [None, "ValueError: bad fit", None],
+        },
+    )
+    # best first
+    assert list(Backtest(scores).aggregate().items()) == [("better", 1), ("worse", 3)]
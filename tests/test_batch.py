@@ -0,0 +1,139 @@
+"""Tests for forecasting many channels at once."""
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+pytest.importorskip("darts")
+
+from darts.timeseries import TimeSeries  # noqa: E402
+
+from clogstats.forecasting.batch import (  # noqa: E402
+    ForecastJob,
+    forecast_channels,
+    run_forecast_job,
+)
+from clogstats.forecasting.ts_utils import ModelParams  # noqa: E402
+
+
+def _series(periods: int) -> TimeSeries:
+    times = pd.date_range("2020-07-01", periods=periods, freq="1H")
+    values = pd.DataFrame({"msgs": np.arange(periods, dtype=float)}, index=times)
+    return TimeSeries.from_dataframe(
+        values, time_col=None, value_cols=["msgs"], freq="H",
+    )
+
+
+class ConstantModel:
+    """A stand-in for a fitted darts model, forecasting a constant."""
+
+    def __init__(self, gathered_stats: TimeSeries, value: float) -> None:
+        self.times = gathered_stats.pd_dataframe().index
+        self.value = value
+
+    def predict(self, n_pred: int) -> TimeSeries:
+        times = pd.date_range(
+            self.times[-1], periods=n_pred + 1, freq=self.times.freq,
+        )[1:]
+        forecast = pd.DataFrame({"msgs": np.full(n_pred, self.value)}, index=times)
+        return TimeSeries.from_dataframe(
+            forecast, time_col=None, value_cols=["msgs"], freq="H",
+        )
+
+
+# module-level, so the process executor can pickle them
+def constant_model(gathered_stats: TimeSeries, value: float = 1) -> ConstantModel:
+    return ConstantModel(gathered_stats, value)
+
+
+def failing_model(gathered_stats: TimeSeries) -> ConstantModel:
+    raise ValueError("bad fit")
+
+
+def slow_model(gathered_stats: TimeSeries, seconds: float = 30) -> ConstantModel:
+    time.sleep(seconds)
+    return ConstantModel(gathered_stats, 0)
+
+
+def mean_error(series1, series2, intersect=True, reduction=np.mean) -> float:
+    actual, forecast = series1.pd_dataframe().align(
+        series2.pd_dataframe(), join="inner",
+    )
+    return float(reduction(np.abs(actual.to_numpy() - forecast.to_numpy())))
+
+
+MODELS = {
+    "constant": ModelParams(constant_model, {"value": 100}),
+    "failing": ModelParams(failing_model, {}),
+    "slow": ModelParams(slow_model, {}),
+}
+
+
+@pytest.mark.parametrize("executor", ["serial", "process"])
+def test_forecast_channels(executor):
+    progress = []
+    batch = forecast_channels(
+        {"#short": _series(48), "#long": _series(96)},
+        MODELS,
+        metric=mean_error,
+        timeout=0.5,
+        executor=executor,
+        workers=2,
+        progress=lambda done, total, outcome: progress.append(
+            (done, total, outcome.channel),
+        ),
+    )
+    assert set(batch.channels) == {"#short", "#long"}
+    for channel, evaluations in batch.channels.items():
+        # failed models are left out, the rest are like make_and_compare_predictions
+        assert list(evaluations.predictions) == ["constant"]
+        forecast = evaluations.predictions["constant"].pd_dataframe()
+        assert len(forecast) == 24
+        assert (forecast["msgs"] == 100).all()
+        assert list(evaluations.evaluations) == ["constant"]
+        assert evaluations.evaluations["constant"] > 0
+    errors = sorted(
+        (failure.channel, failure.model_name, failure.error.split(":")[0])
+        for failure in batch.failures
+    )
+    assert errors == [
+        ("#long", "failing", "ValueError"),
+        ("#long", "slow", "ForecastTimeout"),
+        ("#short", "failing", "ValueError"),
+        ("#short", "slow", "ForecastTimeout"),
+    ]
+    assert all(failure.seconds < 10 for failure in batch.failures)
+    assert [done for done, _, _ in progress] == list(range(1, 7))
+    assert {total for _, total, _ in progress} == {6}
+    if executor == "serial":
+        # jobs on the longest series go first
+        assert [channel for _, _, channel in progress] == ["#long"] * 3 + ["#short"] * 3
+
+
+def test_time_limit_outside_main_thread():
+    job = ForecastJob(
+        channel="#chan",
+        model_name="slow",
+        model_params=ModelParams(slow_model, {"seconds": 0.2}),
+        train=_series(48),
+        n_pred=4,
+        timeout=0.1,
+    )
+    outcomes = []
+
+    def run_job() -> None:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            outcomes.append((run_forecast_job(job), caught))
+
+    thread = threading.Thread(target=run_job)
+    thread.start()
+    thread.join()
+    ((outcome, caught),) = outcomes
+    # runs to completion without a limit instead of failing
+    assert outcome.error is None
+    assert len(outcome.forecast) == 4
+    assert [warning.category for warning in caught] == [RuntimeWarning]
@@ -0,0 +1,79 @@
+"""Tests for matching nicks against blacklists of names and patterns."""
+from pathlib import Path
+
+import pandas as pd
+
+from clogstats.stats.blacklists import (
+    NickMatcher,
+    compile_blacklist,
+    load_blacklists,
+)
+from clogstats.stats.gather_stats import BOT_BLACKLISTS, count_nicks
+from clogstats.stats.nicks import NickDictionary
+
+
+def test_compile_blacklist():
+    matcher = compile_blacklist({"Gitter", "bitbot*", r"re:wlb\d+", "a.b"})
+    assert compile_blacklist(["a.b", "bitbot*", r"re:wlb\d+", "Gitter"]) is matcher
+    matched = [
+        nick
+        for nick in ("gitter", "gitter2", "BitBot2", "bitbot", "wlb12", "wlb", "axb")
+        if matcher.matches(nick)
+    ]
+    # plain entries match exactly, not as regexes
+    assert matched == ["gitter", "BitBot2", "bitbot", "wlb12"]
+    assert not compile_blacklist(None).matches("gitter")
+
+
+def test_default_blacklists_match_rotating_suffixes():
+    matchers = {
+        network: compile_blacklist(BOT_BLACKLISTS[network])
+        for network in ("2600net", "freenode", "installgentoo")
+    }
+    assert matchers["2600net"].matches("bitbot2")
+    assert matchers["freenode"].matches("wlb1")
+    assert matchers["freenode"].matches("wlb7")
+    assert matchers["installgentoo"].matches("gtrackerbot5")
+    assert not matchers["freenode"].matches("nemo")
+
+
+def test_matcher_cache_is_bounded():
+    matcher = NickMatcher(frozenset({"bitbot*"}), cache_size=2)
+    matched = [matcher.matches(f"bitbot{number}") for number in range(5)]
+    assert matched == [True] * 5
+    assert len(matcher._matches) == 2  # noqa: WPS437
+    assert not matcher.matches("nemo")
+    assert list(matcher._matches) == ["bitbot4", "nemo"]  # noqa: WPS437
+
+
+def test_blacklisted_codes_are_cached():
+    nick_dictionary = NickDictionary()
+    codes = nick_dictionary.add(["bitbot2", "nemo"])
+    assert nick_dictionary.blacklisted(codes, {"bitbot*"}).tolist() == [True, False]
+    # only nicks added since the last lookup get matched
+    codes = nick_dictionary.add(["nemo", "BITBOT5"])
+    assert nick_dictionary.blacklisted(codes, {"bitbot*"}).tolist() == [False, True]
+    assert nick_dictionary.blacklisted(codes, {"nemo"}).tolist() == [True, False]
+
+
+def test_count_nicks_with_patterns():
+    nicks = pd.Series(["bitbot2", "nemo", None, "BitBot", "nemo"], dtype="category")
+    nick_counts = count_nicks(nicks, {"bitbot*"})
+    assert nick_counts.to_dict() == {"nemo": 2}
+
+
+def test_load_blacklists(tmp_path: Path):
+    tmp_path.joinpath("freenode.txt").write_text(
+        "# bots with rotating suffixes\nre:wlb\\d+\n\nbuttsbot  # already a default\n",
+    )
+    tmp_path.joinpath("newnet.txt").write_text("spambot*\n")
+    base_blacklists = {"freenode": {"buttsbot"}, "gitter": {"gitter"}}
+    blacklists = load_blacklists(base_blacklists, tmp_path)
+    assert blacklists == {
+        "freenode": {"buttsbot", r"re:wlb\d+"},
+        "gitter": {"gitter"},
+        "newnet": {"spambot*"},
+    }
+    # the base blacklists are left alone
+    assert base_blacklists["freenode"] == {"buttsbot"}
+    assert load_blacklists(base_blacklists, tmp_path / "missing") == base_blacklists
@@ -0,0 +1,43 @@
+"""Tests for the on-disk cache of parsed logs."""
+import pandas as pd
+import pytest  # type: ignore
+
+from clogstats.stats.cache import ParseCache, cache_file, load_entry, read_cached_lines
+from clogstats.stats.parse import read_all_lines
+
+
+def assert_same_lines(actual, expected):
+    pd.testing.assert_frame_equal(
+        actual.astype({"msg_types": object, "nicks": object}),
+        expected.astype({"msg_types": object, "nicks": object}),
+    )
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_read_cached_lines_appended(log_path, tmp_path):
+    contents = (log_path / "irc.freenode.#go-nuts_big.weechatlog").read_bytes()
+    path = tmp_path / "irc.freenode.#go-nuts_big.weechatlog"
+    cache = ParseCache(cache_dir=tmp_path / "cache")
+    # stop halfway through a line, like WeeChat in the middle of a write
+    path.write_bytes(contents[: len(contents) // 2])
+    read_cached_lines(path, cache)
+    first_offset = load_entry(cache_file(path, cache.cache_dir), path).offset
+    assert first_offset < len(contents) // 2
+    with open(path, "ab") as logfile:
+        logfile.write(contents[len(contents) // 2 :])
+    assert_same_lines(read_cached_lines(path, cache), read_all_lines(path))
+    # the second read only parsed what came after the first offset
+    assert load_entry(cache_file(path, cache.cache_dir), path).offset == len(contents)
+    assert_same_lines(read_cached_lines(path, cache), read_all_lines(path))
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_read_cached_lines_truncated(log_path, tmp_path):
+    contents = (log_path / "irc.freenode.#firefox.weechatlog").read_bytes()
+    path = tmp_path / "irc.freenode.#firefox.weechatlog"
+    cache = ParseCache(cache_dir=tmp_path / "cache")
+    path.write_bytes(contents)
+    read_cached_lines(path, cache)
+    # a rotated log starts over with fewer lines than the cached parse
+    path.write_bytes(contents[: contents.index(b"\n", len(contents) // 3) + 1])
+    assert_same_lines(read_cached_lines(path, cache), read_all_lines(path))
@@ -0,0 +1,73 @@
+"""Tests for reading logs with each executor."""
+import pandas as pd
+import pytest  # type: ignore
+
+from clogstats.stats.executors import (
+    EXECUTORS,
+    imap_ordered,
+    share_frame,
+    unshare_frame,
+)
+from clogstats.stats.gather_stats import (
+    ParseOptions,
+    analyze_multiple_logs,
+    parse_all_logs,
+)
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import empty_parsed_lines, read_all_lines
+
+
+def test_shared_frame_round_trip(log_path):
+    path = log_path / "irc.freenode.#node.js_big.weechatlog"
+    logfile_df = read_all_lines(path)
+    # a filtered log keeps the index of the lines it came from
+    logfile_df = logfile_df[logfile_df["msg_types"] != "message"]
+    pd.testing.assert_frame_equal(
+        unshare_frame(share_frame(logfile_df)), logfile_df, check_index_type=False,
+    )
+    empty = empty_parsed_lines()
+    assert unshare_frame(share_frame(empty)).empty
+
+
+def test_parse_all_logs_executors(small_date_range, log_path):
+    parsed_by_executor = [
+        parse_all_logs(
+            log_dir=str(log_path),
+            date_range=small_date_range,
+            parse_options=ParseOptions(executor=executor, workers=2),
+        )
+        for executor in EXECUTORS
+    ]
+    expected = parsed_by_executor[0]
+    for parsed_logs in parsed_by_executor[1:]:
+        assert parsed_logs.keys() == expected.keys()
+        for name, logfile_df in parsed_logs.items():
+            pd.testing.assert_frame_equal(
+                logfile_df, expected[name], check_index_type=False,
+            )
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError, match="unknown executor"):
+        imap_ordered(str, [], executor="gpu")
+
+
+def test_analyze_multiple_logs_executors(large_date_range, log_path):
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_all_logs(
+        log_dir=str(log_path),
+        parse_options=ParseOptions(executor="serial"),
+        nick_dictionary=nick_dictionary,
+    )
+    results = [
+        analyze_multiple_logs(
+            large_date_range,
+            parsed_logs,
+            nick_dictionary=nick_dictionary,
+            executor=executor,
+            workers=2,
+        )
+        for executor in EXECUTORS
+    ]
+    assert results[0]
+    assert all(channels == results[0] for channels in results[1:])
@@ -1,7 +1,28 @@
 """Tests for the accuracy of the stats read from IRC logs."""
+import bz2
+import gzip
+import os
 from collections import Counter
+from datetime import datetime
+from pathlib import Path
 
-from clogstats.stats.gather_stats import ChannelsWanted, IRCChannel, analyze_all_logs
+import numpy as np
+
+from clogstats.stats.gather_stats import (
+    ChannelsWanted,
+    IRCChannel,
+    ParseOptions,
+    analyze_all_logs,
+    analyze_log,
+    analyze_log_stream,
+    analyze_multiple_logs,
+    log_paths,
+    log_segments,
+    parse_all_logs,
+    rotation_number,
+)
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DateRange, read_all_lines
 
 
 def test_analyze_all_logs(small_date_range, log_path):
@@ -52,3 +73,134 @@ def test_analyze_all_logs(small_date_range, log_path):
         IRCChannel(name="freenode.#go-nuts", topwords=Counter(), nicks=0, msgs=0),
     ]
     assert expected == actual
+
+
+def test_analyze_all_logs_streaming(large_date_range, log_path):
+    channels_wanted = ChannelsWanted(
+        include_channels=["freenode.#go-nuts_big", "freenode.#node.js_big"],
+    )
+    expected = analyze_all_logs(
+        channels_wanted=channels_wanted,
+        date_range=large_date_range,
+        log_dir=str(log_path),
+    )
+    actual = analyze_all_logs(
+        channels_wanted=channels_wanted,
+        date_range=large_date_range,
+        log_dir=str(log_path),
+        parse_options=ParseOptions(streaming=True),
+    )
+    assert expected == actual
+
+
+def test_analyze_log_stream_small_chunks(log_path):
+    path = log_path / "irc.freenode.#node.js_big.weechatlog"
+    date_range = DateRange(
+        start_time=np.datetime64("2020-07-06T00:00"),
+        end_time=np.datetime64("2020-07-07T00:00"),
+    )
+    expected = analyze_log(
+        read_all_lines(path), date_range=date_range, name="freenode.#node.js_big",
+    )
+    # chunks this small split plenty of runs of consecutive messages
+    assert analyze_log_stream([path], date_range, chunksize=7) == expected
+
+
+def test_parse_all_logs_date_range(small_date_range, log_path):
+    parsed_logs = parse_all_logs(log_dir=str(log_path), date_range=small_date_range)
+    for logfile_df in parsed_logs.values():
+        assert logfile_df["timestamps"].gt(small_date_range.start_time).all()
+        assert logfile_df["timestamps"].lt(small_date_range.end_time).all()
+    assert parsed_logs["freenode.#go-nuts_big"].empty
+
+
+def test_analyze_multiple_logs_nick_dictionary(large_date_range, log_path):
+    channels_wanted = ChannelsWanted(
+        include_channels=["freenode.#go-nuts_big", "freenode.#node.js_big"],
+    )
+    expected = analyze_multiple_logs(
+        date_range=large_date_range,
+        parsed_logs=parse_all_logs(channels_wanted, log_dir=str(log_path)),
+    )
+    nick_dictionary = NickDictionary()
+    encoded_logs = parse_all_logs(
+        channels_wanted, log_dir=str(log_path), nick_dictionary=nick_dictionary,
+    )
+    assert all("nick_codes" in logfile_df for logfile_df in encoded_logs.values())
+    actual = analyze_multiple_logs(
+        date_range=large_date_range,
+        parsed_logs=encoded_logs,
+        nick_dictionary=nick_dictionary,
+    )
+    assert expected == actual
+
+
+def split_into_segments(source: Path, log_dir: Path) -> None:
+    """Split a log into two compressed rotated segments and a live log.
+
+    Each segment's mtime is set to the time of its last line.
+    """
+    lines = source.read_bytes().splitlines(keepends=True)
+    thirds = len(lines) // 3
+    segments = (
+        (bz2.open, f"{source.name}.2.bz2", lines[:thirds]),
+        (gzip.open, f"{source.name}.1.gz", lines[thirds : 2 * thirds]),
+        (open, source.name, lines[2 * thirds :]),
+    )
+    for opener, name, segment_lines in segments:
+        with opener(log_dir / name, "wb") as segment:
+            segment.writelines(segment_lines)
+        last_timestamp = datetime.fromisoformat(segment_lines[-1][:19].decode())
+        mtime = last_timestamp.timestamp()
+        os.utime(log_dir / name, (mtime, mtime))
+
+
+def test_rotated_segments(log_path, tmp_path):
+    name = "freenode.#go-nuts_big"
+    split_into_segments(log_path / f"irc.{name}.weechatlog", tmp_path)
+    segments = log_segments(log_paths(log_dir=str(tmp_path)))
+    assert [segment.name for segment in segments[name]] == [
+        f"irc.{name}.weechatlog.2.bz2",
+        f"irc.{name}.weechatlog.1.gz",
+        f"irc.{name}.weechatlog",
+    ]
+    expected = read_all_lines(log_path / f"irc.{name}.weechatlog")
+    actual = parse_all_logs(log_dir=str(tmp_path))[name]
+    assert actual.astype({"nicks": object}).equals(expected.astype({"nicks": object}))
+
+
+def test_old_segments_skipped(log_path, tmp_path, large_date_range):
+    name = "freenode.#go-nuts_big"
+    split_into_segments(log_path / f"irc.{name}.weechatlog", tmp_path)
+    date_range = DateRange(
+        start_time=np.datetime64("2020-07-09T12:00"),
+        end_time=large_date_range.end_time,
+    )
+    expected = analyze_log_stream(
+        sorted(tmp_path.iterdir(), key=rotation_number, reverse=True), date_range,
+    )
+    # corrupt the oldest segment; it's outside of date_range, so it's never read
+    oldest_segment = tmp_path / f"irc.{name}.weechatlog.2.bz2"
+    mtime = oldest_segment.stat().st_mtime
+    oldest_segment.write_bytes(b"garbage")
+    os.utime(oldest_segment, (mtime, mtime))
+    actual = analyze_all_logs(
+        date_range=date_range,
+        log_dir=str(tmp_path),
+        parse_options=ParseOptions(streaming=True),
+    )
+    assert actual == [expected]
+
+
+def test_log_paths_skips_dead_logs(log_path, tmp_path, large_date_range):
+    live_log = tmp_path / "irc.freenode.#node.js_big.weechatlog"
+    live_log.write_bytes((log_path / live_log.name).read_bytes())
+    dead_log = tmp_path / "irc.freenode.#firefox.weechatlog"
+    dead_log.write_bytes((log_path / dead_log.name).read_bytes())
+    last_written = datetime(2020, 6, 20).timestamp()
+    os.utime(dead_log, (last_written, last_written))
+    (tmp_path / "irc.freenode.#empty.weechatlog").touch()
+    assert len(list(log_paths(log_dir=str(tmp_path)))) == 3
+    assert list(log_paths(log_dir=str(tmp_path), date_range=large_date_range)) == [
+        live_log,
+    ]
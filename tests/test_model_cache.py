@@ -0,0 +1,139 @@
+"""Tests for caching fitted models on disk."""
+import os
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+pytest.importorskip("darts")
+
+from darts.timeseries import TimeSeries  # noqa: E402
+
+from clogstats.forecasting import model_cache  # noqa: E402
+from clogstats.forecasting.model_cache import (  # noqa: E402
+    ModelCache,
+    evict_models,
+    fit_cached,
+    model_file,
+    model_key,
+)
+from clogstats.forecasting.ts_utils import ModelParams  # noqa: E402
+
+
+class SearchedModel:
+    """A stand-in for a fitted model that searches for its orders."""
+
+    def __init__(self, length: int, orders: str = None) -> None:
+        # like AutoARIMA, a full fit picks orders that a warm start reuses
+        self.orders = orders or f"searched at {length}"
+        self.length = length
+
+
+fits = []
+
+
+def searched_model(gathered_stats: TimeSeries, orders: str = None) -> SearchedModel:
+    model = SearchedModel(len(gathered_stats), orders)
+    fits.append(model)
+    return model
+
+
+def warm_start_searched(
+    model_params: ModelParams, fitted: SearchedModel,
+) -> ModelParams:
+    prediction_kwargs = dict(model_params.prediction_kwargs)
+    prediction_kwargs["orders"] = fitted.orders
+    return ModelParams(model_params.prediction_function, prediction_kwargs)
+
+
+MODEL_PARAMS = ModelParams(searched_model, {})
+
+
+@pytest.fixture(autouse=True)
+def _warm_starts(monkeypatch):
+    fits.clear()
+    monkeypatch.setattr(
+        model_cache,
+        "WARM_STARTS",
+        MappingProxyType({searched_model: warm_start_searched}),
+    )
+
+
+def _series(periods: int, first_value: float = 0) -> TimeSeries:
+    times = pd.date_range("2020-07-01", periods=periods, freq="1H")
+    values = np.arange(periods, dtype=float)
+    values[0] = first_value
+    return TimeSeries.from_dataframe(
+        pd.DataFrame({"msgs": values}, index=times),
+        time_col=None,
+        value_cols=["msgs"],
+        freq="H",
+    )
+
+
+def test_unchanged_series_hits_cache(tmp_path):
+    cache = ModelCache(cache_dir=tmp_path)
+    fitted = fit_cached("#chan", MODEL_PARAMS, _series(100), cache)
+    cached = fit_cached("#chan", MODEL_PARAMS, _series(100), cache)
+    assert len(fits) == 1
+    assert (cached.orders, cached.length) == (fitted.orders, fitted.length)
+    # a different channel or model is a different entry
+    fit_cached("#other", MODEL_PARAMS, _series(100), cache)
+    other_params = ModelParams(searched_model, {"orders": "fixed"})
+    fit_cached("#chan", other_params, _series(100), cache)
+    assert len(fits) == 3
+
+
+def test_growing_series_warm_starts(tmp_path):
+    cache = ModelCache(cache_dir=tmp_path, max_growth=0.5)
+    fit_cached("#chan", MODEL_PARAMS, _series(100), cache)
+    # within max_growth of the last full fit: reuse its orders
+    warm = fit_cached("#chan", MODEL_PARAMS, _series(130), cache)
+    assert (warm.orders, warm.length) == ("searched at 100", 130)
+    warm = fit_cached("#chan", MODEL_PARAMS, _series(150), cache)
+    assert (warm.orders, warm.length) == ("searched at 100", 150)
+    # beyond it: search again
+    full = fit_cached("#chan", MODEL_PARAMS, _series(151), cache)
+    assert full.orders == "searched at 151"
+    assert len(fits) == 4
+
+
+def test_changed_history_refits(tmp_path):
+    cache = ModelCache(cache_dir=tmp_path)
+    fit_cached("#chan", MODEL_PARAMS, _series(100), cache)
+    refitted = fit_cached("#chan", MODEL_PARAMS, _series(110, first_value=5), cache)
+    assert refitted.orders == "searched at 110"
+    # a shorter series isn't a continuation either
+    shorter = fit_cached("#chan", MODEL_PARAMS, _series(90, first_value=5), cache)
+    assert shorter.orders == "searched at 90"
+    # rebuild ignores the entry, even for the same series
+    rebuilt = fit_cached(
+        "#chan",
+        MODEL_PARAMS,
+        _series(90, first_value=5),
+        ModelCache(cache_dir=tmp_path, rebuild=True),
+    )
+    assert rebuilt is not shorter
+    assert len(fits) == 4
+
+
+def test_least_recently_used_evicted(tmp_path):
+    cache = ModelCache(cache_dir=tmp_path)
+    paths = {}
+    for second, channel in enumerate(("#a", "#b", "#c"), 1):
+        fit_cached(channel, MODEL_PARAMS, _series(100), cache)
+        paths[channel] = model_file(model_key(channel, MODEL_PARAMS), tmp_path)
+        os.utime(paths[channel], (second, second))
+    # using #a makes #b the least recently used
+    fit_cached("#a", MODEL_PARAMS, _series(100), cache)
+    assert len(fits) == 3
+    sizes = {channel: path.stat().st_size for channel, path in paths.items()}
+    evict_models(tmp_path, sizes["#a"] + sizes["#c"])
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        (paths["#a"].name, paths["#c"].name),
+    )
+    # saving an entry evicts the least recently used ones beyond max_bytes
+    small_cache = ModelCache(cache_dir=tmp_path, max_bytes=sizes["#a"] * 2)
+    fit_cached("#d", MODEL_PARAMS, _series(100), small_cache)
+    assert not paths["#c"].exists()
@@ -0,0 +1,86 @@
+"""Tests for time-series data as a sparse matrix of per-nick activity."""
+import numpy as np
+import pytest  # type: ignore
+
+from clogstats.stats.gather_stats import (
+    ParseOptions,
+    analyze_intervals,
+    parse_all_logs,
+)
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.time_series import (
+    aggregate_all_timeseries_data,
+    aggregate_all_timeseries_matrix,
+    bucket_matrix,
+    divide_date_range,
+)
+
+
+@pytest.fixture()
+def encoded_logs(log_path):
+    """The sample logs, parsed with a NickDictionary."""
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_all_logs(
+        log_dir=str(log_path),
+        parse_options=ParseOptions(executor="serial"),
+        nick_dictionary=nick_dictionary,
+    )
+    return parsed_logs, nick_dictionary
+
+
+def test_nick_matrix_matches_analyze_intervals(large_date_range, encoded_logs):
+    parsed_logs, nick_dictionary = encoded_logs
+    date_ranges = divide_date_range(large_date_range, 30)
+    nick_matrix = bucket_matrix(date_ranges, parsed_logs, None, nick_dictionary)
+    expected = analyze_intervals(
+        date_ranges, parsed_logs, None, nick_dictionary, "serial",
+    )
+    assert nick_matrix.channels() == expected
+    assert nick_matrix.shape == (len(parsed_logs) * 29, len(nick_dictionary))
+
+    name = "freenode.#go-nuts_big"
+    channels = [
+        next(channel for channel in interval if channel.name == name)
+        for interval in expected
+    ]
+    nick = channels[0].topwords.most_common(1)[0][0]
+    assert nick_matrix.nick_series(name, nick).tolist() == [
+        channel.topwords[nick] for channel in channels
+    ]
+    top_nicks = nick_matrix.top_nicks(2)
+    top_nicks = top_nicks[top_nicks["name"] == name]
+    assert top_nicks.groupby(level=0).size().max() == 2
+    assert top_nicks.loc[top_nicks["rank"] == 0, "msgs"].tolist() == [
+        channel.topwords.most_common(1)[0][1]
+        for channel in channels
+        if channel.topwords
+    ]
+
+
+def test_nick_matrix_frame(large_date_range, log_path):
+    kwargs = {
+        "date_range": large_date_range,
+        "log_dir": str(log_path),
+        "intervals": 20,
+    }
+    expected = aggregate_all_timeseries_data(sortkey="msgs", **kwargs)
+    actual = aggregate_all_timeseries_matrix(**kwargs).to_frame()
+    sort_columns = ["date_start", "name"]
+    expected = expected.reset_index().sort_values(sort_columns, ignore_index=True)
+    actual = actual.reset_index().sort_values(sort_columns, ignore_index=True)
+    for column in ("date_start", "name", "nicks", "msgs", "date_end"):
+        assert np.array_equal(actual[column], expected[column]), column
+
+
+def test_nick_matrix_conversions(large_date_range, encoded_logs):
+    parsed_logs, nick_dictionary = encoded_logs
+    date_ranges = divide_date_range(large_date_range, 10)
+    nick_matrix = bucket_matrix(date_ranges, parsed_logs, None, nick_dictionary)
+    sparse = pytest.importorskip("scipy.sparse")
+    scipy_matrix = nick_matrix.to_scipy()
+    assert isinstance(scipy_matrix, sparse.csr_matrix)
+    row_sums = np.asarray(scipy_matrix.sum(axis=1)).ravel()
+    assert np.array_equal(row_sums, nick_matrix.msgs())
+    pytest.importorskip("darts")
+    series = nick_matrix.to_timeseries("freenode.#go-nuts_big", ["b0nn"], freq=None)
+    assert len(series) == len(date_ranges)
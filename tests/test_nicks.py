@@ -0,0 +1,26 @@
+"""Tests for encoding nicks as integers."""
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.nicks import MISSING_NICK, NickDictionary
+
+
+def test_nick_dictionary_shared_codes():
+    nick_dictionary = NickDictionary()
+    first = nick_dictionary.encode(pd.Series(["Seirdy", None, "nemo", "Seirdy"]))
+    second = nick_dictionary.encode(
+        pd.Series(["nemo", "seirdy", "Seirdy"], dtype="category"),
+    )
+    assert first.dtype == np.int32
+    assert first[1] == MISSING_NICK
+    assert first[0] == first[3] == second[2]
+    assert first[2] == second[0]
+    # nicks are stored as-is; only blacklists are case-insensitive
+    assert second[1] != first[0]
+    assert len(nick_dictionary) == 3
+    assert nick_dictionary.decode(second) == ["nemo", "seirdy", "Seirdy"]
+    assert nick_dictionary.blacklisted(second, {"seirdy"}).tolist() == [
+        False,
+        True,
+        True,
+    ]
@@ -0,0 +1,83 @@
+"""Tests for forecasting many channels at once with NumPy."""
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+from clogstats.forecasting.numpy_models import (
+    MODELS,
+    AdditiveHoltWinters,
+    SeasonalNaive,
+    SimpleSmoothing,
+    forecast_activity,
+    golden_section,
+    make_model,
+)
+
+
+def _seasonal_series(length: int, season: int) -> np.ndarray:
+    steps = np.arange(length)
+    return 10 + 0.1 * steps + 3 * np.sin(2 * np.pi * steps / season)
+
+
+def test_golden_section_minimizes_each_series():
+    targets = np.array([0.2, 0.5, 0.9])
+    found = golden_section(lambda param: (param - targets) ** 2, len(targets), 30)
+    assert np.allclose(found, targets, atol=1e-4)
+
+
+def test_seasonal_naive_repeats_last_season():
+    values = np.arange(12).reshape(2, 6)
+    forecast = SeasonalNaive(season=3).fit(values).predict(5)
+    assert forecast.tolist() == [[3, 4, 5, 3, 4], [9, 10, 11, 9, 10]]
+
+
+def test_simple_smoothing_follows_level():
+    values = np.array([[5.0] * 20, [0.0] * 10 + [10.0] * 10])
+    fitted = SimpleSmoothing().fit(values)
+    forecast = fitted.predict(3)
+    assert np.allclose(forecast[0], 5)
+    # a level shift is followed quickly, so alpha is high
+    assert fitted.alpha[1] > 0.9
+    assert np.allclose(forecast[1], 10, atol=0.01)
+
+
+def test_holt_winters_forecasts_trend_and_season():
+    season = 12
+    series = _seasonal_series(10 * season, season)
+    rng = np.random.default_rng(0)
+    values = np.vstack([series, series + rng.normal(0, 0.1, len(series))])
+    forecast = AdditiveHoltWinters(season).fit(values).predict(season)
+    truth = _seasonal_series(11 * season, season)[-season:]
+    assert np.abs(forecast - truth).max() < 0.5
+
+
+def test_holt_winters_fits_series_independently():
+    season = 6
+    rng = np.random.default_rng(1)
+    values = _seasonal_series(8 * season, season) + rng.normal(0, 1, (3, 8 * season))
+    together = AdditiveHoltWinters(season).fit(values)
+    alone = AdditiveHoltWinters(season).fit(values[1])
+    assert np.allclose(together.params[1], alone.params[0])
+    assert np.allclose(together.predict(4)[1], alone.predict(4)[0])
+
+
+def test_forecast_activity():
+    times = pd.date_range("2021-01-01", periods=48, freq="1H")
+    activity = pd.DataFrame(
+        [_seasonal_series(48, 24), np.full(48, 2.0)],
+        index=["#a", "#b"],
+        columns=times,
+    )
+    forecast = forecast_activity(
+        activity, 6, model="seasonal_naive", seasonal_length=pd.Timedelta("1D"),
+    )
+    assert forecast.index.tolist() == ["#a", "#b"]
+    assert forecast.columns[0] == times[-1] + pd.Timedelta("1H")
+    assert np.allclose(forecast.loc["#a"], activity.loc["#a"].iloc[24:30])
+    assert np.allclose(forecast.loc["#b"], 2)
+
+
+@pytest.mark.parametrize("model", MODELS)
+def test_predict_needs_fit(model):
+    with pytest.raises(ValueError, match="fit the model"):
+        make_model(model, season=3).predict(2)
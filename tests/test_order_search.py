@@ -0,0 +1,120 @@
+"""Tests for searching ARIMA orders within a budget."""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+pytest.importorskip("darts")
+pytest.importorskip("pmdarima")
+
+from darts.timeseries import TimeSeries  # noqa: E402
+
+from clogstats.forecasting import order_search  # noqa: E402
+from clogstats.forecasting.order_search import SearchBudget, search_orders  # noqa: E402
+
+# seconds each order takes to fit; the rest are instant
+fit_seconds = {}
+
+
+class StubARIMA:
+    """A stand-in for pmdarima.ARIMA, whose AIC is lowest at p = 3, q = 1."""
+
+    def __init__(self, order, seasonal_order, suppress_warnings) -> None:
+        self.order = order
+
+    def fit(self, endog: np.ndarray) -> "StubARIMA":
+        time.sleep(fit_seconds.get(self.order, 0))
+        if self.order == (0, 1, 0):
+            raise ValueError("bad fit")
+        return self
+
+    def aic(self) -> float:
+        p, _, q = self.order  # noqa: VNE001,WPS111,C0103
+        return 100 + (p - 3) ** 2 + 10 * (q - 1) ** 2
+
+
+@pytest.fixture(autouse=True)
+def _stub_pmdarima(monkeypatch):
+    fit_seconds.clear()
+    monkeypatch.setattr(
+        order_search,
+        "pmdarima",
+        SimpleNamespace(
+            ARIMA=StubARIMA,
+            arima=SimpleNamespace(ndiffs=lambda endog, max_d: 1),
+        ),
+    )
+
+
+def _series() -> TimeSeries:
+    times = pd.date_range("2020-07-01", periods=48, freq="1H")
+    values = pd.DataFrame({"msgs": np.arange(48, dtype=float)}, index=times)
+    return TimeSeries.from_dataframe(
+        values, time_col=None, value_cols=["msgs"], freq="H",
+    )
+
+
+def _fitted_orders(search):
+    return {fit.candidate.order for fit in search.fits}
+
+
+@pytest.mark.parametrize("executor", ["serial", "process"])
+def test_search_finds_lowest_aic(executor):
+    search = search_orders(
+        _series(), budget=SearchBudget(seconds=None, fits=None), executor=executor,
+    )
+    assert search.stopped_by == "converged"
+    assert search.best.candidate.order == (3, 1, 1)
+    assert search.best.aic == 100
+    errors = [fit.error for fit in search.fits if fit.error is not None]
+    assert errors == ["ValueError: bad fit"]
+    # every order was tried at most once
+    assert len(_fitted_orders(search)) == len(search.fits)
+
+
+def test_search_prunes_poor_neighbours():
+    budget = SearchBudget(seconds=None, fits=None, aic_margin=2)
+    search = search_orders(_series(), budget=budget, executor="serial")
+    # (0, 1, 3), (1, 1, 3), (2, 1, 4), (3, 1, 4), (4, 1, 3) and (4, 1, 4) are
+    # next to poor fits only. (2, 1, 0) and (4, 1, 2) are pruned in one wave
+    # but fitted in a later one, so they don't count.
+    assert search.pruned == 6
+    assert max(q for _, _, q in _fitted_orders(search)) == 3  # noqa: WPS111
+    assert len(search.fits) == 16
+    # with no margin to prune by, every neighbour gets tried
+    exhaustive = search_orders(
+        _series(), budget=budget._replace(aic_margin=np.inf), executor="serial",
+    )
+    assert exhaustive.pruned == 0
+    assert len(exhaustive.fits) > len(search.fits)
+    assert exhaustive.best.candidate == search.best.candidate
+
+
+def test_search_stops_at_fits_budget():
+    search = search_orders(
+        _series(), budget=SearchBudget(seconds=None, fits=6), executor="serial",
+    )
+    assert search.stopped_by == "fits"
+    assert len(search.fits) == 6
+
+
+@pytest.mark.parametrize("executor", ["serial", "process"])
+def test_search_stops_at_time_budget(executor):
+    # a starting order hangs; the search gives up on it at the deadline
+    fit_seconds[(1, 1, 0)] = 30
+    search = search_orders(
+        _series(),
+        budget=SearchBudget(seconds=0.5, fits=None),
+        executor=executor,
+        workers=2,
+    )
+    assert search.stopped_by == "seconds"
+    assert search.seconds < 5
+    # no later wave was started
+    assert _fitted_orders(search) <= {(2, 1, 2), (0, 1, 0), (1, 1, 0), (0, 1, 1)}
+    assert search.best.candidate.order in {(2, 1, 2), (0, 1, 1)}
+    if executor == "serial":
+        errors = {fit.candidate.order: fit.error for fit in search.fits}
+        assert errors[(1, 1, 0)].startswith("ForecastTimeout")
@@ -0,0 +1,115 @@
+"""Tests for reading WeeChat logs into DataFrames."""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+from clogstats.stats.parse import (
+    ANSI_ESCAPE,
+    DateRange,
+    msg_type,
+    read_all_lines,
+    read_lines_in_range,
+    strip_nick_prefix,
+)
+
+
+def read_all_lines_rowwise(path: Path) -> pd.DataFrame:
+    """Parse a log one row at a time with the scalar helpers, as a reference."""
+    logfile_df = pd.read_csv(
+        path,
+        sep="\t",
+        error_bad_lines=False,
+        names=("timestamps", "prefixes", "bodies"),
+        dtype={"prefixes": str},
+    )
+    logfile_df["timestamps"] = pd.to_datetime(
+        logfile_df["timestamps"], format="%Y-%m-%d %H:%M:%S",  # noqa: WPS323
+    )
+    logfile_df["prefixes"] = logfile_df["prefixes"].str.replace(
+        ANSI_ESCAPE, "", regex=True,
+    )
+    logfile_df["msg_types"] = logfile_df["prefixes"].apply(msg_type)
+    logfile_df["nicks"] = logfile_df["prefixes"]
+    logfile_df.loc[logfile_df["msg_types"] != "message", "nicks"] = None
+    logfile_df["nicks"] = logfile_df["nicks"].apply(strip_nick_prefix)
+    is_join_leave_action = logfile_df["msg_types"].isin({"join", "leave", "action"})
+    logfile_df.loc[is_join_leave_action, "nicks"] = (
+        logfile_df.loc[is_join_leave_action, "bodies"]
+        .apply(lambda body: body.split()[0])
+        .str.replace(ANSI_ESCAPE, "", regex=True)
+    )
+    logfile_df.pop("bodies")
+    return logfile_df
+
+
+def decategorize(logfile_df: pd.DataFrame) -> pd.DataFrame:
+    """Convert categorical columns to plain objects with None for missing values."""
+    logfile_df = logfile_df.astype({"msg_types": object, "nicks": object})
+    return logfile_df.where(logfile_df.notna(), None)
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_read_all_lines_matches_rowwise(log_path):
+    for path in sorted(log_path.glob("*.weechatlog")):
+        actual = read_all_lines(path)
+        assert isinstance(actual["msg_types"].dtype, pd.CategoricalDtype)
+        assert isinstance(actual["nicks"].dtype, pd.CategoricalDtype)
+        pd.testing.assert_frame_equal(
+            decategorize(actual), decategorize(read_all_lines_rowwise(path)),
+        )
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_read_all_lines_start_time(log_path):
+    path = log_path / "irc.freenode.#go-nuts_big.weechatlog"
+    start_time = np.datetime64("2020-07-08T00:00")
+    all_lines = read_all_lines(path)
+    expected = all_lines[all_lines["timestamps"] >= start_time]
+    actual = read_all_lines(path, start_time=start_time)
+    assert len(actual) < len(all_lines)
+    pd.testing.assert_frame_equal(
+        decategorize(actual[actual["timestamps"] >= start_time]).reset_index(
+            drop=True,
+        ),
+        decategorize(expected).reset_index(drop=True),
+    )
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_bytes_engine_matches_pandas(log_path):
+    for path in sorted(log_path.glob("*.weechatlog")):
+        pd.testing.assert_frame_equal(
+            decategorize(read_all_lines(path, engine="bytes")),
+            decategorize(read_all_lines(path, engine="pandas")),
+        )
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_bytes_engine_streaming(log_path):
+    path = log_path / "irc.freenode.#node.js_big.weechatlog"
+    date_range = DateRange(
+        start_time=np.datetime64("2020-07-06T00:00"),
+        end_time=np.datetime64("2020-07-07T00:00"),
+    )
+    pd.testing.assert_frame_equal(
+        decategorize(read_lines_in_range(path, date_range, 100, engine="bytes")),
+        decategorize(read_lines_in_range(path, date_range, 100, engine="pandas")),
+    )
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+@pytest.mark.parametrize("engine", ["pandas", "bytes"])
+def test_streaming_open_ended_range(log_path, engine):
+    # DateRange() spans times beyond what a pandas Timestamp can hold
+    path = log_path / "irc.freenode.#node.js_big.weechatlog"
+    pd.testing.assert_frame_equal(
+        decategorize(read_lines_in_range(path, DateRange(), 100, engine=engine)),
+        decategorize(read_all_lines(path, engine=engine)),
+    )
+
+
+def test_unknown_engine(log_path):
+    with pytest.raises(ValueError, match="unknown parse engine"):
+        read_all_lines(log_path / "irc.freenode.#firefox.weechatlog", engine="regex")
@@ -0,0 +1,123 @@
+"""Tests for merging partial stats gathered on different hosts."""
+import shutil
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+import pytest  # type: ignore
+
+from clogstats.stats.gather_stats import (
+    ParseOptions,
+    analyze_all_logs,
+    ircchannel_from_sketch,
+)
+from clogstats.stats.partials import (
+    PartialStats,
+    gather_partial,
+    load_partial,
+    merge_partials,
+    save_partial,
+)
+from clogstats.stats.sketches import Approximation, ChannelSketch
+from clogstats.stats.time_series import (
+    aggregate_all_timeseries_data,
+    divide_date_range,
+)
+
+
+@pytest.fixture()
+def host_log_dirs(tmp_path: Path, log_path: Path) -> List[Path]:
+    """Split the sample logs between two log directories, like two bouncers."""
+    host_dirs = [tmp_path / "host0", tmp_path / "host1"]
+    for host_dir in host_dirs:
+        host_dir.mkdir()
+    for number, path in enumerate(sorted(log_path.iterdir())):
+        shutil.copy2(path, host_dirs[number % 2])
+    return host_dirs
+
+
+def test_merged_partials_match_single_host(large_date_range, log_path, host_log_dirs):
+    parse_options = ParseOptions(executor="serial")
+    partials = [
+        gather_partial(
+            [large_date_range], log_dir=str(host_dir), parse_options=parse_options,
+        )
+        for host_dir in host_log_dirs
+    ]
+    merged = merge_partials(partials)
+    expected = analyze_all_logs(
+        large_date_range, log_dir=str(log_path), parse_options=parse_options,
+    )
+    # channels with equal stats come in the order their logs were listed
+    expected_by_name = {channel.name: channel for channel in expected}
+    assert {channel.name: channel for channel in merged.combined()} == expected_by_name
+    assert [channel.msgs for channel in merged.combined()] == [
+        channel.msgs for channel in expected
+    ]
+    assert {
+        channel.name: channel for channel in merged.channels(large_date_range)
+    } == expected_by_name
+
+
+def test_merged_timeseries_match_single_host(large_date_range, log_path, host_log_dirs):
+    intervals = 10
+    partials = [
+        PartialStats.from_timeseries(
+            aggregate_all_timeseries_data(
+                large_date_range, log_dir=str(host_dir), intervals=intervals,
+            ),
+        )
+        for host_dir in host_log_dirs
+    ]
+    # exported partials merge the same way
+    partials.append(
+        gather_partial(
+            divide_date_range(large_date_range, intervals),
+            log_dir=str(host_log_dirs[0]),
+            parse_options=ParseOptions(executor="serial"),
+        ),
+    )
+    actual = merge_partials(partials).to_timeseries()
+    expected = aggregate_all_timeseries_data(
+        large_date_range, log_dir=str(log_path), intervals=intervals,
+    )
+    host0_channels = {path.name for path in host_log_dirs[0].iterdir()}
+    # the channels of host0 got counted twice
+    doubled = expected["name"].map(
+        lambda name: f"irc.{name}.weechatlog" in host0_channels,
+    )
+    expected.loc[doubled, "msgs"] *= 2
+    expected.loc[doubled, "topwords"] = expected.loc[doubled, "topwords"].map(
+        lambda topwords: topwords + topwords,
+    )
+    pd.testing.assert_frame_equal(
+        actual.sort_values(["date_start", "name"]).reset_index(),
+        expected.sort_values(["date_start", "name"]).reset_index(),
+        check_dtype=False,
+    )
+
+
+def test_save_and_merge_sketches(large_date_range, host_log_dirs, tmp_path):
+    parse_options = ParseOptions(
+        executor="serial", approximation=Approximation(error=0.05),
+    )
+    partial_paths = []
+    for number, host_dir in enumerate(host_log_dirs):
+        partial_path = tmp_path / f"partial{number}.json.gz"
+        save_partial(
+            gather_partial(
+                [large_date_range], log_dir=str(host_dir), parse_options=parse_options,
+            ),
+            partial_path,
+        )
+        partial_paths.append(partial_path)
+    merged = merge_partials(map(load_partial, partial_paths))
+    # a channel on both hosts gets its sketches merged
+    merged.merge(load_partial(partial_paths[0]))
+    (channels,) = merged.intervals.values()
+    for name, sketch in channels.items():
+        assert isinstance(sketch, ChannelSketch)
+        assert ircchannel_from_sketch(sketch).name == name
+    saved_path = tmp_path / "merged.json"
+    save_partial(merged, saved_path)
+    assert load_partial(saved_path).combined() == merged.combined()
@@ -0,0 +1,69 @@
+"""Tests for finding peaks of activity in every channel at once."""
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.parse import DateRange
+from clogstats.stats.peaks import (
+    activity_matrix,
+    find_peaks_2d,
+    local_maxima,
+    peak_intervals,
+)
+from clogstats.stats.time_series import aggregate_all_timeseries_data
+
+
+def test_local_maxima():
+    values = np.array(
+        [
+            # a plateau peaks in its middle, rounding down
+            [0, 2, 2, 2, 2, 1, 5, 0],
+            # edges and plateaus that don't fall again aren't peaks
+            [9, 1, 3, 3, 3, 1, 2, 2],
+            [1, 1, 1, 1, 1, 1, 1, 1],
+        ],
+    )
+    rows, columns = local_maxima(values)
+    assert rows.tolist() == [0, 0, 1]
+    assert columns.tolist() == [2, 6, 3]
+
+
+def test_find_peaks_2d_height_and_distance():
+    values = np.array(
+        [
+            # the lower of two close peaks is dropped
+            [0, 5, 0, 6, 0, 0, 0, 4, 0],
+            # peaks below the row's mean are dropped
+            [0, 1, 0, 20, 0, 1, 0, 0, 0],
+        ],
+    )
+    rows, columns = find_peaks_2d(values, distance=3)
+    assert list(zip(rows.tolist(), columns.tolist())) == [(0, 3), (0, 7), (1, 3)]
+    rows, columns = find_peaks_2d(values, distance=1)
+    assert list(zip(rows.tolist(), columns.tolist())) == [
+        (0, 1),
+        (0, 3),
+        (0, 7),
+        (1, 3),
+    ]
+
+
+def test_peak_intervals_of_every_channel(large_date_range, log_path):
+    timeseries = aggregate_all_timeseries_data(
+        large_date_range, log_dir=str(log_path), intervals=100,
+    )
+    activity = activity_matrix(timeseries)
+    actual = peak_intervals(activity)
+    assert set(actual) == set(timeseries["name"])
+    assert any(actual.values())
+    step = activity.columns[1] - activity.columns[0]
+    for name, intervals in actual.items():
+        channel = timeseries[timeseries["name"] == name]
+        for date_range in intervals:
+            assert isinstance(date_range, DateRange)
+            assert pd.Timestamp(date_range.end_time) - pd.Timestamp(
+                date_range.start_time,
+            ) == step
+            peak = channel.loc[pd.Timestamp(date_range.start_time), "msgs"]
+            assert peak >= activity.loc[name].mean()
+        starts = pd.DatetimeIndex([date_range.start_time for date_range in intervals])
+        assert (np.diff(starts) >= pd.Timedelta("6H")).all()
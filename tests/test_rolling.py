@@ -0,0 +1,57 @@
+"""Tests for stats over a sliding window of time."""
+from datetime import timedelta
+
+import numpy as np
+
+from clogstats.stats.gather_stats import ParseOptions, analyze_intervals, parse_all_logs
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DateRange
+from clogstats.stats.rolling import SlidingNickCounts, rolling_stats
+
+
+def test_sliding_nick_counts():
+    nick_counts = SlidingNickCounts(4)
+    nick_counts.add(np.array([0, 1, 1, 3]))
+    assert nick_counts.distinct == 3
+    nick_counts.evict(np.array([0, 1]))
+    assert nick_counts.distinct == 2
+    nick_counts.add(np.array([0]))
+    nick_counts.evict(np.array([1, 3]))
+    assert nick_counts.distinct == 1
+
+
+def test_rolling_stats_match_analyze_intervals(large_date_range, log_path):
+    nick_blacklists = {"freenode": {"ljharb", "seank*"}}
+    window = timedelta(hours=5)
+    step = timedelta(minutes=7)
+    nick_dictionary = NickDictionary()
+    parse_options = ParseOptions(executor="serial")
+    encoded_logs = parse_all_logs(
+        log_dir=str(log_path),
+        parse_options=parse_options,
+        nick_dictionary=nick_dictionary,
+    )
+    actual = rolling_stats(
+        large_date_range, encoded_logs, window, step, nick_blacklists, nick_dictionary,
+    )
+    parsed_logs = parse_all_logs(log_dir=str(log_path), parse_options=parse_options)
+    assert actual.equals(
+        rolling_stats(large_date_range, parsed_logs, window, step, nick_blacklists),
+    )
+    # every window, including those with lines on their edges
+    windows = zip(actual.index.unique(), actual["date_end"].unique())
+    date_ranges = [
+        DateRange(start_time=date_start, end_time=date_end)
+        for date_start, date_end in windows
+    ]
+    assert date_ranges[-1].end_time <= large_date_range.end_time
+    expected = analyze_intervals(
+        date_ranges, encoded_logs, nick_blacklists, nick_dictionary, "serial",
+    )
+    expected_rows = [
+        (channel.name, channel.nicks, channel.msgs)
+        for channels in expected
+        for channel in channels
+    ]
+    actual_rows = actual[["name", "nicks", "msgs"]].itertuples(index=False)
+    assert list(actual_rows) == expected_rows
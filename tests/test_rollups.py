@@ -0,0 +1,90 @@
+"""Tests for answering date range queries from per-bucket counts."""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from clogstats.stats.gather_stats import (
+    ParseOptions,
+    analyze_all_logs,
+    analyze_multiple_logs,
+    parse_all_logs,
+)
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DateRange
+from clogstats.stats.rollups import RollupStore, build_rollups
+from clogstats.stats.time_series import aggregate_all_timeseries_data
+
+
+def test_rollups_match_analyze_multiple_logs(log_path):
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_all_logs(
+        log_dir=str(log_path),
+        parse_options=ParseOptions(executor="serial"),
+        nick_dictionary=nick_dictionary,
+    )
+    rollups = RollupStore.from_parsed_logs(
+        parsed_logs, nick_dictionary, bucket_size=timedelta(minutes=15),
+    )
+    date_ranges = (
+        # aligned to buckets, unaligned, and within a single bucket
+        DateRange(np.datetime64("2020-07-06T00:00"), np.datetime64("2020-07-08T12:00")),
+        DateRange(
+            np.datetime64("2020-07-05T10:10:40"), np.datetime64("2020-07-09T21:59:59"),
+        ),
+        DateRange(np.datetime64("2020-07-07T10:01"), np.datetime64("2020-07-07T10:13")),
+        DateRange(np.datetime64("2020-06-19T12:46"), np.datetime64("2020-06-19T13:43")),
+    )
+    for date_range in date_ranges:
+        expected = analyze_multiple_logs(
+            date_range,
+            parsed_logs,
+            nick_dictionary=nick_dictionary,
+            executor="serial",
+        )
+        assert rollups.analyze(date_range) == expected
+
+
+def test_rollups_extend(log_path):
+    nick_dictionary = NickDictionary()
+    parsed_logs = parse_all_logs(
+        log_dir=str(log_path),
+        parse_options=ParseOptions(executor="serial"),
+        nick_dictionary=nick_dictionary,
+    )
+    whole = RollupStore.from_parsed_logs(parsed_logs, nick_dictionary)
+    extended = RollupStore(nick_dictionary)
+    for name, logfile_df in parsed_logs.items():
+        middle = len(logfile_df) // 2
+        extended.extend(name, logfile_df.iloc[:middle])
+        # query in between, so the halves get rolled up separately
+        extended.topwords(
+            name, DateRange(np.datetime64("2020-07-06"), np.datetime64("2020-07-07")),
+        )
+        extended.extend(name, logfile_df.iloc[middle:])
+    date_range = DateRange(
+        np.datetime64("2020-07-05T12:00:30"), np.datetime64("2020-07-09T12:00"),
+    )
+    assert extended.analyze(date_range) == whole.analyze(date_range)
+    name = "freenode.#node.js_big"
+    logfile_df = parsed_logs[name]
+    in_range = logfile_df[
+        (logfile_df["timestamps"] > date_range.start_time)
+        & (logfile_df["timestamps"] < date_range.end_time)
+    ]
+    for msg_type in ("join", "quit"):
+        expected_events = (in_range["msg_types"] == msg_type).sum()
+        assert extended.count_events(name, msg_type, date_range) == expected_events
+
+
+def test_analyze_from_rollups(large_date_range, log_path):
+    rollups = build_rollups(log_dir=str(log_path))
+    expected = analyze_all_logs(large_date_range, log_dir=str(log_path))
+    assert analyze_all_logs(large_date_range, rollups=rollups) == expected
+    expected_timeseries = aggregate_all_timeseries_data(
+        large_date_range, log_dir=str(log_path), intervals=24,
+    )
+    pd.testing.assert_frame_equal(
+        aggregate_all_timeseries_data(large_date_range, intervals=24, rollups=rollups),
+        expected_timeseries,
+    )
@@ -0,0 +1,44 @@
+"""Tests for seeking to a point in time inside a log."""
+import numpy as np
+
+from clogstats.stats.seek import MAX_CLOCK_SKEW, seek_offset
+
+
+def line_timestamps(lines):
+    return [np.datetime64(line[:19].decode().replace(" ", "T")) for line in lines]
+
+
+def test_seek_offset(log_path):
+    path = log_path / "irc.freenode.#node.js_big.weechatlog"
+    start_time = np.datetime64("2020-07-07T12:00")
+    with open(path, "rb") as logfile:
+        offset = seek_offset(logfile, start_time)
+        logfile.seek(0)
+        contents = logfile.read()
+    assert contents[offset - 1 : offset] == b"\n"
+    before = line_timestamps(contents[:offset].splitlines())
+    after = line_timestamps(contents[offset:].splitlines())
+    assert max(before) < start_time - MAX_CLOCK_SKEW
+    assert min(after) >= start_time - MAX_CLOCK_SKEW
+
+
+def test_seek_offset_garbage_and_empty(tmp_path):
+    path = tmp_path / "irc.test.#test.weechatlog"
+    path.write_bytes(b"")
+    with open(path, "rb") as logfile:
+        assert seek_offset(logfile, np.datetime64("2020-01-01")) == 0
+    lines = [
+        b"2020-01-01 00:00:00\t--\tfirst\n",
+        b"garbage\n",
+        b"2020-01-02 00:00:00\t--\tsecond\n",
+        b"2020-01-03 00:00:00\t--\tthird\n",
+    ]
+    path.write_bytes(b"".join(lines))
+    with open(path, "rb") as logfile:
+        assert seek_offset(logfile, np.datetime64("2020-01-02T12:00")) == sum(
+            map(len, lines[:3]),
+        )
+        assert seek_offset(logfile, np.datetime64("2020-01-02")) == len(lines[0])
+        assert seek_offset(logfile, np.datetime64("2021-01-01")) == sum(
+            map(len, lines),
+        )
@@ -0,0 +1,134 @@
+"""Tests for approximate channel stats."""
+import random
+from typing import Counter
+
+import numpy as np
+import pytest  # type: ignore
+
+from clogstats.stats.gather_stats import (
+    AnalyzeLogStreamArgs,
+    analyze_log_stream,
+    sketch_log_stream_wrapper,
+)
+from clogstats.stats.parse import DateRange
+from clogstats.stats.sketches import (
+    Approximation,
+    ChannelSketch,
+    HyperLogLog,
+    SpaceSaving,
+)
+
+
+def test_hyperloglog_merge():
+    approximation = Approximation(error=0.02)
+    halves = [HyperLogLog(approximation.precision) for _ in range(2)]
+    for number in range(20000):
+        # the halves overlap by 5000 nicks
+        halves[number >= 7500].add(f"nick{number}")
+        if 7500 <= number < 12500:
+            halves[0].add(f"nick{number}")
+    halves[0].merge(halves[1])
+    # within 3 standard errors
+    assert abs(halves[0].estimate() - 20000) < 20000 * 3 * approximation.error
+    small = HyperLogLog(approximation.precision)
+    for nick in ("a", "b", "c", "a"):
+        small.add(nick)
+    assert small.estimate() == 3
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(capacity=10)
+    for number in range(1000):
+        sketch.add(f"lurker{number}")
+        if not number % 10:
+            sketch.add("chatty", 5)
+    assert len(sketch.counts) == 10
+    # overestimated by at most (messages added) / capacity
+    assert 500 <= sketch.top(1)["chatty"] <= 500 + 1500 / 10
+    other = SpaceSaving(capacity=10)
+    other.add("chatty", 100)
+    sketch.merge(other)
+    assert len(sketch.counts) <= 10
+    assert sketch.top(1)["chatty"] >= 600
+
+
+def _check_space_saving_bounds(sketch, exact):
+    error = sum(exact.values()) / sketch.capacity
+    for nick, count in exact.items():
+        if nick in sketch.counts:
+            assert count <= sketch.counts[nick] <= count + error
+        else:
+            assert count <= error
+
+
+def test_space_saving_merge_keeps_error_bound():
+    first, second = SpaceSaving(capacity=2), SpaceSaving(capacity=2)
+    for nick in ["a"] * 10 + ["b", "c", "d"]:
+        first.add(nick)
+    for nick in ["b"] * 6 + ["e", "f"]:
+        second.add(nick)
+    first.merge(second)
+    # b was evicted from first, where it may have had up to first's minimum
+    assert first.counts == {"a": 12, "b": 9}
+    _check_space_saving_bounds(
+        first, Counter({"a": 10, "b": 7, "c": 1, "d": 1, "e": 1, "f": 1}),
+    )
+
+
+def test_space_saving_random_merges():
+    rng = random.Random(0)
+    exact = Counter()
+    merged = SpaceSaving(capacity=20)
+    for _ in range(5):
+        sketch = SpaceSaving(capacity=20)
+        for _ in range(2000):
+            nick = f"nick{int(rng.paretovariate(1))}"
+            sketch.add(nick)
+            exact[nick] += 1
+        merged.merge(sketch)
+        _check_space_saving_bounds(merged, exact)
+
+
+def test_approximate_log_stream(log_path, large_date_range):
+    path = log_path / "irc.freenode.#go-nuts_big.weechatlog"
+    exact = analyze_log_stream([path], large_date_range, chunksize=500)
+    approximation = Approximation(error=0.05)
+    approximate = analyze_log_stream(
+        [path], large_date_range, chunksize=500, approximation=approximation,
+    )
+    assert approximate.msgs == exact.msgs
+    assert abs(approximate.nicks - exact.nicks) <= exact.nicks * 3 * 0.05
+    assert len(approximate.topwords) <= approximation.capacity
+    exact_top = [nick for nick, _ in exact.topwords.most_common(3)]
+    assert [nick for nick, _ in approximate.topwords.most_common(3)] == exact_top
+
+
+def test_sketch_needs_approximation(log_path, large_date_range):
+    args = AnalyzeLogStreamArgs(
+        [log_path / "irc.freenode.#go-nuts_big.weechatlog"], large_date_range,
+    )
+    with pytest.raises(ValueError, match="requires an approximation"):
+        sketch_log_stream_wrapper(args)
+    sketch = sketch_log_stream_wrapper(
+        args._replace(approximation=Approximation(error=0.05)),
+    )
+    assert sketch.msgs > 0
+
+
+def test_merge_channel_sketches(log_path):
+    path = log_path / "irc.freenode.#node.js_big.weechatlog"
+    middle = np.datetime64("2020-07-07T12:00")
+    halves = [
+        DateRange(np.datetime64("2020-07-05"), middle),
+        DateRange(middle - np.timedelta64(1, "s"), np.datetime64("2020-07-10")),
+    ]
+    merged = ChannelSketch("freenode.#node.js_big")
+    for date_range in halves:
+        sketch = ChannelSketch("freenode.#node.js_big")
+        sketch.update(analyze_log_stream([path], date_range).topwords)
+        merged.merge(sketch)
+    whole = analyze_log_stream(
+        [path], DateRange(np.datetime64("2020-07-05"), np.datetime64("2020-07-10")),
+    )
+    assert abs(merged.msgs - whole.msgs) <= 1  # a run may span the halves
+    assert abs(merged.nicks.estimate() - whole.nicks) <= whole.nicks * 0.03
@@ -1,8 +1,19 @@
 """Tests for generating time-series data."""
 import pandas as pd
 
-from clogstats.stats.gather_stats import ChannelsWanted
-from clogstats.stats.time_series import aggregate_all_timeseries_data
+from clogstats.stats.gather_stats import (
+    ChannelsWanted,
+    ParseOptions,
+    analyze_intervals,
+    parse_all_logs,
+)
+from clogstats.stats.nicks import NickDictionary
+from clogstats.stats.parse import DateRange
+from clogstats.stats.time_series import (
+    aggregate_all_timeseries_data,
+    bucket_intervals,
+    divide_date_range,
+)
 
 
 def test_aggregate_all_timeseries_data(large_date_range, log_path):
@@ -22,3 +33,34 @@ def test_aggregate_all_timeseries_data(large_date_range, log_path):
         timeseries_df = actual[actual["name"] == channel_name]
         assert pd.infer_freq(timeseries_df.index) == "H"
         assert actual.shape == (212, 5)
+
+
+def test_bucket_intervals_match_analyze_intervals(large_date_range, log_path):
+    nick_blacklists = {"freenode": {"ljharb", "re:.*bot.*", "seank*"}}
+    nick_dictionary = NickDictionary()
+    encoded_logs = parse_all_logs(
+        log_dir=str(log_path),
+        parse_options=ParseOptions(executor="serial"),
+        nick_dictionary=nick_dictionary,
+    )
+    parsed_logs = parse_all_logs(
+        log_dir=str(log_path), parse_options=ParseOptions(executor="serial"),
+    )
+    # in seconds, so that intervals aren't truncated to whole minutes
+    date_range = DateRange(
+        start_time=large_date_range.start_time.astype("datetime64[s]"),
+        end_time=large_date_range.end_time.astype("datetime64[s]"),
+    )
+    # long intervals, and short ones with dozens of lines right on their edges
+    for intervals in (50, 400):
+        date_ranges = divide_date_range(date_range, intervals)
+        expected = analyze_intervals(
+            date_ranges, encoded_logs, nick_blacklists, nick_dictionary, "serial",
+        )
+        assert (
+            bucket_intervals(
+                date_ranges, encoded_logs, nick_blacklists, nick_dictionary,
+            )
+            == expected
+        )
+        assert bucket_intervals(date_ranges, parsed_logs, nick_blacklists) == expected
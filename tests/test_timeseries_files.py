@@ -0,0 +1,65 @@
+"""Tests for streaming time-series data to partitioned files."""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest  # type: ignore
+
+from clogstats.stats.parse import DateRange
+from clogstats.stats.time_series import aggregate_all_timeseries_data
+from clogstats.stats.timeseries_files import (
+    PartitionedTimeseries,
+    TimeseriesWriter,
+    pyarrow,
+    write_all_timeseries_data,
+)
+
+FILE_FORMATS = [
+    "jsonl",
+    pytest.param(
+        "parquet",
+        marks=pytest.mark.skipif(pyarrow is None, reason="requires pyarrow"),
+    ),
+]
+
+
+@pytest.mark.parametrize("file_format", FILE_FORMATS)
+def test_partitions_match_timeseries_data(
+    large_date_range, log_path, tmp_path, file_format,
+):
+    intervals = 100
+    expected = aggregate_all_timeseries_data(
+        large_date_range, log_dir=str(log_path), intervals=intervals,
+    )
+    partitioned = write_all_timeseries_data(
+        tmp_path,
+        large_date_range,
+        log_dir=str(log_path),
+        intervals=intervals,
+        file_format=file_format,
+    )
+    # 2020-07-05 through 2020-07-09
+    assert len(partitioned.partitions) == 5
+    pd.testing.assert_frame_equal(partitioned.read_slice(), expected)
+
+    one_day = DateRange(
+        start_time=np.datetime64("2020-07-06T12:00"),
+        end_time=np.datetime64("2020-07-07T12:00"),
+    )
+    assert len(partitioned.overlapping(one_day)) == 2
+    is_within = (expected.index >= pd.Timestamp(one_day.start_time)) & (
+        expected.index < pd.Timestamp(one_day.end_time)
+    )
+    pd.testing.assert_frame_equal(
+        PartitionedTimeseries.open(tmp_path).read_slice(one_day), expected[is_within],
+    )
+
+
+def test_writer_needs_time_order(large_date_range, log_path, tmp_path):
+    timeseries = aggregate_all_timeseries_data(
+        large_date_range, log_dir=str(log_path), intervals=20,
+    )
+    with TimeseriesWriter(tmp_path, timedelta(hours=6), "jsonl") as writer:
+        writer.write(timeseries.iloc[len(timeseries) // 2 :])
+        with pytest.raises(ValueError):
+            writer.write(timeseries.iloc[: len(timeseries) // 2])
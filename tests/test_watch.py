@@ -0,0 +1,45 @@
+"""Tests for keeping stats up to date as logs grow."""
+from datetime import datetime, timedelta
+
+from clogstats.stats.gather_stats import ParseOptions, analyze_all_logs
+from clogstats.stats.parse import DateRange
+from clogstats.stats.watch import LogWatcher
+
+LOG_NAMES = (
+    "irc.freenode.#go-nuts_big.weechatlog",
+    "irc.freenode.#node.js_big.weechatlog",
+)
+WINDOW = timedelta(hours=12)
+
+
+def expected_snapshot(log_dir, end_time):
+    """Stats from the batch pipeline for the window ending at end_time."""
+    return analyze_all_logs(
+        date_range=DateRange(start_time=end_time - WINDOW, end_time=end_time),
+        log_dir=str(log_dir),
+        parse_options=ParseOptions(streaming=True, executor="serial"),
+    )
+
+
+def test_watcher_matches_analyze_all_logs(log_path, tmp_path):
+    # append everything logged after cut_time once the watcher has caught up
+    cut_time = b"2020-07-07 07:00"
+    appended_lines = {}
+    for name in LOG_NAMES:
+        lines = (log_path / name).read_bytes().splitlines(keepends=True)
+        cut = next(index for index, line in enumerate(lines) if line >= cut_time)
+        (tmp_path / name).write_bytes(b"".join(lines[:cut]))
+        appended_lines[name] = lines[cut:]
+    watcher = LogWatcher(WINDOW, log_dir=str(tmp_path))
+    watcher.poll(datetime(2020, 7, 5))
+    end_time = datetime(2020, 7, 7, 7)
+    assert watcher.snapshot(end_time) == expected_snapshot(tmp_path, end_time)
+
+    for name, lines in appended_lines.items():
+        with open(tmp_path / name, "ab") as logfile:
+            logfile.writelines(lines)
+    assert watcher.poll() > 0
+    assert watcher.poll() == 0
+    # the window slides forward past the end of the logs, evicting old runs
+    end_time = datetime(2020, 7, 9, 23)
+    assert watcher.snapshot(end_time) == expected_snapshot(tmp_path, end_time)